@@ -21,7 +21,9 @@ function EditRuleComponent() {
 
   const fetchRule = async () => {
     try {
-      const response = await getRules();
+      const response = await getRules(
+        "rules/?fields=id,name,rule_string,ast_json"
+      );
       const rules = response.data.results || [];
       const fetchedRule = rules.find((r) => r.id === parseInt(ruleId));
       if (!fetchedRule) {
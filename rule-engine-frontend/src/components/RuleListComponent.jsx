@@ -5,7 +5,6 @@ import { AiOutlineEdit, AiOutlineDelete } from "react-icons/ai"; // Icons
 
 function RuleListComponent() {
   const [rules, setRules] = useState([]);
-  const [count, setCount] = useState(0);
   const [nextPage, setNextPage] = useState(null);
   const [previousPage, setPreviousPage] = useState(null);
   const [error, setError] = useState("");
@@ -21,7 +20,6 @@ function RuleListComponent() {
       setLoading(true);
       const response = await getRules(url);
       setRules(response.data.results);
-      setCount(response.data.count);
       setNextPage(response.data.next);
       setPreviousPage(response.data.previous);
     } catch (err) {
@@ -37,7 +35,6 @@ function RuleListComponent() {
     try {
       await deleteRule(ruleId);
       setRules(rules.filter((rule) => rule.id !== ruleId));
-      setCount(count - 1);
     } catch (err) {
       setError("Failed to delete the rule.");
       console.error(err);
@@ -131,9 +128,6 @@ function RuleListComponent() {
               Next
             </button>
           </div>
-          <p className="mt-4 text-center text-sm text-gray-500">
-            Total Rules: {count}
-          </p>
         </>
       )}
     </div>
@@ -0,0 +1,328 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Set, Tuple
+from django.conf import settings
+from rule_engine_core.ast_node import Node, referenced_attributes
+from rule_engine_core.binary_ast import decode_rule
+from rule_engine_core.compact import condition_pool
+from rule_engine_core.compiler import CompiledRule, compile_rule
+from rule_engine_core.rule_functions import json_to_ast
+
+
+class PreparedRule(NamedTuple):
+    """A stored rule reconstructed and compiled, ready to evaluate."""
+    rule_id: int
+    updated_at: Optional[datetime]
+    ast: Node
+    compiled: CompiledRule
+    # Attributes read by the rule, sorted; the only ones its result depends on
+    attributes: Tuple[str, ...]
+
+    @property
+    def version(self) -> Tuple[int, Optional[datetime]]:
+        return self.rule_id, self.updated_at
+
+
+def stored_asts(rule) -> Tuple[Node, Optional[Node]]:
+    """
+    Return the `(ast, optimized)` trees of a stored rule, decoded from
+    `ast_bin` when it is set and from the JSON columns otherwise. Operand
+    conditions are interned in `condition_pool`, so every resident rule
+    shares one condition and one compiled predicate per distinct condition.
+    """
+    if getattr(rule, 'ast_bin', None) is not None:
+        return decode_rule(rule.ast_bin)
+    return (
+        condition_pool.intern_tree(json_to_ast(rule.ast_json)),
+        condition_pool.intern_tree(json_to_ast(rule.optimized_ast_json)),
+    )
+
+
+def prepare_rule(rule) -> PreparedRule:
+    """
+    Build a `PreparedRule` from a `Rule` instance (or any object exposing
+    `id`, `updated_at`, `ast_bin`, `ast_json` and `optimized_ast_json`).
+
+    The ASTs are decoded from `ast_bin` when it is set, so the JSON columns
+    are only read (and, if deferred, loaded) for rows saved without it.
+    Boolean evaluation runs on the optimized AST when one is stored. The
+    trees are compiled rather than evaluated in place by `BinaryRule`: a
+    prepared rule is reused, and compiled closures evaluate faster.
+    """
+    ast, optimized = stored_asts(rule)
+    return PreparedRule(
+        rule.id, rule.updated_at, ast, compile_rule(ast, optimized), tuple(sorted(referenced_attributes(ast)))
+    )
+
+
+class PreparedRuleCache:
+    """
+    Process-local, bounded LRU cache of prepared rules.
+
+    Entries are identified by `(id, updated_at)` and looked up by rule id.
+    `Rule.save` and `Rule.delete` invalidate the entry of the rule they touch
+    in their own process. Writes made by other processes are caught through
+    the rule-set version: `read_version` is called at most once per
+    `RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL` seconds, and an entry cached at an
+    older version is checked with `read_updated_at` on its next hit and
+    dropped if its row has changed or is gone. While the rule set does not
+    change, a hit costs no database access.
+    """
+
+    def __init__(self, maxsize: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        # Rule id -> (prepared rule, rule-set version it was last known current at)
+        self._entries: "OrderedDict[int, Tuple[PreparedRule, Any]]" = OrderedDict()
+        self._version: Any = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+    def get(self, rule_id: int, loader: Callable[[int], Any], read_version: Optional[Callable[[], Any]] = None,
+            read_updated_at: Optional[Callable[[int], Optional[datetime]]] = None) -> PreparedRule:
+        """
+        Return the prepared rule for `rule_id`, calling `loader(rule_id)` to
+        fetch the row on a miss.
+
+        Args:
+            read_version: Returns the current rule-set version.
+            read_updated_at: Returns the stored `updated_at` of a rule, or
+                None if it no longer exists.
+
+        Raises:
+            Whatever `loader` raises, typically `Rule.DoesNotExist`.
+        """
+        if read_version is not None and self._check_due():
+            self._set_version(read_version())
+        version = self._version
+        prepared, current = self._lookup(rule_id, version, read_updated_at is None)
+        if not current:
+            prepared = self._revalidated(prepared, read_updated_at(rule_id), version)
+        self._count(prepared)
+        if prepared is None:
+            prepared = prepare_rule(loader(rule_id))
+            self.put(prepared, version)
+        return prepared
+
+    async def aget(self, rule_id: int, loader: Callable[[int], Awaitable[Any]],
+                   read_version: Optional[Callable[[], Awaitable[Any]]] = None,
+                   read_updated_at: Optional[Callable[[int], Awaitable[Optional[datetime]]]] = None) -> PreparedRule:
+        """Async variant of `get`; `loader` and the readers are coroutine functions."""
+        if read_version is not None and self._check_due():
+            self._set_version(await read_version())
+        version = self._version
+        prepared, current = self._lookup(rule_id, version, read_updated_at is None)
+        if not current:
+            prepared = self._revalidated(prepared, await read_updated_at(rule_id), version)
+        self._count(prepared)
+        if prepared is None:
+            prepared = prepare_rule(await loader(rule_id))
+            self.put(prepared, version)
+        return prepared
+
+    def _check_due(self) -> bool:
+        interval = getattr(settings, 'RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL', 1.0)
+        checked_at = self._checked_at
+        return checked_at is None or self._clock() - checked_at >= interval
+
+    def _set_version(self, version: Any) -> None:
+        with self._lock:
+            self._version = version
+            self._checked_at = self._clock()
+
+    def _lookup(self, rule_id: int, version: Any, trusted: bool) -> Tuple[Optional[PreparedRule], bool]:
+        """Return the cached entry and whether it is known to be current."""
+        with self._lock:
+            entry = self._entries.get(rule_id)
+            if entry is None:
+                return None, True
+            self._entries.move_to_end(rule_id)
+            return entry[0], trusted or entry[1] == version
+
+    def _revalidated(self, prepared: PreparedRule, updated_at: Optional[datetime],
+                     version: Any) -> Optional[PreparedRule]:
+        """Keep `prepared` if its row is unchanged; otherwise drop it and return None."""
+        with self._lock:
+            self.revalidations += 1
+            entry = self._entries.get(prepared.rule_id)
+            # Another thread may have replaced the entry in the meantime
+            cached = entry is not None and entry[0] is prepared
+            if updated_at is not None and updated_at == prepared.updated_at:
+                if cached:
+                    self._entries[prepared.rule_id] = (prepared, version)
+                return prepared
+            if cached:
+                del self._entries[prepared.rule_id]
+            return None
+
+    def _count(self, prepared: Optional[PreparedRule]) -> None:
+        with self._lock:
+            if prepared is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def put(self, prepared: PreparedRule, version: Any = None) -> None:
+        """Cache `prepared`, loaded from the database at rule-set `version` or later."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            current = self._entries.get(prepared.rule_id)
+            if current is not None and current[0].updated_at and prepared.updated_at \
+                    and current[0].updated_at > prepared.updated_at:
+                # A newer version was cached concurrently; keep it
+                return
+            self._entries[prepared.rule_id] = (prepared, version)
+            self._entries.move_to_end(prepared.rule_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, rule_id: int) -> None:
+        with self._lock:
+            self._entries.pop(rule_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._checked_at = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'revalidations': self.revalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+prepared_rule_cache = PreparedRuleCache(maxsize=getattr(settings, 'RULE_ENGINE_CACHE_SIZE', 1024))
+
+
+# Stands in for an attribute absent from the user data in a result-cache key
+_ABSENT = object()
+
+
+def _key_value(value: Any) -> Tuple[type, Any]:
+    # Equal floats can differ once converted to strings for a comparison
+    return (float, repr(value)) if type(value) is float else (type(value), value)
+
+
+class ResultCache:
+    """
+    Process-local, bounded LRU cache of evaluation responses, with a TTL.
+
+    A result depends only on the rule version and on the values of the
+    attributes the rule references, so entries are keyed by
+    `(rule id, updated_at, details flag, projection)`. The projection holds
+    the type and value of each referenced attribute, so `30`, `30.0` and
+    `'30'` never share an entry. Floats are keyed by their `repr`: `0.0` and
+    `-0.0` are equal but compare differently as strings. `Rule.save` and `Rule.delete` drop the
+    entries of the rule they touch.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._keys_by_rule: Dict[int, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def make_key(self, prepared: PreparedRule, user_data: Dict[str, Any], details: bool) -> Optional[Hashable]:
+        """Return the cache key for an evaluation, or None if the values are unhashable."""
+        projection = tuple(
+            _ABSENT if attribute not in user_data else _key_value(user_data[attribute])
+            for attribute in prepared.attributes
+        )
+        key = (prepared.rule_id, prepared.updated_at, bool(details), projection)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, evaluation = entry
+            if expires <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return evaluation
+
+    def put(self, key: Hashable, evaluation: Dict[str, Any]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, evaluation)
+            self._entries.move_to_end(key)
+            self._keys_by_rule.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        del self._entries[key]
+        keys = self._keys_by_rule.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_rule[key[0]]
+
+    def invalidate(self, rule_id: int) -> None:
+        with self._lock:
+            for key in self._keys_by_rule.pop(rule_id, ()):
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_rule.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+result_cache = ResultCache(
+    maxsize=getattr(settings, 'RULE_ENGINE_RESULT_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'RULE_ENGINE_RESULT_CACHE_TTL', 300.0),
+)
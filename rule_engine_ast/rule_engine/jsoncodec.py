@@ -0,0 +1,35 @@
+"""
+JSON encoding for the lean endpoints, using orjson when it is installed.
+
+`loads` accepts bytes or str and raises `ValueError` on invalid input;
+`dumps` returns compact UTF-8 bytes, like DRF's `JSONRenderer`. orjson
+decodes integers beyond 64 bits as floats, so input with a run of 19 or
+more digits is decoded with `json`, which keeps every integer exact.
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+
+# Shorter digit runs always fit orjson's 64-bit integers
+_LONG_DIGITS = re.compile(rb'[0-9]{19}')
+_LONG_DIGITS_TEXT = re.compile(r'[0-9]{19}')
+
+
+if orjson is not None:
+    def loads(data):
+        pattern = _LONG_DIGITS_TEXT if isinstance(data, str) else _LONG_DIGITS
+        if pattern.search(data) is not None:
+            return json.loads(data)
+        return orjson.loads(data)
+
+    dumps = orjson.dumps
+else:
+    loads = json.loads
+
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
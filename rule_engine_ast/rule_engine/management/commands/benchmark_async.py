@@ -0,0 +1,128 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from rule_engine.models import Rule
+
+# Each mode: the client stack, and the URL names of the evaluate and match
+# endpoints (None where the mode has no such endpoint)
+MODES = {
+    'wsgi': ('wsgi', 'evaluate_rule', 'match_rules'),
+    'wsgi-fast': ('wsgi', 'evaluate_rule_fast', None),
+    'asgi-sync': ('asgi', 'evaluate_rule', 'match_rules'),
+    'asgi': ('asgi', 'evaluate_rule_async', 'match_rules_async'),
+}
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and latency of the evaluate/match endpoints through "
+        "the WSGI handler (sync views on a thread pool), the WSGI handler with the "
+        "lean evaluate view, the ASGI handler with the sync views, and the ASGI "
+        "handler with the native async views. Requests "
+        "go through Django's in-process test clients, so the numbers cover the "
+        "request handler, middleware, views and ORM but not a network server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=('evaluate', 'match'), default='evaluate')
+        parser.add_argument('--modes', nargs='+', choices=tuple(MODES), default=list(MODES))
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per mode.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once.")
+        parser.add_argument('--rule-id', type=int, help="Rule to evaluate; a temporary rule is created by default.")
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0 or options['concurrency'] <= 0:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        temporary = None
+        rule_id = options['rule_id']
+        if rule_id is None:
+            temporary = Rule.objects.create(
+                name=f"benchmark-async-{time.time_ns()}",
+                rule_string="(age > 30 AND department = 'Sales') OR (salary >= 50000 AND experience > 5)",
+            )
+            rule_id = temporary.id
+        elif not Rule.objects.filter(id=rule_id).exists():
+            raise CommandError(f"Rule with ID {rule_id} does not exist.")
+
+        if options['endpoint'] == 'evaluate':
+            body = {'rule_id': rule_id, 'user_data': {'age': 35, 'department': 'Sales', 'salary': 60000, 'experience': 3}}
+        else:
+            body = {'user_data': {'age': 35, 'department': 'Sales', 'salary': 60000, 'experience': 3}}
+
+        try:
+            # The test clients send `Host: testserver`
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                self._report(options, body)
+        finally:
+            if temporary is not None:
+                temporary.delete()
+
+    def _report(self, options, body):
+        self.stdout.write(
+            f"{options['endpoint']}: {options['requests']} requests per mode, concurrency {options['concurrency']}"
+        )
+        self.stdout.write(f"{'mode':<10} {'req/s':>10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for mode in options['modes']:
+            stack, evaluate_url, match_url = MODES[mode]
+            url_name = evaluate_url if options['endpoint'] == 'evaluate' else match_url
+            if url_name is None:
+                self.stdout.write(f"{mode:<10} {'n/a':>10}")
+                continue
+            url = reverse(url_name)
+            run = self._run_wsgi if stack == 'wsgi' else self._run_asgi
+            elapsed, latencies = run(url, body, options['requests'], options['concurrency'])
+            latencies.sort()
+            self.stdout.write(
+                f"{mode:<10} {len(latencies) / elapsed:>10.1f} {statistics.fmean(latencies) * 1000:>9.2f} "
+                f"{_percentile(latencies, 0.5) * 1000:>9.2f} {_percentile(latencies, 0.95) * 1000:>9.2f} "
+                f"{_percentile(latencies, 0.99) * 1000:>9.2f}"
+            )
+
+    def _run_wsgi(self, url, body, requests, concurrency):
+        client = Client()
+
+        def request(_):
+            start = time.perf_counter()
+            response = client.post(url, body, content_type='application/json')
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}: {response.content[:200]!r}")
+            return time.perf_counter() - start
+
+        # Warm the prepared-rule cache and the rule-set index before timing
+        request(None)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(request, range(requests)))
+        return time.perf_counter() - start, latencies
+
+    def _run_asgi(self, url, body, requests, concurrency):
+        async def run():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def request():
+                async with slots:
+                    start = time.perf_counter()
+                    response = await client.post(url, body, content_type='application/json')
+                    if response.status_code != 200:
+                        raise CommandError(f"{url} returned {response.status_code}: {response.content[:200]!r}")
+                    return time.perf_counter() - start
+
+            await request()
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(request() for _ in range(requests)))
+            return time.perf_counter() - start, list(latencies)
+
+        return asyncio.run(run())
@@ -0,0 +1,82 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from rule_engine_core.benchmarks import BENCHMARKS, compare, run_suite
+from rule_engine_core.generators import ATTRIBUTES
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the microbenchmarks of the rule engine core (tokenizer, parser, "
+        "create/combine, JSON conversion and evaluation) on synthetic rules and "
+        "records. Results can be written as JSON and compared with a saved "
+        "baseline; the command fails when a benchmark regresses beyond the tolerance."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="Benchmarks to run; all by default.")
+        parser.add_argument('--rules', type=int, default=200, help="Synthetic rules generated.")
+        parser.add_argument('--records', type=int, default=500, help="Synthetic records generated.")
+        parser.add_argument('--depth', type=int, default=2, help="Nesting levels of each rule.")
+        parser.add_argument('--width', type=int, default=3, help="Children of each AND/OR group.")
+        parser.add_argument('--attributes', nargs='+', choices=ATTRIBUTES, default=list(ATTRIBUTES))
+        parser.add_argument('--string-ratio', type=float, default=0.25, help="Share of string conditions.")
+        parser.add_argument('--missing-ratio', type=float, default=0.0, help="Share of attributes absent from records.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--min-time', type=float, default=0.2, help="Seconds per timing round.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timing rounds; the median is reported.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare with the results saved in this JSON file.")
+        parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed slowdown or memory growth (0.1 = 10%%).")
+
+    def handle(self, *args, **options):
+        if min(options['rules'], options['records'], options['width'], options['repeat']) <= 0 or options['depth'] < 0:
+            raise CommandError("--rules, --records, --width and --repeat must be positive and --depth non-negative.")
+        for ratio in ('string_ratio', 'missing_ratio'):
+            if not 0 <= options[ratio] <= 1:
+                raise CommandError(f"--{ratio.replace('_', '-')} must be between 0 and 1.")
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the baseline {options['baseline']}: {e}")
+
+        results = run_suite(
+            options['only'], min_time=options['min_time'], repeat=options['repeat'], seed=options['seed'],
+            rules=options['rules'], records=options['records'], depth=options['depth'], width=options['width'],
+            attributes=options['attributes'], string_ratio=options['string_ratio'],
+            missing_ratio=options['missing_ratio'],
+        )
+
+        self.stdout.write(f"{'benchmark':<28} {'ops/sec':>12} {'mean us':>10} {'+/- %':>7} {'peak B/op':>10}")
+        for name, result in results['results'].items():
+            self.stdout.write(
+                f"{name:<28} {result['ops_per_sec']:>12.0f} {result['mean_us']:>10.2f} "
+                f"{result['stdev_pct']:>7.1f} {result['peak_bytes_per_op']:>10.0f}"
+            )
+
+        if options['output']:
+            try:
+                with open(options['output'], 'w', encoding='utf-8') as file:
+                    json.dump(results, file, indent=2)
+            except OSError as e:
+                raise CommandError(str(e))
+
+        if baseline is not None:
+            self._compare(results, baseline, options['tolerance'])
+
+    def _compare(self, results, baseline, tolerance):
+        if baseline.get('meta', {}).get('shape') != results['meta']['shape']:
+            self.stderr.write("Warning: the baseline was generated with different inputs.")
+        rows = compare(results, baseline, tolerance)
+        self.stdout.write(f"\n{'benchmark':<28} {'baseline':>12} {'speed':>8} {'memory':>8}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['name']:<28} {row['baseline_ops_per_sec']:>12.0f} {row['speed_change']:>+8.1%} "
+                f"{row['memory_change']:>+8.1%}{'  REGRESSION' if row['regression'] else ''}"
+            )
+        regressions = [row['name'] for row in rows if row['regression']]
+        if regressions:
+            raise CommandError(f"Regressed beyond {tolerance:.0%}: {', '.join(regressions)}")
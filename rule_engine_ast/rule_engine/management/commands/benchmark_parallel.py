@@ -0,0 +1,65 @@
+import os
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rule_engine_core.binary_ast import encode_rule
+from rule_engine_core.generators import random_records, random_rule
+from rule_engine_core.optimizer import optimize
+from rule_engine_core.parallel import ScoringPool
+from rule_engine_core.rule_functions import create_rule
+from rule_engine_core.scoring import ENGINES, Scorer, available_engines
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how bulk scoring scales with worker processes. Scores the same "
+        "synthetic records and rules in-process and then with 1, 2, 4, ... "
+        "workers up to --max-workers, and reports rows/sec and speedup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=200000)
+        parser.add_argument('--rules', type=int, default=20)
+        parser.add_argument('--engine', choices=ENGINES, default='compiled')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if min(options['records'], options['rules'], options['chunk_size'], options['max_workers']) <= 0:
+            raise CommandError("--records, --rules, --chunk-size and --max-workers must be positive.")
+        if options['engine'] not in available_engines():
+            raise CommandError(f"The {options['engine']} engine is not available; install numpy to use it.")
+
+        rng = random.Random(options['seed'])
+        rules = []
+        for rule_id in range(options['rules']):
+            ast = create_rule(random_rule(rng, depth=2, width=3))
+            rules.append((rule_id, ast, optimize(ast).ast))
+        encoded = [(rule_id, encode_rule(ast, optimized)) for rule_id, ast, optimized in rules]
+        records = random_records(rng, options['records'])
+        engine, chunk_size = options['engine'], options['chunk_size']
+
+        self.stdout.write(
+            f"{len(records)} records x {len(rules)} rules, {engine} engine, chunks of {chunk_size}, "
+            f"{os.cpu_count()} CPUs"
+        )
+        self.stdout.write(f"{'workers':>8} {'rows/sec':>12} {'speedup':>8}")
+
+        start = time.perf_counter()
+        expected = Scorer(rules, engine=engine).score(records)
+        baseline = len(records) / (time.perf_counter() - start)
+        self.stdout.write(f"{'inline':>8} {baseline:>12.0f} {1:>8.2f}")
+
+        workers = 1
+        while workers <= options['max_workers']:
+            with ScoringPool(workers) as pool:
+                # Start the workers and let each prepare the rules before timing
+                pool.score('benchmark', encoded, records[:workers], engine=engine, chunk_size=1)
+                start = time.perf_counter()
+                rows = pool.score('benchmark', encoded, records, engine=engine, chunk_size=chunk_size)
+                rate = len(records) / (time.perf_counter() - start)
+            if rows != expected:
+                raise CommandError(f"Results with {workers} workers differ from the in-process results.")
+            self.stdout.write(f"{workers:>8} {rate:>12.0f} {rate / baseline:>8.2f}")
+            workers *= 2
@@ -0,0 +1,270 @@
+import http.client
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rule_engine.serializers import BulkImportRulesSerializer
+from rule_engine_core.generators import random_record, random_rule
+
+# Relative weight of each request kind in the default mix
+DEFAULT_MIX = 'list=2,evaluate=6,combine=1,create=1'
+
+# Header carrying the request kind, so the server side can attribute queries
+LABEL_HEADER = 'X-Loadtest-Label'
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def parse_mix(value):
+    """Parse `kind=weight,...` into a dict of positive weights."""
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in REQUESTS:
+            raise CommandError(f"Unknown request kind {kind!r}; choose from {', '.join(REQUESTS)}.")
+        try:
+            mix[kind] = float(weight) if weight else 1.0
+        except ValueError:
+            raise CommandError(f"Invalid weight for {kind}: {weight!r}")
+        if mix[kind] < 0:
+            raise CommandError(f"The weight of {kind} must not be negative.")
+    if not any(mix.values()):
+        raise CommandError("The request mix is empty.")
+    return mix
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryCountingApp:
+    """
+    WSGI wrapper around Django that counts the database queries of each
+    request, grouped by the request's `X-Loadtest-Label` header.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.queries = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        # Each request runs in its own server thread, with its own connection
+        with connection.execute_wrapper(counter):
+            response = self.application(environ, start_response)
+        with self._lock:
+            self.queries[environ.get('HTTP_X_LOADTEST_LABEL', '')].append(count)
+        return response
+
+
+class RequestFactory:
+    """Builds the method, path and body of each request kind."""
+
+    def __init__(self, seed, rule_ids):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self.rule_ids = rule_ids
+
+    def build(self, kind):
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            rng = random.Random(self._rng.random())
+        return REQUESTS[kind](self, rng, sequence)
+
+    def list_rules(self, rng, sequence):
+        return 'GET', reverse('rules_list_create'), None
+
+    def create(self, rng, sequence):
+        body = {'name': f"loadtest-{sequence}", 'rule_string': random_rule(rng)}
+        return 'POST', reverse('rules_list_create'), body
+
+    def evaluate(self, rng, sequence):
+        body = {'rule_id': rng.choice(self.rule_ids), 'user_data': random_record(rng)}
+        return 'POST', reverse('evaluate_rule'), body
+
+    def evaluate_fast(self, rng, sequence):
+        body = {'rule_id': rng.choice(self.rule_ids), 'user_data': random_record(rng)}
+        return 'POST', reverse('evaluate_rule_fast'), body
+
+    def combine(self, rng, sequence):
+        body = {
+            'rule_ids': rng.sample(self.rule_ids, min(len(self.rule_ids), rng.randint(2, 3))),
+            'operator': rng.choice(['AND', 'OR']),
+            'name': f"loadtest-combined-{sequence}",
+        }
+        return 'POST', reverse('combine_rules'), body
+
+    def match(self, rng, sequence):
+        return 'POST', reverse('match_rules'), {'user_data': random_record(rng)}
+
+
+REQUESTS = {
+    'list': RequestFactory.list_rules,
+    'create': RequestFactory.create,
+    'evaluate': RequestFactory.evaluate,
+    'evaluate-fast': RequestFactory.evaluate_fast,
+    'combine': RequestFactory.combine,
+    'match': RequestFactory.match,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the REST endpoints over real HTTP on this machine. Creates a "
+        "temporary SQLite database seeded with synthetic rules, serves the app "
+        "with Django's threaded WSGI server on 127.0.0.1, drives a weighted mix "
+        "of concurrent requests, and reports throughput, p50/p95/p99 latency and "
+        "database queries per request for each kind of request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f"Weighted request kinds, from {', '.join(REQUESTS)} (default: {DEFAULT_MIX}).")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests sent in total.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Client threads sending requests.")
+        parser.add_argument('--seed-rules', type=int, default=200, help="Rules stored before the test starts.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Also write the report to this JSON file.")
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency']) <= 0 or options['seed_rules'] < 3:
+            raise CommandError("--requests and --concurrency must be positive and --seed-rules at least 3.")
+        mix = parse_mix(options['mix'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Django's test database machinery creates and migrates the temporary
+            # database and points every connection at it
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, '127.0.0.1']):
+                    report = self._run(mix, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._write(report, options)
+
+    def _seed(self, count, seed):
+        rng = random.Random(seed)
+        items = [{'name': f"seed-{index}", 'rule_string': random_rule(rng)} for index in range(count)]
+        serializer = BulkImportRulesSerializer(data={'rules': items})
+        serializer.is_valid(raise_exception=True)
+        summary = serializer.save()
+        return [rule['id'] for rule in summary['rules']]
+
+    def _run(self, mix, options):
+        rule_ids = self._seed(options['seed_rules'], options['seed'])
+        factory = RequestFactory(options['seed'], rule_ids)
+        rng = random.Random(options['seed'])
+        kinds = rng.choices(list(mix), weights=list(mix.values()), k=options['requests'])
+
+        app = QueryCountingApp(WSGIHandler())
+        server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietRequestHandler)
+        server.set_app(app)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        host, port = server.server_address[:2]
+
+        def send(kind):
+            method, path, body = factory.build(kind)
+            headers = {LABEL_HEADER: kind, 'Content-Type': 'application/json'}
+            client = http.client.HTTPConnection(host, port, timeout=60)
+            start = time.perf_counter()
+            try:
+                client.request(method, path, json.dumps(body) if body is not None else None, headers)
+                response = client.getresponse()
+                response.read()
+                ok = 200 <= response.status < 300
+            except OSError:
+                ok = False
+            finally:
+                client.close()
+            return kind, time.perf_counter() - start, ok
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                outcomes = list(executor.map(send, kinds))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        latencies, errors = defaultdict(list), defaultdict(int)
+        for kind, latency, ok in outcomes:
+            latencies[kind].append(latency)
+            errors[kind] += not ok
+
+        endpoints = {}
+        for kind in sorted(latencies, key=list(mix).index):
+            values = sorted(latencies[kind])
+            queries = app.queries.get(kind, [])
+            endpoints[kind] = {
+                'requests': len(values),
+                'errors': errors[kind],
+                'rps': len(values) / elapsed,
+                'mean_ms': statistics.fmean(values) * 1000,
+                'p50_ms': _percentile(values, 0.5) * 1000,
+                'p95_ms': _percentile(values, 0.95) * 1000,
+                'p99_ms': _percentile(values, 0.99) * 1000,
+                'queries_mean': statistics.fmean(queries) if queries else 0.0,
+                'queries_max': max(queries, default=0),
+            }
+        return {
+            'requests': len(outcomes),
+            'errors': sum(errors.values()),
+            'concurrency': options['concurrency'],
+            'seed_rules': options['seed_rules'],
+            'elapsed_s': elapsed,
+            'rps': len(outcomes) / elapsed,
+            'endpoints': endpoints,
+        }
+
+    def _write(self, report, options):
+        self.stdout.write(
+            f"{report['requests']} requests ({report['errors']} failed), concurrency {report['concurrency']}, "
+            f"{report['seed_rules']} seeded rules: {report['rps']:.1f} req/s in {report['elapsed_s']:.2f}s"
+        )
+        self.stdout.write(
+            f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8} {'max q':>6}"
+        )
+        for kind, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{kind:<14} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8.1f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                f"{stats['queries_mean']:>8.2f} {stats['queries_max']:>6}"
+            )
+        if options['output']:
+            try:
+                with open(options['output'], 'w', encoding='utf-8') as file:
+                    json.dump(report, file, indent=2)
+            except OSError as e:
+                raise CommandError(str(e))
@@ -0,0 +1,83 @@
+"""
+Metrics of the rule engine endpoints, served at `/metrics`.
+
+Evaluations are counted per rule and result, and timed per kind of request
+(`single`, `batch`, `stream` or `match`); a batch or stream is observed once,
+for the time spent evaluating all its records. Rule combinations are counted
+and timed, and parses are recorded by `rule_engine_core.rule_functions`. The
+statistics of the process caches and the rule-set snapshot are read when the
+metrics are rendered, so they cost nothing on the request path.
+
+Set `RULE_ENGINE_METRICS_PER_RULE = False` to drop the per-rule series when
+the rule set is too large to label every rule.
+"""
+from django.conf import settings
+from rule_engine_core.metrics import registry
+from rule_engine_core.rule_functions import parse_cache
+from .cache import prepared_rule_cache, result_cache
+from .models import rule_set_snapshots
+
+RULE_EVALUATIONS = registry.counter(
+    'rule_engine_rule_evaluations_total', "Evaluations of each rule, by result.", ('rule_id', 'result')
+)
+EVALUATIONS = registry.counter(
+    'rule_engine_evaluations_total', "Records evaluated, by kind of request and result.", ('kind', 'result')
+)
+EVALUATION_ERRORS = registry.counter(
+    'rule_engine_evaluation_errors_total', "Evaluations that failed, by kind of request.", ('kind',)
+)
+EVALUATION_SECONDS = registry.histogram(
+    'rule_engine_evaluation_seconds', "Time to evaluate a request, by kind of request.", ('kind',)
+)
+COMBINES = registry.counter('rule_engine_combines_total', "Rule combinations, by outcome.", ('outcome',))
+COMBINE_SECONDS = registry.histogram('rule_engine_combine_seconds', "Time to combine rules into a new rule.")
+
+
+def record_evaluations(kind: str, rule_id: int, matched: int, count: int, seconds: float) -> None:
+    """Record `count` evaluations of a rule, `matched` of them true, taking `seconds` in total."""
+    EVALUATION_SECONDS.observe(seconds, kind)
+    per_rule = getattr(settings, 'RULE_ENGINE_METRICS_PER_RULE', True)
+    # A single evaluation touches one series of each counter
+    if matched:
+        EVALUATIONS.inc(kind, 'true', amount=matched)
+        if per_rule:
+            RULE_EVALUATIONS.inc(rule_id, 'true', amount=matched)
+    if count > matched:
+        EVALUATIONS.inc(kind, 'false', amount=count - matched)
+        if per_rule:
+            RULE_EVALUATIONS.inc(rule_id, 'false', amount=count - matched)
+
+
+def _process_metrics():
+    caches = {
+        'parse': parse_cache.stats(),
+        'prepared_rule': prepared_rule_cache.stats(),
+        'result': result_cache.stats(),
+    }
+
+    def per_cache(field):
+        return [({'cache': name}, stats[field]) for name, stats in caches.items() if field in stats]
+
+    def hit_ratio(stats):
+        lookups = stats['hits'] + stats['misses']
+        return stats['hits'] / lookups if lookups else 0.0
+
+    yield ('rule_engine_cache_hits_total', 'counter', "Cache lookups that found an entry.", per_cache('hits'))
+    yield ('rule_engine_cache_misses_total', 'counter', "Cache lookups that found no entry.", per_cache('misses'))
+    yield ('rule_engine_cache_evictions_total', 'counter', "Cache entries evicted to respect the size bound.",
+           per_cache('evictions'))
+    yield ('rule_engine_cache_hit_ratio', 'gauge', "Share of cache lookups that found an entry.",
+           [({'cache': name}, hit_ratio(stats)) for name, stats in caches.items()])
+    yield ('rule_engine_cache_entries', 'gauge', "Entries held by each cache.", per_cache('size'))
+
+    snapshot = rule_set_snapshots.stats()
+    if snapshot['version'] is not None:
+        yield ('rule_engine_rule_set_version', 'gauge', "Rule-set version of the current snapshot.",
+               [({}, snapshot['version'])])
+    yield ('rule_engine_rule_set_rules', 'gauge', "Rules in the current rule-set snapshot.", [({}, snapshot['rules'])])
+    yield ('rule_engine_rule_set_checks_total', 'counter', "Rule-set version checks against the database.",
+           [({}, snapshot['checks'])])
+    yield ('rule_engine_rule_set_builds_total', 'counter', "Rule-set snapshots built.", [({}, snapshot['builds'])])
+
+
+registry.register_collector(_process_metrics)
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rule_engine", "0002_rule_created_at_rule_updated_at_alter_rule_ast_json_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rule",
+            name="optimized_ast_json",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
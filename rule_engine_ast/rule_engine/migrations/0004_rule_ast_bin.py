@@ -0,0 +1,127 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:40
+
+import json
+import struct
+import sys
+from array import array
+
+from django.db import migrations, models
+
+# Version 1 of the `rule_engine_core.binary_ast` encoding, frozen here so this
+# migration keeps writing the same bytes whatever later changes the live
+# encoder. It reads the stored `ast_to_json` trees directly.
+_MAGIC = b"RAST"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBBHI")
+_CONDITION = struct.Struct("<HBB")
+_LENGTH = struct.Struct("<I")
+_FLOAT = struct.Struct("<d")
+_INT = struct.Struct("<q")
+_TAG_FLOAT, _TAG_INT, _TAG_STR, _TAG_JSON = 0, 1, 2, 3
+_OP_OPERAND, _OP_CONSTANT = 0, 1
+_BINARY_OPCODES = {"AND": 2, "OR": 3}
+_NARY_OPCODES = {"AND": 4, "OR": 5}
+_CONDITION_KEYS = {"identifier", "operator", "value"}
+
+
+def _encode_value(value):
+    if isinstance(value, float):
+        return _TAG_FLOAT, _FLOAT.pack(value)
+    if isinstance(value, int) and not isinstance(value, bool) and -(2 ** 63) <= value <= 2 ** 63 - 1:
+        return _TAG_INT, _INT.pack(value)
+    if isinstance(value, str):
+        tag, encoded = _TAG_STR, value.encode("utf-8")
+    else:
+        tag, encoded = _TAG_JSON, json.dumps(value).encode("utf-8")
+    return tag, _LENGTH.pack(len(encoded)) + encoded
+
+
+def _program(tree, conditions, indexes):
+    """Return the postfix `(opcodes, args)` of a JSON tree, adding its conditions to the shared table."""
+    opcodes, args = array("B"), array("I")
+    stack = [(tree, False)]
+    while stack:
+        node, expanded = stack.pop()
+        node_type, value = node["type"], node["value"]
+        if node_type == "operand":
+            if not isinstance(value, dict) or value.keys() != _CONDITION_KEYS:
+                raise ValueError(f"Unsupported operand condition: {value!r}")
+            key = (value["identifier"], value["operator"], type(value["value"]), value["value"])
+            try:
+                index = indexes.get(key)
+            except TypeError:
+                raise ValueError(f"Unsupported operand value: {value['value']!r}")
+            if index is None:
+                index = indexes[key] = len(conditions)
+                conditions.append(value)
+            opcodes.append(_OP_OPERAND)
+            args.append(index)
+        elif node_type == "constant" and value is False:
+            opcodes.append(_OP_CONSTANT)
+            args.append(0)
+        elif node_type == "operator" and value in _BINARY_OPCODES:
+            children = node.get("children")
+            if children is not None:
+                if expanded:
+                    opcodes.append(_NARY_OPCODES[value])
+                    args.append(len(children))
+                else:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in reversed(children))
+            elif node.get("left") is None or node.get("right") is None:
+                raise ValueError("Binary operator nodes need both operands.")
+            elif expanded:
+                opcodes.append(_BINARY_OPCODES[value])
+                args.append(2)
+            else:
+                stack.extend(((node, True), (node["right"], False), (node["left"], False)))
+        else:
+            raise ValueError(f"Unsupported node: {node_type} {value!r}")
+    return opcodes, args
+
+
+def encode_stored_ast(ast_json, optimized_ast_json):
+    """Encode the stored JSON ASTs of a rule in the version-1 binary format."""
+    conditions, indexes = [], {}
+    programs = [_program(ast_json, conditions, indexes)]
+    if optimized_ast_json is not None:
+        programs.append(_program(optimized_ast_json, conditions, indexes))
+
+    parts = [_HEADER.pack(_MAGIC, _VERSION, len(programs), 0, len(conditions))]
+    for condition in conditions:
+        identifier = condition["identifier"].encode("utf-8")
+        operator = condition["operator"].encode("utf-8")
+        tag, value = _encode_value(condition["value"])
+        parts += [_CONDITION.pack(len(identifier), len(operator), tag), identifier, operator, value]
+    for opcodes, args in programs:
+        if sys.byteorder != "little":
+            args.byteswap()
+        count = len(opcodes)
+        parts += [_LENGTH.pack(count), opcodes.tobytes(), b"\0" * (-count % 4), args.tobytes()]
+    return b"".join(parts)
+
+
+def encode_stored_asts(apps, schema_editor):
+    Rule = apps.get_model("rule_engine", "Rule")
+    for rule in Rule.objects.filter(ast_json__isnull=False).only("id", "ast_json", "optimized_ast_json"):
+        try:
+            rule.ast_bin = encode_stored_ast(rule.ast_json, rule.optimized_ast_json)
+        except (KeyError, TypeError, ValueError):
+            # Left NULL: the rule is then read from its JSON columns
+            continue
+        rule.save(update_fields=["ast_bin"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rule_engine", "0003_rule_optimized_ast_json"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rule",
+            name="ast_bin",
+            field=models.BinaryField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(encode_stored_asts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rule_engine", "0004_rule_ast_bin"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="rule",
+            index=models.Index(fields=["-created_at", "-id"], name="rule_created_id_idx"),
+        ),
+    ]
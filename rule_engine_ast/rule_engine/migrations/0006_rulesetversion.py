@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    RuleSetVersion = apps.get_model("rule_engine", "RuleSetVersion")
+    RuleSetVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rule_engine", "0005_rule_created_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RuleSetVersion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -1,42 +1,218 @@
 from django.db import models
-from rule_engine_core.rule_functions import create_rule, ast_to_json
+from rule_engine_core.rule_functions import create_rule, ast_to_json, json_to_ast
+from rule_engine_core.binary_ast import BinaryRule, encode_rule
 from rule_engine_core.rule_functions import ParseError, TokenizationError
+from rule_engine_core.optimizer import optimize
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from asgiref.sync import sync_to_async
 from django.utils import timezone
+from .cache import prepare_rule, prepared_rule_cache, result_cache
+from .snapshots import RuleSetSnapshots
 
 class Rule(models.Model):
     name = models.CharField(max_length=100, unique=True)
     rule_string = models.TextField()
     ast_json = models.JSONField(null=True, blank=True, editable=False)
+    optimized_ast_json = models.JSONField(null=True, blank=True, editable=False)
+    # Binary encoding of the AST and optimized AST, decoded without JSON parsing
+    ast_bin = models.BinaryField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def get_ast(self):
+        """
+        Return the AST of the current `rule_string`.
+
+        An AST supplied to `save(ast=...)` is reused as long as `rule_string`
+        is unchanged; otherwise the string is parsed once and remembered.
+        """
+        parsed = getattr(self, '_parsed_ast', None)
+        if parsed is None or parsed[0] != self.rule_string:
+            parsed = (self.rule_string, create_rule(self.rule_string))
+            self._parsed_ast = parsed
+        return parsed[1]
+
+    def get_optimized_ast(self):
+        """
+        Return the stored optimized AST, decoded from `ast_bin`.
+
+        Rows saved before `ast_bin` existed fall back to the JSON columns.
+        """
+        if self.ast_bin is not None:
+            stored = BinaryRule(self.ast_bin)
+            optimized = stored.optimized_node()
+            return optimized if optimized is not None else stored.to_node()
+        return json_to_ast(self.optimized_ast_json or self.ast_json)
+
     def clean(self):
         # Validate rule_string before saving
         try:
-            ast = create_rule(self.rule_string)
+            ast = self.get_ast()
             if ast is None:
                 raise ValidationError("Rule string cannot be empty.")
         except (ParseError, TokenizationError) as e:
             raise ValidationError(f"Invalid rule string: {e}")
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, ast=None, **kwargs):
+        """
+        Validate and save the rule, storing its AST as JSON.
+
+        Pass `ast` when the AST of `rule_string` is already known (for example
+        when combining stored rules) to skip parsing the string.
+        """
         if not self.rule_string.strip():
             raise ValidationError("Rule string cannot be empty or just whitespace.")
 
+        if ast is not None:
+            self._parsed_ast = (self.rule_string, ast)
         self.full_clean()
         try:
             with transaction.atomic():
-                ast = create_rule(self.rule_string)
+                ast = self.get_ast()
                 self.ast_json = ast_to_json(ast)
+                # Store the optimized tree alongside; evaluation runs on it
+                optimized = optimize(ast).ast
+                self.optimized_ast_json = ast_to_json(optimized)
+                self.ast_bin = encode_rule(ast, optimized)
                 super().save(*args, **kwargs)
+                previous_key, key = RuleSetVersion.bump()
         except ValidationError as ve:
             raise ve
         except Exception as e:
             raise ValidationError(f"Error saving rule: {e}")
+        else:
+            rule_set_snapshots.apply(previous_key, key, saved=[self])
+        finally:
+            # Drop any prepared copy of this rule cached by the evaluate endpoints
+            prepared_rule_cache.invalidate(self.pk)
+            result_cache.invalidate(self.pk)
+
+    def delete(self, *args, **kwargs):
+        rule_id = self.pk
+        try:
+            with transaction.atomic():
+                deleted = super().delete(*args, **kwargs)
+                previous_key, key = RuleSetVersion.bump()
+            rule_set_snapshots.apply(previous_key, key, deleted=[rule_id])
+            return deleted
+        finally:
+            prepared_rule_cache.invalidate(rule_id)
+            result_cache.invalidate(rule_id)
+
+    @classmethod
+    def bulk_insert(cls, rules, batch_size=500):
+        """
+        Insert many rules in one transaction with `bulk_create`.
+
+        Unlike `save`, no validation or parsing happens here: every rule must
+        already be validated and carry its `ast_json`, `optimized_ast_json`
+        and `ast_bin`.
+
+        Returns:
+            list: The created rules, with their IDs set.
+        """
+        try:
+            with transaction.atomic():
+                created = cls.objects.bulk_create(rules, batch_size=batch_size)
+                previous_key, key = RuleSetVersion.bump()
+            rule_set_snapshots.apply(previous_key, key, saved=created)
+            return created
+        finally:
+            for rule in rules:
+                if rule.pk is not None:
+                    prepared_rule_cache.invalidate(rule.pk)
+                    result_cache.invalidate(rule.pk)
+
+    @classmethod
+    def get_prepared(cls, rule_id):
+        """
+        Return the prepared (compiled) rule for `rule_id` from the process-local
+        cache, loading it with a single query on a miss.
+
+        The rule-set version is checked at most once per check interval; after
+        another process has changed the rules, each cached rule is checked
+        against its stored `updated_at` once before it is served again.
+
+        Raises:
+            Rule.DoesNotExist: If no rule with this ID exists.
+        """
+        return prepared_rule_cache.get(
+            rule_id,
+            lambda pk: cls.objects.only('id', 'updated_at', 'ast_bin').get(id=pk),
+            read_version=RuleSetVersion.current,
+            read_updated_at=cls._read_updated_at,
+        )
+
+    @classmethod
+    def _read_updated_at(cls, rule_id):
+        return cls.objects.filter(id=rule_id).values_list('updated_at', flat=True).first()
 
+    @classmethod
+    async def _aread_updated_at(cls, rule_id):
+        return await cls.objects.filter(id=rule_id).values_list('updated_at', flat=True).afirst()
 
+    @classmethod
+    def get_snapshot(cls):
+        """
+        Return the current `RuleSetSnapshot` of this process: every rule,
+        prepared, as of one rule-set version.
+        """
+        return rule_set_snapshots.get()
+
+    @classmethod
+    def get_matcher(cls):
+        """
+        Return a `PredicateIndex` over every stored rule.
+
+        The index belongs to the current rule-set snapshot, so a warm lookup
+        costs at most one primary-key query per check interval.
+        """
+        return cls.get_snapshot().matcher
+
+    @classmethod
+    def load_prepared_rules(cls):
+        """Return `{id: PreparedRule}` for every stored rule."""
+        return {
+            rule.id: prepare_rule(rule)
+            for rule in cls.objects.only('id', 'updated_at', 'ast_bin').order_by('id').iterator(chunk_size=2000)
+        }
+
+    @classmethod
+    async def aget_prepared(cls, rule_id):
+        """
+        Async variant of `get_prepared`, loading the row with the async ORM.
+
+        Raises:
+            Rule.DoesNotExist: If no rule with this ID exists.
+        """
+        return await prepared_rule_cache.aget(
+            rule_id,
+            cls._aload_for_evaluation,
+            read_version=RuleSetVersion.acurrent,
+            read_updated_at=cls._aread_updated_at,
+        )
+
+    @classmethod
+    async def aget_matcher(cls):
+        """
+        Async variant of `get_matcher`.
+
+        The rule-set version is checked with the async ORM; only building the
+        snapshot or its index leaves the event loop.
+        """
+        snapshot = await rule_set_snapshots.aget()
+        if not snapshot.has_matcher:
+            return await sync_to_async(lambda: snapshot.matcher)()
+        return snapshot.matcher
+
+    @classmethod
+    async def _aload_for_evaluation(cls, rule_id):
+        rule = await cls.objects.only('id', 'updated_at', 'ast_bin').aget(id=rule_id)
+        if rule.ast_bin is None:
+            # Deferred fields cannot be loaded lazily from async code
+            await rule.arefresh_from_db(fields=['ast_json', 'optimized_ast_json'])
+        return rule
 
     def __str__(self):
         return self.name
@@ -44,4 +220,47 @@ class Rule(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['name']),
-        ]
\ No newline at end of file
+            # Keyset pagination of the rule list
+            models.Index(fields=['-created_at', '-id'], name='rule_created_id_idx'),
+        ]
+
+class RuleSetVersion(models.Model):
+    """
+    Version of the whole rule set, stored in a single row.
+
+    Every `Rule` write bumps it in the same transaction, so each process can
+    tell with one primary-key query whether its rule-set snapshot is current.
+    Bulk `QuerySet.update()`/`delete()` calls bypass it.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def current(cls):
+        """Return the `(version, updated_at)` key of the rule set."""
+        return cls.objects.filter(pk=1).values_list('version', 'updated_at').first() or (0, None)
+
+    @classmethod
+    async def acurrent(cls):
+        """Async variant of `current`."""
+        return await cls.objects.filter(pk=1).values_list('version', 'updated_at').afirst() or (0, None)
+
+    @classmethod
+    def bump(cls):
+        """
+        Increment the version; call inside the transaction of the write.
+
+        Returns:
+            tuple: The previous and the new `(version, updated_at)` keys.
+        """
+        row, _ = cls.objects.select_for_update().get_or_create(pk=1)
+        previous = (row.version, row.updated_at)
+        row.version += 1
+        row.updated_at = timezone.now()
+        row.save(update_fields=['version', 'updated_at'])
+        return previous, (row.version, row.updated_at)
+
+
+rule_set_snapshots = RuleSetSnapshots(
+    RuleSetVersion.current, Rule.load_prepared_rules, aread_version=RuleSetVersion.acurrent
+)
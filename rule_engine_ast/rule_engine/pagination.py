@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class RuleCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the rule list, newest first.
+
+    Pages are fetched with `created_at < cursor` on the `(created_at, id)`
+    index instead of a `COUNT(*)` and an `OFFSET` scan, so deep pages cost
+    the same as the first one.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
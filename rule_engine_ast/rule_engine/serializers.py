@@ -1,18 +1,31 @@
+import logging
+import time
+from django.conf import settings
+from django.db import IntegrityError
 from rest_framework import serializers
+from .cache import result_cache
+from .metrics import COMBINE_SECONDS, COMBINES, EVALUATION_ERRORS, EVALUATION_SECONDS, record_evaluations
 from .models import Rule
+from .workers import encode_rules_in_pool, score_in_pool
+from rule_engine_core.binary_ast import decode_rule
+from rule_engine_core.parallel import encode_rule_string
 from rule_engine_core.rule_functions import (
     ParseError,
     TokenizationError,
     EvaluationError,
+    CompilationError,
     ast_to_json,
     json_to_ast,
-    combine_rules,
+    combine_asts,
+    ast_to_rule_string,
     evaluate_rule,
     create_rule,
     evaluate_rule_with_details
 )
 from rule_engine_core.parser import VALID_ATTRIBUTES
 
+logger = logging.getLogger(__name__)
+
 class RuleSerializer(serializers.ModelSerializer):
     """
     Serializer for the Rule model.
@@ -25,12 +38,27 @@ class RuleSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'rule_string', 'ast_json', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    # Fields listed by default; the list UI never needs the AST
+    LIST_FIELDS = ('id', 'name', 'rule_string', 'created_at', 'updated_at')
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        Args:
+            fields (iterable, optional): Names of the fields to serialize; all
+                fields when omitted.
+        """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def validate(self, data):
         """
         Validate the rule string or AST JSON.
 
         Ensures that either 'rule_string' or 'ast_json' is provided and valid.
-        Parses the rule string into an AST to verify its correctness.
+        Parses the rule string into an AST to verify its correctness; the AST
+        is kept in the validated data so that saving does not parse it again.
 
         Args:
             data (dict): The data to validate.
@@ -49,6 +77,7 @@ class RuleSerializer(serializers.ModelSerializer):
                     raise serializers.ValidationError({"rule_string": "Rule string cannot be empty."})
             except (ParseError, TokenizationError) as e:
                 raise serializers.ValidationError({"rule_string": f"Invalid rule string: {e}"})
+            data['ast'] = ast
         elif 'ast_json' in data:
             # Validate the AST JSON by attempting to reconstruct the AST
             try:
@@ -75,18 +104,17 @@ class RuleSerializer(serializers.ModelSerializer):
         Raises:
             serializers.ValidationError: If 'rule_string' is missing or invalid.
         """
-        rule_string = validated_data.get('rule_string')
+        ast = validated_data.pop('ast', None)
+        # The stored AST is always derived from the rule string
+        validated_data.pop('ast_json', None)
 
-        if rule_string:
-            # Generate the AST from the rule string
-            ast = create_rule(rule_string)
-            # Serialize the AST to JSON for storage
-            validated_data['ast_json'] = ast_to_json(ast)
-        else:
+        if not validated_data.get('rule_string'):
             raise serializers.ValidationError({"rule_string": "This field cannot be blank."})
 
-        # Call the superclass method to create the instance
-        return super().create(validated_data)
+        # Save with the AST parsed during validation instead of parsing again
+        instance = Rule(**validated_data)
+        instance.save(ast=ast)
+        return instance
 
     def update(self, instance, validated_data):
         """
@@ -106,17 +134,129 @@ class RuleSerializer(serializers.ModelSerializer):
         instance.name = validated_data.get('name', instance.name)
         instance.rule_string = validated_data.get('rule_string', instance.rule_string)
 
-        # Regenerate the AST from the updated rule string
-        try:
-            ast = create_rule(instance.rule_string)
-            instance.ast_json = ast_to_json(ast)
-        except Exception as e:
-            raise serializers.ValidationError({"error": f"Failed to generate AST: {e}"})
+        # Reuse the AST parsed during validation instead of parsing the string again
+        ast = validated_data.get('ast')
+        if ast is None:
+            try:
+                ast = instance.get_ast()
+            except Exception as e:
+                raise serializers.ValidationError({"error": f"Failed to generate AST: {e}"})
 
         # Save the updated instance
-        instance.save()
+        instance.save(ast=ast)
         return instance
 
+class RuleImportItemSerializer(serializers.Serializer):
+    """
+    Validates one item of a bulk import.
+    """
+    name = serializers.CharField(max_length=100)
+    rule_string = serializers.CharField()
+
+class BulkImportRulesSerializer(serializers.Serializer):
+    """
+    Serializer to create many rules in one request.
+
+    Items are validated independently: invalid items are reported with their
+    index while the valid ones are still created. Rule strings are parsed in
+    the worker pool for large imports, and all rules are inserted with a
+    single `bulk_create`.
+    """
+    rules = serializers.JSONField(required=True)
+
+    def validate_rules(self, value):
+        """
+        Validate that rules is a non-empty list within the import limit.
+
+        Args:
+            value (list): The items to import.
+
+        Returns:
+            list: The validated items.
+
+        Raises:
+            serializers.ValidationError: If the list is malformed or too large.
+        """
+        if not isinstance(value, list) or not value:
+            raise serializers.ValidationError("Rules must be a non-empty list of objects.")
+        max_rules = getattr(settings, 'RULE_ENGINE_IMPORT_MAX_RULES', 10000)
+        if len(value) > max_rules:
+            raise serializers.ValidationError(f"At most {max_rules} rules can be imported per request.")
+        return value
+
+    def create(self, validated_data):
+        """
+        Parse the valid items and insert them.
+
+        Args:
+            validated_data (dict): The validated data containing the items.
+
+        Returns:
+            dict: The created and failed counts, the ID of every created rule
+                and the errors of every failed item, each with its index.
+
+        Raises:
+            serializers.ValidationError: If a name was taken by a concurrent
+                request while importing; nothing is inserted then.
+        """
+        errors = {}
+        pending = []
+        names = set()
+        for index, item in enumerate(validated_data['rules']):
+            item_serializer = RuleImportItemSerializer(data=item)
+            if not item_serializer.is_valid():
+                errors[index] = item_serializer.errors
+                continue
+            name = item_serializer.validated_data['name']
+            if name in names:
+                errors[index] = {"name": ["Duplicate name in this import."]}
+                continue
+            names.add(name)
+            pending.append((index, name, item_serializer.validated_data['rule_string']))
+
+        # Look names up in chunks to stay below the database's parameter limit
+        names = list(names)
+        existing = set()
+        for start in range(0, len(names), 500):
+            existing.update(Rule.objects.filter(name__in=names[start:start + 500]).values_list('name', flat=True))
+        for index, name, _ in pending:
+            if name in existing:
+                errors[index] = {"name": ["rule with this name already exists."]}
+        pending = [item for item in pending if item[1] not in existing]
+
+        # Parsing dominates the import, so large imports are parsed in the worker pool
+        rule_strings = [rule_string for _, _, rule_string in pending]
+        encoded = encode_rules_in_pool(rule_strings)
+        if encoded is None:
+            encoded = [encode_rule_string(rule_string) for rule_string in rule_strings]
+
+        rules, indexes = [], []
+        for (index, name, rule_string), (ast_bin, error) in zip(pending, encoded):
+            if error:
+                errors[index] = {"rule_string": [error]}
+                continue
+            ast, optimized = decode_rule(ast_bin)
+            rules.append(Rule(
+                name=name,
+                rule_string=rule_string,
+                ast_json=ast_to_json(ast),
+                optimized_ast_json=ast_to_json(optimized),
+                ast_bin=ast_bin,
+            ))
+            indexes.append(index)
+
+        try:
+            created = Rule.bulk_insert(rules)
+        except IntegrityError:
+            raise serializers.ValidationError("A rule with one of these names was created during the import; retry it.")
+
+        return {
+            'created': len(created),
+            'failed': len(errors),
+            'rules': [{'index': index, 'id': rule.id, 'name': rule.name} for index, rule in zip(indexes, created)],
+            'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+        }
+
 class CombineRulesSerializer(serializers.Serializer):
     """
     Serializer to handle combining multiple rules into a new rule.
@@ -185,45 +325,47 @@ class CombineRulesSerializer(serializers.Serializer):
         operator = validated_data.get('operator', 'OR')
         name = validated_data['name']
 
-        # Fetch the Rule instances from the database
-        rules = Rule.objects.filter(id__in=rule_ids)
-
-        # Create combined rule string by joining individual rule strings
-        rule_expressions = [f"({rule.rule_string})" for rule in rules]
-        combined_rule_string = f" {operator} ".join(rule_expressions)
+        start = time.perf_counter()
+        # Fetch the stored ASTs of the Rule instances, keeping the requested order
+        rules = Rule.objects.only('id', 'rule_string', 'ast_json').in_bulk(rule_ids)
 
         try:
-            # Combine the ASTs of the individual rules
-            rule_strings = [rule.rule_string for rule in rules]
-            combined_ast = combine_rules(rule_strings, operator=operator)
-
-            # Create a new Rule instance with the combined rule string and AST
-            new_rule = Rule.objects.create(
-                name=name,
-                rule_string=combined_rule_string
-            )
-            new_rule.ast_json = ast_to_json(combined_ast)
-            new_rule.save()
-
-            return {
-                'combined_ast': combined_ast,
-                'new_rule_id': new_rule.id
-            }
+            # Compose the stored ASTs directly instead of re-parsing each rule string
+            asts = [
+                json_to_ast(rules[rule_id].ast_json) if rules[rule_id].ast_json
+                else create_rule(rules[rule_id].rule_string)
+                for rule_id in dict.fromkeys(rule_ids)
+            ]
+            combined_ast = combine_asts(asts, operator=operator)
+
+            # Create the new Rule with a single insert, reusing the combined AST
+            new_rule = Rule(name=name, rule_string=ast_to_rule_string(combined_ast))
+            new_rule.save(ast=combined_ast)
         except Exception as e:
-            print(f"Error combining rules: {e}")  # Consider replacing with logging
+            COMBINES.inc('error')
+            logger.exception("Error combining rules %s: %s", rule_ids, e)
             raise serializers.ValidationError({"error": "An unexpected error occurred while combining rules."})
 
+        COMBINE_SECONDS.observe(time.perf_counter() - start)
+        COMBINES.inc('ok')
+        return {
+            'combined_ast': combined_ast,
+            'new_rule_id': new_rule.id
+        }
+
 class EvaluateRuleSerializer(serializers.Serializer):
     """
     Serializer to evaluate a rule against provided user data.
 
     Validates the rule ID and user data, then performs the evaluation.
+    Per-condition details are only computed when `details` is true; otherwise
+    the rule is evaluated in short-circuit mode.
     """
     rule_id = serializers.IntegerField(required=True)
     user_data = serializers.DictField(required=True)
+    details = serializers.BooleanField(default=False, required=False)
 
     result = serializers.BooleanField(read_only=True)
-    details = serializers.DictField(read_only=True)
 
     def validate_rule_id(self, value):
         """
@@ -238,7 +380,10 @@ class EvaluateRuleSerializer(serializers.Serializer):
         Raises:
             serializers.ValidationError: If the rule does not exist.
         """
-        if not Rule.objects.filter(id=value).exists():
+        try:
+            # Warms the prepared-rule cache, so `create` does not touch the database
+            Rule.get_prepared(value)
+        except Rule.DoesNotExist:
             raise serializers.ValidationError(f"Rule with ID {value} does not exist.")
         return value
 
@@ -266,25 +411,219 @@ class EvaluateRuleSerializer(serializers.Serializer):
         Evaluate the specified rule against the provided user data.
 
         Args:
-            validated_data (dict): The validated data containing rule ID and user data.
+            validated_data (dict): The validated data containing rule ID, user data and details flag.
 
         Returns:
-            dict: A dictionary containing the evaluation result and details.
+            dict: A dictionary containing the evaluation result and, if requested, the details.
 
         Raises:
             serializers.ValidationError: If evaluation fails.
         """
         rule_id = validated_data['rule_id']
+
+        try:
+            # Retrieve the compiled rule, from the cache when it is still current
+            prepared = Rule.get_prepared(rule_id)
+        except Rule.DoesNotExist:
+            raise serializers.ValidationError({"rule_id": f"Rule with ID {rule_id} does not exist."})
+        return self.evaluate(prepared, validated_data)
+
+    @staticmethod
+    def evaluate(prepared, validated_data):
+        """
+        Evaluate a prepared rule against the validated user data.
+
+        Args:
+            prepared (PreparedRule): The rule to evaluate.
+            validated_data (dict): The validated data containing user data and details flag.
+
+        Returns:
+            dict: A dictionary containing the evaluation result and, if requested, the details.
+
+        Raises:
+            serializers.ValidationError: If evaluation fails.
+        """
+        start = time.perf_counter()
         user_data = validated_data['user_data']
+        with_details = validated_data.get('details', False)
+        # Identical values of the referenced attributes give identical results
+        key = result_cache.make_key(prepared, user_data, with_details)
+        if key is not None:
+            cached = result_cache.get(key)
+            if cached is not None:
+                record_evaluations('single', prepared.rule_id, cached['result'], 1, time.perf_counter() - start)
+                return dict(cached)
 
-        # Retrieve the Rule instance
-        rule = Rule.objects.get(id=rule_id)
-        # Reconstruct the AST from stored JSON
-        ast = json_to_ast(rule.ast_json)
         try:
-            # Evaluate the rule and collect details
-            result, details = evaluate_rule_with_details(ast, user_data)
-        except EvaluationError as e:
+            if with_details:
+                # Evaluate every condition and collect details
+                result, details = evaluate_rule_with_details(prepared.compiled, user_data)
+                evaluation = {'result': result, 'details': details}
+            else:
+                evaluation = {'result': evaluate_rule(prepared.compiled, user_data)}
+        except (CompilationError, EvaluationError) as e:
+            EVALUATION_ERRORS.inc('single')
             raise serializers.ValidationError(f"Error during evaluation: {e}")
 
-        return {'result': result, 'details': details}
+        if key is not None:
+            result_cache.put(key, evaluation)
+        record_evaluations('single', prepared.rule_id, evaluation['result'], 1, time.perf_counter() - start)
+        return dict(evaluation)
+
+class AsyncEvaluateRuleSerializer(EvaluateRuleSerializer):
+    """
+    Validates evaluation requests for the async view.
+
+    The rule lookup cannot run inside validation from async code, so the view
+    checks that the rule exists when it loads it with `Rule.aget_prepared`.
+    """
+
+    def validate_rule_id(self, value):
+        return value
+
+class BatchEvaluateRuleSerializer(serializers.Serializer):
+    """
+    Serializer to evaluate one rule against a list of records.
+
+    The rule is resolved and compiled once per batch, and record attributes are
+    validated once over the union of all record keys.
+    """
+    rule_id = serializers.IntegerField(required=True)
+    records = serializers.JSONField(required=True)
+    details = serializers.BooleanField(default=False, required=False)
+
+    validate_rule_id = EvaluateRuleSerializer.validate_rule_id
+
+    def validate_records(self, value):
+        """
+        Validate that records is a non-empty list of objects with valid attributes.
+
+        Args:
+            value (list): The records to validate.
+
+        Returns:
+            list: The validated records.
+
+        Raises:
+            serializers.ValidationError: If the list is malformed, too large or
+                contains invalid attributes.
+        """
+        if not isinstance(value, list) or not value:
+            raise serializers.ValidationError("Records must be a non-empty list of objects.")
+        max_records = getattr(settings, 'RULE_ENGINE_BATCH_MAX_RECORDS', 10000)
+        if len(value) > max_records:
+            raise serializers.ValidationError(f"At most {max_records} records can be evaluated per batch.")
+
+        attributes = set()
+        for index, record in enumerate(value):
+            if not isinstance(record, dict):
+                raise serializers.ValidationError(f"Record at index {index} must be an object.")
+            attributes.update(record.keys())
+
+        invalid_attrs = attributes - VALID_ATTRIBUTES
+        if invalid_attrs:
+            raise serializers.ValidationError(f"Invalid attributes in records: {', '.join(sorted(invalid_attrs))}")
+        return value
+
+    def create(self, validated_data):
+        """
+        Evaluate the specified rule against every record.
+
+        Args:
+            validated_data (dict): The validated data containing rule ID, records and details flag.
+
+        Returns:
+            dict: The rule ID, record and match counts, one result per record and,
+                if requested, the per-record evaluation details.
+
+        Raises:
+            serializers.ValidationError: If evaluation fails.
+        """
+        rule_id = validated_data['rule_id']
+        records = validated_data['records']
+
+        start = time.perf_counter()
+        try:
+            prepared = Rule.get_prepared(rule_id)
+            compiled = prepared.compiled
+            if validated_data.get('details'):
+                evaluations = [compiled.evaluate_with_details(record) for record in records]
+                results = [result for result, _ in evaluations]
+                details = [record_details for _, record_details in evaluations]
+            else:
+                # Large batches are sharded across worker processes when the pool is enabled
+                results = score_in_pool(prepared, records)
+                if results is None:
+                    results = [compiled(record) for record in records]
+                details = None
+        except Rule.DoesNotExist:
+            raise serializers.ValidationError({"rule_id": f"Rule with ID {rule_id} does not exist."})
+        except (CompilationError, EvaluationError) as e:
+            EVALUATION_ERRORS.inc('batch')
+            raise serializers.ValidationError(f"Error during evaluation: {e}")
+
+        matched = sum(results)
+        record_evaluations('batch', rule_id, matched, len(results), time.perf_counter() - start)
+        evaluation = {
+            'rule_id': rule_id,
+            'count': len(results),
+            'matched': matched,
+            'results': results,
+        }
+        if details is not None:
+            evaluation['details'] = details
+        return evaluation
+
+class MatchRulesSerializer(serializers.Serializer):
+    """
+    Serializer to find every stored rule satisfied by the provided user data.
+
+    Conditions across all rules are looked up in a predicate index, and only
+    the rules that can still be satisfied are resolved.
+    """
+    user_data = serializers.DictField(required=True)
+
+    matched_rule_ids = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    rule_count = serializers.IntegerField(read_only=True)
+    predicate_count = serializers.IntegerField(read_only=True)
+
+    validate_user_data = EvaluateRuleSerializer.validate_user_data
+
+    def create(self, validated_data):
+        """
+        Match the user data against every stored rule.
+
+        Args:
+            validated_data (dict): The validated data containing the user data.
+
+        Returns:
+            dict: The matched rule IDs and the size of the evaluated rule set.
+
+        Raises:
+            serializers.ValidationError: If a stored rule cannot be compiled.
+        """
+        try:
+            matcher = Rule.get_matcher()
+        except CompilationError as e:
+            raise serializers.ValidationError(f"Error during evaluation: {e}")
+        return self.match(matcher, validated_data)
+
+    @staticmethod
+    def match(matcher, validated_data):
+        """
+        Match the validated user data with a rule-set matcher.
+
+        Args:
+            matcher (PredicateIndex): The index over every stored rule.
+            validated_data (dict): The validated data containing the user data.
+
+        Returns:
+            dict: The matched rule IDs and the size of the evaluated rule set.
+        """
+        with EVALUATION_SECONDS.time('match'):
+            matched_rule_ids = matcher.match(validated_data['user_data'])
+        return {
+            'matched_rule_ids': matched_rule_ids,
+            'rule_count': matcher.rule_count,
+            'predicate_count': matcher.predicate_count,
+        }
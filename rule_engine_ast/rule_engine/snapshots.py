@@ -0,0 +1,247 @@
+"""
+Versioned, immutable snapshots of the whole rule set.
+
+Every `Rule` write bumps the single `RuleSetVersion` row in its own
+transaction. Each process keeps one `RuleSetSnapshot` (every rule prepared,
+plus a lazily built `PredicateIndex`) tagged with the `(version,
+updated_at)` key it was built at, and compares that key with the database at
+most once per `RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL` seconds. When another
+process has changed the rules, a new snapshot is built in a background
+thread and swapped in atomically; requests keep reading the previous one in
+the meantime, so a rebuild never blocks an evaluation. Writes made by this
+process are applied to the snapshot directly.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+from typing import Awaitable, Callable, Dict, Iterable, Mapping, Optional, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from rule_engine_core.predicate_index import PredicateIndex
+from .cache import PreparedRule, prepare_rule
+
+logger = logging.getLogger(__name__)
+
+# `RuleSetVersion` version and updated_at; the timestamp tells apart versions
+# reused after a rolled-back write
+VersionKey = Tuple[int, Optional[datetime]]
+
+
+class RuleSetSnapshot:
+    """
+    An immutable view of every rule at one rule-set version.
+
+    `rules` maps rule ids to prepared rules. The matcher over all rules is
+    built on first use and shared by every reader of the snapshot.
+    """
+    __slots__ = ('key', 'rules', '_matcher', '_lock')
+
+    def __init__(self, key: VersionKey, rules: Dict[int, PreparedRule]):
+        self.key = key
+        self.rules: Mapping[int, PreparedRule] = MappingProxyType(rules)
+        self._matcher = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self.key[0]
+
+    @property
+    def has_matcher(self) -> bool:
+        return self._matcher is not None
+
+    @property
+    def matcher(self) -> PredicateIndex:
+        """A `PredicateIndex` over the optimized ASTs, in rule id order."""
+        if self._matcher is None:
+            with self._lock:
+                if self._matcher is None:
+                    self._matcher = PredicateIndex(
+                        (rule_id, prepared.compiled.optimized or prepared.ast)
+                        for rule_id, prepared in sorted(self.rules.items())
+                    )
+        return self._matcher
+
+    def replace(self, key: VersionKey, saved: Iterable[PreparedRule] = (),
+                deleted: Iterable[int] = ()) -> 'RuleSetSnapshot':
+        """Return a new snapshot with rules added, replaced or removed."""
+        rules = dict(self.rules)
+        for rule_id in deleted:
+            rules.pop(rule_id, None)
+        for prepared in saved:
+            rules[prepared.rule_id] = prepared
+        return RuleSetSnapshot(key, rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+
+class RuleSetSnapshots:
+    """
+    Holds the current `RuleSetSnapshot` of this process and keeps it fresh.
+
+    Args:
+        read_version: Returns the current `VersionKey` with one query.
+        load: Returns `{rule id: PreparedRule}` for every stored rule.
+        aread_version: Async variant of `read_version`, used by `aget`.
+    """
+
+    def __init__(self, read_version: Callable[[], VersionKey], load: Callable[[], Dict[int, PreparedRule]],
+                 clock: Callable[[], float] = time.monotonic,
+                 aread_version: Optional[Callable[[], Awaitable[VersionKey]]] = None):
+        self._read_version = read_version
+        self._aread_version = aread_version or sync_to_async(read_version)
+        self._load = load
+        self._clock = clock
+        self._snapshot: Optional[RuleSetSnapshot] = None
+        self._checked_at: Optional[float] = None
+        # Bumped by every local change; a build started earlier is discarded
+        self._generation = 0
+        self._rebuilding = False
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.builds = 0
+        self.background_builds = 0
+
+    def get(self) -> RuleSetSnapshot:
+        """
+        Return the current snapshot.
+
+        The version is checked when the check interval has elapsed. A stale
+        snapshot is still returned while its replacement is built in the
+        background; only the first call of a process builds synchronously.
+        Inside a database transaction the version is always checked and a
+        stale snapshot rebuilt in the caller, so the snapshot matches what
+        the transaction sees.
+        """
+        snapshot = self._snapshot
+        in_transaction = connection.in_atomic_block
+        if snapshot is not None and not in_transaction and not self._check_due():
+            return snapshot
+
+        key = self._read_version()
+        with self._lock:
+            self.checks += 1
+            self._checked_at = self._clock()
+            snapshot = self._snapshot
+        if snapshot is not None and snapshot.key == key:
+            return snapshot
+        if snapshot is None or in_transaction:
+            return self._rebuild()
+        self._rebuild_in_background()
+        return snapshot
+
+    async def aget(self) -> RuleSetSnapshot:
+        """
+        Async variant of `get`.
+
+        The version is read with the async ORM; only the first build of a
+        process runs in a worker thread, the event loop never builds.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and not self._check_due():
+            return snapshot
+
+        key = await self._aread_version()
+        with self._lock:
+            self.checks += 1
+            self._checked_at = self._clock()
+            snapshot = self._snapshot
+        if snapshot is not None and snapshot.key == key:
+            return snapshot
+        if snapshot is None:
+            return await sync_to_async(self._rebuild)()
+        self._rebuild_in_background()
+        return snapshot
+
+    def apply(self, previous_key: VersionKey, key: VersionKey, saved: Iterable = (),
+              deleted: Iterable[int] = ()) -> None:
+        """
+        Apply a committed local write to the current snapshot.
+
+        Args:
+            previous_key: The version key the write replaced.
+            key: The version key the write created.
+            saved: The `Rule` instances created or updated.
+            deleted: The IDs of the deleted rules.
+        """
+        with self._lock:
+            self._generation += 1
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            if snapshot.key != previous_key:
+                # Other writes happened in between: keep the old key so the next
+                # version check rebuilds the snapshot from the database
+                key = snapshot.key
+                self._checked_at = None
+            self._snapshot = snapshot.replace(key, (prepare_rule(rule) for rule in saved), deleted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+            self._checked_at = None
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                'version': snapshot.version if snapshot is not None else None,
+                'rules': len(snapshot) if snapshot is not None else 0,
+                'checks': self.checks,
+                'builds': self.builds,
+                'background_builds': self.background_builds,
+            }
+
+    def _check_due(self) -> bool:
+        interval = getattr(settings, 'RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL', 1.0)
+        checked_at = self._checked_at
+        return checked_at is None or self._clock() - checked_at >= interval
+
+    def _build(self) -> RuleSetSnapshot:
+        # The key is read first: a write racing the load makes the snapshot
+        # newer than its key, never older, and the next check rebuilds it
+        key = self._read_version()
+        return RuleSetSnapshot(key, self._load())
+
+    def _swap(self, generation: int, snapshot: RuleSetSnapshot) -> bool:
+        with self._lock:
+            self.builds += 1
+            if generation != self._generation:
+                self._checked_at = None
+                return False
+            self._snapshot = snapshot
+            return True
+
+    def _rebuild(self) -> RuleSetSnapshot:
+        generation = self._generation
+        snapshot = self._build()
+        self._swap(generation, snapshot)
+        return snapshot
+
+    def _rebuild_in_background(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+            generation = self._generation
+        threading.Thread(
+            target=self._background_rebuild, args=(generation,), name='rule-set-snapshot', daemon=True
+        ).start()
+
+    def _background_rebuild(self, generation: int) -> None:
+        try:
+            if self._swap(generation, self._build()):
+                with self._lock:
+                    self.background_builds += 1
+        except Exception:
+            logger.exception("Rebuilding the rule-set snapshot failed; serving the previous one.")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            # The thread opened its own database connection
+            connection.close()
@@ -0,0 +1,85 @@
+"""
+Generator pipeline for NDJSON evaluation.
+
+Records are read one line at a time from a file-like stream, validated,
+evaluated and written back as NDJSON lines, so memory use does not depend
+on the size of the input. A record that cannot be decoded or validated
+produces an error line instead of ending the stream.
+"""
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, Tuple
+from rule_engine_core.parser import VALID_ATTRIBUTES
+from rule_engine_core.rule_functions import EvaluationError, evaluate_rule, evaluate_rule_with_details
+from .metrics import EVALUATION_ERRORS, record_evaluations
+
+# Output lines are joined into chunks of this many before being sent
+CHUNK_LINES = 256
+
+
+def iter_ndjson_records(lines: Iterable[bytes]) -> Iterator[Tuple[int, Any, str]]:
+    """
+    Decode and validate NDJSON records.
+
+    Yields:
+        tuple: The 1-based line number, the record (or None) and an error
+            message (empty when the record is valid). Blank lines are skipped.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Record must be an object."
+            continue
+        invalid_attrs = record.keys() - VALID_ATTRIBUTES
+        if invalid_attrs:
+            yield line_number, None, f"Invalid attributes in user data: {', '.join(sorted(invalid_attrs))}"
+            continue
+        yield line_number, record, ''
+
+
+def evaluate_ndjson(prepared, lines: Iterable[bytes], details: bool = False) -> Iterator[bytes]:
+    """
+    Evaluate a prepared rule against an NDJSON stream of records.
+
+    Yields:
+        bytes: Chunks of NDJSON output, one line per input record, in input order.
+    """
+    compiled = prepared.compiled
+    chunk = []
+    # The stream is recorded once, with the time spent evaluating, when it ends
+    matched = count = errors = 0
+    seconds = 0.0
+    try:
+        for line_number, record, error in iter_ndjson_records(lines):
+            output: Dict[str, Any] = {'line': line_number}
+            if error:
+                output['error'] = error
+            else:
+                start = time.perf_counter()
+                try:
+                    if details:
+                        output['result'], output['details'] = evaluate_rule_with_details(compiled, record)
+                    else:
+                        output['result'] = evaluate_rule(compiled, record)
+                    matched += output['result']
+                    count += 1
+                except EvaluationError as e:
+                    output['error'] = str(e)
+                    errors += 1
+                seconds += time.perf_counter() - start
+            chunk.append(json.dumps(output))
+            if len(chunk) >= CHUNK_LINES:
+                yield ('\n'.join(chunk) + '\n').encode('utf-8')
+                chunk = []
+        if chunk:
+            yield ('\n'.join(chunk) + '\n').encode('utf-8')
+    finally:
+        record_evaluations('stream', prepared.rule_id, matched, count, seconds)
+        if errors:
+            EVALUATION_ERRORS.inc('stream', amount=errors)
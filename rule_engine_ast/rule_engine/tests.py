@@ -1,8 +1,57 @@
-from django.test import TestCase
+import gc
+import importlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from io import StringIO
+from asgiref.sync import sync_to_async
+from unittest import skipUnless
+from unittest.mock import patch
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
-from .models import Rule
+from .management.commands.loadtest import REQUESTS, QueryCountingApp, RequestFactory, parse_mix
+from .cache import PreparedRuleCache, prepare_rule, ResultCache, prepared_rule_cache, result_cache
+from .models import Rule, RuleSetVersion, rule_set_snapshots
+from .snapshots import RuleSetSnapshots
+from .streaming import CHUNK_LINES, evaluate_ndjson
+from . import jsoncodec
+from rule_engine_core import vectorized
+from rule_engine_core.ast_node import Node, referenced_attributes
+from rule_engine_core import benchmarks, generators
+from rule_engine_core.binary_ast import BinaryFormatError, BinaryRule, decode_rule, encode_rule
+from rule_engine_core.compact import CompactRule, ConditionPool, compact_rule
+from rule_engine_core.compiler import compile_rule
+from rule_engine_core.matcher import RuleSetMatcher
+from rule_engine_core.metrics import Registry, registry
+from rule_engine_core.optimizer import optimize
+from rule_engine_core.parallel import ScoringPool
+from rule_engine_core.predicate_index import PredicateIndex
+from rule_engine_core.scoring import Scorer
+from rule_engine_core.rule_functions import (
+    EvaluationError,
+    ParseError,
+    TokenizationError,
+    ast_to_json,
+    ast_to_rule_string,
+    combine_rules,
+    create_rule,
+    evaluate_node,
+    evaluate_node_with_details,
+    evaluate_rule,
+    json_to_ast,
+    normalize_rule_string,
+    parse_cache,
+)
+from rule_engine_core import rule_functions
 
 class RuleAPITestCase(TestCase):
     def setUp(self):
@@ -105,6 +154,18 @@ class RuleAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data['result'])
 
+    def test_evaluate_rule_details_opt_in(self):
+        url = reverse('evaluate_rule')
+        data = {
+            "rule_id": self.rule1.id,
+            "user_data": self.valid_user_data
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertNotIn('details', response.data)
+        response = self.client.post(url, dict(data, details=True), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['details'], {"age > 30.0": True, "department = 'Sales'": True})
+
     def test_evaluate_rule_failure(self):
         url = reverse('evaluate_rule')
         data = {
@@ -139,3 +200,1284 @@ class RuleAPITestCase(TestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('rule_id', response.data)
+
+
+class RuleCompilerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.rule_strings = [
+            "age > 30 AND department = 'Sales'",
+            "(age < 25 OR experience >= 5) AND salary != 50000",
+            "department > 'M' OR performance_score <= 4.5",
+            "age == 35",
+        ]
+        self.records = [
+            {"age": 35, "department": "Sales", "salary": 60000, "experience": 3},
+            {"age": "20", "department": "Marketing", "salary": 50000, "experience": 7},
+            {"age": "thirty-five", "department": 12, "performance_score": None},
+            {"age": 35.0, "experience": [1]},
+            {},
+        ]
+
+    def test_compiled_rule_matches_interpreter(self):
+        for rule_string in self.rule_strings:
+            ast = create_rule(rule_string)
+            compiled = compile_rule(ast)
+            for record in self.records:
+                expected = evaluate_node_with_details(ast, record)
+                self.assertEqual(compiled.evaluate_with_details(record), expected)
+                self.assertEqual(compiled(record), expected[0])
+                self.assertEqual(evaluate_rule(ast, record), expected[0])
+
+    def test_evaluate_node_short_circuits(self):
+        class Record(dict):
+            def __contains__(inner, key):
+                self.assertNotEqual(key, 'department')
+                return super().__contains__(key)
+
+        ast = create_rule("age > 30 AND department = 'Sales'")
+        self.assertFalse(evaluate_node(ast, Record(age=20, department='Sales')))
+
+    def test_unknown_operator_evaluates_to_false(self):
+        ast = Node('operand', value={'identifier': 'age', 'operator': '<>', 'value': 30.0})
+        self.assertFalse(compile_rule(ast)({"age": 10}))
+
+    def test_unknown_logical_operator_raises(self):
+        operand = Node('operand', value={'identifier': 'age', 'operator': '>', 'value': 30.0})
+        ast = Node('operator', value='XOR', left=operand, right=operand)
+        with self.assertRaises(EvaluationError):
+            evaluate_rule(ast, {"age": 40})
+
+
+class PreparedRuleCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        prepared_rule_cache.clear()
+        self.rule = Rule.objects.create(name="Cached Rule", rule_string="age > 30")
+
+    def test_cached_evaluation_skips_database(self):
+        url = reverse('evaluate_rule')
+        data = {"rule_id": self.rule.id, "user_data": {"age": 40}}
+        self.client.post(url, data, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.post(url, data, format='json')
+        self.assertTrue(response.data['result'])
+
+    def test_save_invalidates_cached_rule(self):
+        self.assertTrue(Rule.get_prepared(self.rule.id).compiled({"age": 40}))
+        self.rule.rule_string = "age > 50"
+        self.rule.save()
+        self.assertFalse(Rule.get_prepared(self.rule.id).compiled({"age": 40}))
+
+    def test_delete_invalidates_cached_rule(self):
+        rule_id = self.rule.id
+        Rule.get_prepared(rule_id)
+        self.rule.delete()
+        with self.assertRaises(Rule.DoesNotExist):
+            Rule.get_prepared(rule_id)
+
+    def test_lru_eviction_and_counters(self):
+        cache = PreparedRuleCache(maxsize=1)
+        other = Rule.objects.create(name="Other Rule", rule_string="age < 20")
+        loader = lambda pk: Rule.objects.get(id=pk)
+        cache.get(self.rule.id, loader)
+        cache.get(self.rule.id, loader)
+        cache.get(other.id, loader)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 2, 1))
+        self.assertEqual(len(cache), 1)
+
+    @override_settings(RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL=10)
+    def test_writes_from_other_processes_are_picked_up(self):
+        now = [0.0]
+        cache = PreparedRuleCache(clock=lambda: now[0])
+        loader = lambda pk: Rule.objects.only('id', 'updated_at', 'ast_bin').get(id=pk)
+        get = lambda: cache.get(self.rule.id, loader, RuleSetVersion.current, Rule._read_updated_at)
+        self.assertTrue(get().compiled({"age": 40}))
+
+        # Another process saves the rule: the row and the version change, but
+        # no local invalidation happens
+        other = Rule.objects.create(name="Other", rule_string="age > 50")
+        with transaction.atomic():
+            Rule.objects.filter(id=self.rule.id).update(
+                rule_string=other.rule_string, ast_bin=other.ast_bin, updated_at=timezone.now()
+            )
+            RuleSetVersion.bump()
+        # Within the check interval the cached rule is still served without queries
+        with self.assertNumQueries(0):
+            self.assertTrue(get().compiled({"age": 40}))
+
+        now[0] = 10
+        self.assertFalse(get().compiled({"age": 40}))
+        # Once revalidated, hits skip the database again
+        with self.assertNumQueries(0):
+            self.assertFalse(get().compiled({"age": 40}))
+
+        with transaction.atomic():
+            Rule.objects.filter(id=self.rule.id).delete()
+            RuleSetVersion.bump()
+        now[0] = 20
+        with self.assertRaises(Rule.DoesNotExist):
+            get()
+        self.assertEqual(len(cache), 0)
+
+    def test_unchanged_rules_are_kept_after_a_version_change(self):
+        self.client.post(reverse('evaluate_rule'), {"rule_id": self.rule.id, "user_data": {"age": 40}}, format='json')
+        prepared = Rule.get_prepared(self.rule.id)
+        Rule.objects.create(name="Unrelated", rule_string="age < 5")
+        with override_settings(RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL=0):
+            self.assertIs(Rule.get_prepared(self.rule.id), prepared)
+
+
+class BatchEvaluateAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('batch_evaluate_rule')
+        self.rule = Rule.objects.create(
+            name="Batch Rule",
+            rule_string="age > 30 AND department = 'Sales'"
+        )
+        self.records = [
+            {"age": 35, "department": "Sales"},
+            {"age": 25, "department": "Sales"},
+            {"department": "Sales"},
+        ]
+
+    def test_batch_evaluate(self):
+        data = {"rule_id": self.rule.id, "records": self.records}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [True, False, False])
+        self.assertEqual((response.data['count'], response.data['matched']), (3, 1))
+        self.assertNotIn('details', response.data)
+
+    def test_batch_evaluate_with_details(self):
+        data = {"rule_id": self.rule.id, "records": self.records, "details": True}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['details']), 3)
+        self.assertEqual(response.data['details'][1], {"age > 30.0": False, "department = 'Sales'": True})
+
+    def test_batch_evaluate_invalid_records(self):
+        for records in ([], [{"age": 35}, "not a record"], [{"age": 35}, {"invalid_attr": 1}]):
+            data = {"rule_id": self.rule.id, "records": records}
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('records', response.data)
+
+    def test_batch_evaluate_missing_rule(self):
+        data = {"rule_id": 999, "records": self.records}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('rule_id', response.data)
+
+
+@skipUnless(vectorized.np is not None, "numpy is not installed")
+class VectorizedEvaluatorTestCase(SimpleTestCase):
+    def setUp(self):
+        self.rule_strings = [
+            "age > 30 AND department = 'Sales'",
+            "(age < 25 OR experience >= 5) AND salary != 50000",
+            "department > 'M' OR performance_score <= 4.5",
+            "department != 'Sales' AND age == 35",
+            "department = 'Nowhere' OR salary = '60000'",
+        ]
+        self.records = [
+            {"age": 35, "department": "Sales", "salary": 60000, "experience": 3},
+            {"age": "20", "department": "Marketing", "salary": 50000, "experience": 7},
+            {"age": "thirty-five", "department": 12, "performance_score": None},
+            {"age": 35.0, "experience": [1], "salary": "60000"},
+            {"age": float('nan'), "department": "Sales", "performance_score": "4.5"},
+            {},
+        ]
+
+    def test_matches_scalar_evaluator(self):
+        batch = vectorized.ColumnBatch.from_records(self.records)
+        for rule_string in self.rule_strings:
+            ast = create_rule(rule_string)
+            expected = [evaluate_node_with_details(ast, record)[0] for record in self.records]
+            self.assertEqual(vectorized.VectorizedRule(ast)(batch).tolist(), expected, rule_string)
+
+    def test_numpy_columns(self):
+        columns = {
+            "age": vectorized.np.array([25, 35, 45]),
+            "department": vectorized.np.array(["Sales", "HR", "Sales"], dtype=object),
+        }
+        ast = create_rule("age > 30 AND department = 'Sales'")
+        self.assertEqual(vectorized.evaluate_columns(ast, columns).tolist(), [False, False, True])
+
+    def test_missing_column_is_false(self):
+        ast = create_rule("salary > 10 OR department != 'Sales'")
+        self.assertEqual(vectorized.evaluate_columns(ast, {"age": [1, 2]}).tolist(), [False, False])
+
+
+class RuleSetMatcherTestCase(SimpleTestCase):
+    def test_shared_predicates_are_deduplicated(self):
+        rules = [
+            (1, create_rule("age > 30 AND department = 'Sales'")),
+            (2, create_rule("age > 30.0 OR salary > 50000")),
+            (3, create_rule("department == 'Sales' AND salary > 50000")),
+        ]
+        matcher = RuleSetMatcher(rules)
+        self.assertEqual(matcher.predicate_count, 3)
+        record = {"age": 35, "department": "Sales", "salary": 40000}
+        self.assertEqual(matcher.match(record), [1, 2])
+        for rule_id, ast in rules:
+            self.assertEqual(rule_id in matcher.match(record), evaluate_rule(ast, record))
+
+
+class MatchRulesAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('match_rules')
+        self.rule1 = Rule.objects.create(name="Rule 1", rule_string="age > 30 AND department = 'Sales'")
+        self.rule2 = Rule.objects.create(name="Rule 2", rule_string="age > 30 OR salary > 50000")
+
+    def test_match_rules(self):
+        response = self.client.post(self.url, {"user_data": {"age": 35, "department": "HR"}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['matched_rule_ids'], [self.rule2.id])
+        self.assertEqual(response.data['predicate_count'], 3)
+
+    def test_match_rules_sees_new_rules(self):
+        user_data = {"user_data": {"age": 35, "department": "HR"}}
+        self.client.post(self.url, user_data, format='json')
+        rule3 = Rule.objects.create(name="Rule 3", rule_string="department = 'HR'")
+        response = self.client.post(self.url, user_data, format='json')
+        self.assertEqual(response.data['matched_rule_ids'], [self.rule2.id, rule3.id])
+
+    def test_match_rules_invalid_user_data(self):
+        response = self.client.post(self.url, {"user_data": {"invalid_attr": 1}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user_data', response.data)
+
+
+class PredicateIndexTestCase(SimpleTestCase):
+    def setUp(self):
+        rule_strings = [
+            "age > 30 AND department = 'Sales'",
+            "age >= 30 OR salary < 50000",
+            "(experience <= 2 AND salary != 40000) OR performance_score = 4",
+            "department != 'HR' AND department > 'M'",
+            "age == 30 AND salary > 'abc'",
+        ]
+        self.rules = [(index, create_rule(rule_string)) for index, rule_string in enumerate(rule_strings)]
+        self.records = [
+            {"age": 30, "department": "Sales", "salary": 40000, "experience": 2},
+            {"age": "45", "department": "Marketing", "salary": 50000, "performance_score": "4"},
+            {"age": float('nan'), "department": "HR", "salary": "n/a", "experience": 1},
+            {"age": None, "department": 7},
+            {},
+        ]
+
+    def test_matches_full_scan(self):
+        index = PredicateIndex(self.rules)
+        scan = RuleSetMatcher(self.rules)
+        for record in self.records:
+            self.assertEqual(index.match(record), scan.match(record), record)
+
+    def test_only_anchored_rules_are_candidates(self):
+        index = PredicateIndex(self.rules)
+        satisfied = index.satisfied({"salary": 40000})
+        self.assertEqual(index.candidates(satisfied), [1])
+
+    def test_stats(self):
+        stats = PredicateIndex(self.rules).stats()
+        self.assertEqual(stats['rules'], 5)
+        self.assertGreater(stats['memory_bytes'], 0)
+        self.assertGreaterEqual(stats['build_seconds'], 0)
+
+
+class NaryNodeTestCase(SimpleTestCase):
+    def test_combine_rules_builds_one_nary_node(self):
+        rule_strings = [f"age > {i} AND department = 'D{i}'" for i in range(3000)]
+        ast = combine_rules(rule_strings, operator='OR')
+        self.assertEqual(len(ast.children), 3000)
+        data = ast_to_json(ast)
+        self.assertEqual(ast_to_json(json_to_ast(json.loads(json.dumps(data)))), data)
+        self.assertTrue(evaluate_rule(compile_rule(ast), {"age": 10, "department": "D5"}))
+        self.assertFalse(evaluate_rule(ast, {"age": 10, "department": "D50"}))
+
+    def test_long_chains_parse_flat(self):
+        ast = create_rule(" OR ".join(f"age = {i}" for i in range(2000)))
+        self.assertEqual((ast.value, len(ast.children)), ('OR', 2000))
+        self.assertTrue(compile_rule(ast)({"age": 1999}))
+
+    def test_binary_format_is_still_read(self):
+        data = {
+            'type': 'operator', 'value': 'AND',
+            'left': {'type': 'operand', 'value': {'identifier': 'age', 'operator': '>', 'value': 30.0}, 'left': None, 'right': None},
+            'right': {'type': 'operand', 'value': {'identifier': 'salary', 'operator': '<', 'value': 10.0}, 'left': None, 'right': None},
+        }
+        ast = json_to_ast(data)
+        self.assertIsNone(ast.children)
+        self.assertEqual(ast_to_json(ast), data)
+        self.assertTrue(evaluate_rule(ast, {"age": 40, "salary": 5}))
+
+    def test_deep_binary_tree(self):
+        ast = Node('operand', value={'identifier': 'age', 'operator': '=', 'value': 0.0})
+        for i in range(1, 5000):
+            operand = Node('operand', value={'identifier': 'age', 'operator': '=', 'value': float(i)})
+            ast = Node('operator', value='OR', left=ast, right=operand)
+        ast = json_to_ast(ast_to_json(ast))
+        self.assertTrue(compile_rule(ast)({"age": 4999}))
+        self.assertEqual(len(compile_rule(ast).evaluate_with_details({"age": 1})[1]), 5000)
+
+    def test_deep_binary_tree_is_evaluated_without_compiling(self):
+        ast = Node('operand', value={'identifier': 'age', 'operator': '=', 'value': 0.0})
+        for i in range(1, 5000):
+            operand = Node('operand', value={'identifier': 'age', 'operator': '=', 'value': float(i)})
+            ast = Node('operator', value='OR', left=ast, right=operand)
+        ast = json_to_ast(ast_to_json(ast))
+        self.assertTrue(evaluate_rule(ast, {"age": 1}))
+        self.assertTrue(evaluate_rule(ast, {"age": 4999}))
+        self.assertFalse(evaluate_rule(ast, {"age": 5000}))
+        self.assertEqual(Scorer([(1, ast, None)], engine='scalar').score([{"age": 1}, {"age": -1}]), [[True], [False]])
+
+
+class CombineStoredRulesTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.rule1 = Rule.objects.create(name="Rule 1", rule_string="age > 30 AND department = 'Sales'")
+        self.rule2 = Rule.objects.create(name="Rule 2", rule_string="age < 25.5 OR (salary >= 50000 AND experience > 5)")
+
+    def test_combine_uses_stored_asts_and_inserts_once(self):
+        data = {"rule_ids": [self.rule1.id, self.rule2.id], "operator": "OR", "name": "Combined"}
+        with patch('rule_engine.models.create_rule') as model_parse, \
+                patch('rule_engine.serializers.create_rule') as serializer_parse, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('combine_rules'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        model_parse.assert_not_called()
+        serializer_parse.assert_not_called()
+        writes = [query['sql'] for query in queries.captured_queries if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        # One INSERT for the rule and the bump of the rule-set version
+        self.assertEqual(len(writes), 2)
+        self.assertTrue(writes[0].startswith('INSERT INTO "rule_engine_rule"'))
+        self.assertTrue(writes[1].startswith('UPDATE "rule_engine_rulesetversion"'))
+
+        combined = Rule.objects.get(id=response.data['new_rule_id'])
+        self.assertEqual(
+            combined.rule_string,
+            "(age > 30 AND department = 'Sales') OR age < 25.5 OR (salary >= 50000 AND experience > 5)"
+        )
+        self.assertEqual(combined.ast_json, response.data['combined_ast'])
+
+    def test_rule_string_round_trips(self):
+        for rule_string in ["age > 30 AND (department = 'Sales' OR salary != 0.25)", "age == 35"]:
+            ast = create_rule(rule_string)
+            regenerated = create_rule(ast_to_rule_string(ast))
+            self.assertEqual(ast_to_rule_string(regenerated), ast_to_rule_string(ast))
+            self.assertEqual(evaluate_node_with_details(regenerated, {"age": 35}), evaluate_node_with_details(ast, {"age": 35}))
+
+
+class OptimizerTestCase(SimpleTestCase):
+    def assertEquivalent(self, ast, optimized, records):
+        for record in records:
+            self.assertEqual(evaluate_rule(optimized, record), evaluate_rule(ast, record), record)
+
+    def setUp(self):
+        self.records = [
+            {"age": age, "department": department, "salary": salary}
+            for age in (10, 30, 35, 40, 45, "40", "n/a", float('nan'), None)
+            for department in ("Sales", "Marketing", "HR", 3)
+            for salary in (0, 50000, 70000)
+        ] + [{}, {"age": 41}, {"department": "Sales"}]
+
+    def test_merges_ranges(self):
+        ast = create_rule("age > 30 AND age > 40 AND age >= 40 AND salary < 60000 AND age != 10")
+        result = optimize(ast)
+        self.assertEqual(ast_to_rule_string(result.ast), "age > 40 AND salary < 60000")
+        self.assertEqual((result.original_conditions, result.optimized_conditions), (5, 2))
+        self.assertEqual(len(result.removed), 3)
+        self.assertEquivalent(ast, result.ast, self.records)
+
+        ast = create_rule("age > 30 OR age > 40 OR age = 35 OR age < 10 OR age <= 10")
+        result = optimize(ast)
+        self.assertEqual(ast_to_rule_string(result.ast), "age > 30 OR age <= 10")
+        self.assertEquivalent(ast, result.ast, self.records)
+
+    def test_removes_duplicate_clauses(self):
+        ast = create_rule(
+            "(age > 30 AND department = 'Sales') OR (department = 'Sales' AND age > 30.0) OR salary == 0"
+        )
+        result = optimize(ast)
+        self.assertEqual(ast_to_rule_string(result.ast), "(age > 30 AND department = 'Sales') OR salary == 0")
+        self.assertEquivalent(ast, result.ast, self.records)
+
+    def test_folds_contradictions(self):
+        for rule_string in (
+            "department = 'Sales' AND department = 'Marketing'",
+            "age > 40 AND age < 30",
+            "age >= 40 AND age < 40",
+            "age = 35 AND age > 40",
+            "department = 'HR' AND department != 'HR'",
+        ):
+            ast = create_rule(rule_string)
+            result = optimize(ast)
+            self.assertEqual(result.ast.type, 'constant', rule_string)
+            self.assertEquivalent(ast, result.ast, self.records)
+
+        ast = create_rule("(age > 40 AND age < 30) OR department = 'HR'")
+        result = optimize(ast)
+        self.assertEqual(ast_to_rule_string(result.ast), "department = 'HR'")
+        self.assertEquivalent(ast, result.ast, self.records)
+
+    def test_keeps_apparent_tautologies(self):
+        ast = create_rule("age > 30 OR age <= 30")
+        self.assertEqual(optimize(ast).optimized_conditions, 2)
+
+
+class OptimizedRuleStorageTestCase(TestCase):
+    def test_optimized_ast_is_stored_and_used(self):
+        rule = Rule.objects.create(name="Redundant", rule_string="age > 30 AND age > 40")
+        self.assertEqual(json_to_ast(rule.optimized_ast_json).value['value'], 40.0)
+        prepared = Rule.get_prepared(rule.id)
+        self.assertFalse(prepared.compiled({"age": 35}))
+        self.assertEqual(prepared.compiled.evaluate_with_details({"age": 35})[1], {"age > 30.0": True, "age > 40.0": False})
+
+
+class ParseCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        parse_cache.clear()
+
+    def test_create_parses_once(self):
+        data = {"name": "Parsed once", "rule_string": "age > 30 AND department = 'Sales'"}
+        with patch('rule_engine_core.rule_functions.tokenize', wraps=rule_functions.tokenize) as tokenize:
+            response = self.client.post(reverse('rules_list_create'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(tokenize.call_count, 1)
+
+    def test_whitespace_variants_share_a_parse(self):
+        self.assertEqual(
+            normalize_rule_string("  age >  30\tAND\n department = 'Sales  Team' "),
+            "age > 30 AND department = 'Sales  Team'"
+        )
+        first = create_rule("age > 30 AND department = 'Sales'")
+        second = create_rule("age  >  30   AND department = 'Sales'")
+        self.assertIs(first, second)
+        self.assertEqual(parse_cache.stats()['hits'], 1)
+        self.assertIsNot(create_rule("age > 30 AND department = 'Sales '"), first)
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(Exception):
+                create_rule("age > AND")
+        self.assertEqual(parse_cache.stats()['size'], 0)
+
+    def test_only_tokenizer_whitespace_is_normalized(self):
+        create_rule("age > 30")
+        for rule_string in ("age > 30\r", "\x0cage > 30", "age > 30\xa0"):
+            with self.assertRaises((ParseError, TokenizationError)):
+                create_rule(rule_string)
+
+
+class CompactRuleTestCase(SimpleTestCase):
+    def setUp(self):
+        self.records = [
+            {"age": 35, "department": "Sales", "salary": 60000, "experience": 3},
+            {"age": 22, "department": "Marketing", "salary": 20000},
+            {"age": "n/a", "department": "HR"},
+            {},
+        ]
+
+    def test_round_trips_losslessly(self):
+        for rule_string in (
+            "age > 30 AND department = 'Sales'",
+            "age > 30 AND salary > 50000 AND experience > 5",
+            "(age > 30 OR age < 25) AND (department = 'Sales' OR salary >= 50000.5)",
+        ):
+            ast = create_rule(rule_string)
+            compact = compact_rule(ast)
+            self.assertEqual(compact.to_json(), ast_to_json(ast))
+            self.assertEqual(CompactRule.from_json(ast_to_json(ast)).to_json(), ast_to_json(ast))
+            for record in self.records:
+                self.assertEqual(compact(record), evaluate_rule(ast, record), (rule_string, record))
+
+        folded = optimize(create_rule("age > 40 AND age < 30")).ast
+        self.assertEqual(compact_rule(folded).to_json(), ast_to_json(folded))
+        self.assertFalse(compact_rule(folded)({"age": 35}))
+
+    def test_conditions_are_interned(self):
+        pool = ConditionPool()
+        first = compact_rule(create_rule("age > 30 AND (salary > 100 OR age > 30)"), pool)
+        second = compact_rule(create_rule("department = 'Sales' OR age > 30"), pool)
+        self.assertEqual(len(first.conditions), 2)
+        self.assertIs(second.conditions[1], first.conditions[0])
+        self.assertEqual(len(pool), 3)
+
+        # Values keep their type, so int and float conditions stay distinct
+        as_int = pool.intern({'identifier': 'age', 'operator': '>', 'value': 30})
+        self.assertEqual(type(as_int.value), int)
+        self.assertIsNot(as_int, first.conditions[0])
+
+    def test_pool_releases_unused_conditions_and_shares_predicates(self):
+        pool = ConditionPool()
+        first = compact_rule(create_rule("age > 30 AND salary > 100"), pool)
+        second = compact_rule(create_rule("age > 30 OR department = 'HR'"), pool)
+        self.assertTrue(first({"age": 35, "salary": 200}))
+        self.assertTrue(second({"age": 35}))
+        # The shared condition compiled one predicate for both rules
+        self.assertIs(first.conditions[0], second.conditions[0])
+        self.assertIsNotNone(first.conditions[0]._predicate)
+        self.assertEqual(len(pool), 3)
+
+        del first
+        gc.collect()
+        self.assertEqual(len(pool), 2)
+        del second
+        gc.collect()
+        self.assertEqual(len(pool), 0)
+
+    def test_prepared_rules_share_conditions(self):
+        first = prepare_rule(Rule(id=1, rule_string="age > 30", ast_bin=encode_rule(create_rule("age > 30"))))
+        second = Rule(id=2, rule_string="age > 30 OR salary > 100", ast_bin=None,
+                      ast_json=ast_to_json(create_rule("age > 30 OR salary > 100")), optimized_ast_json=None)
+        second = prepare_rule(second)
+        self.assertIs(second.ast.left.value, first.ast.value)
+        self.assertEqual(ast_to_json(first.ast), ast_to_json(create_rule("age > 30")))
+        self.assertTrue(second.compiled({"age": 35}))
+        self.assertIsNotNone(first.ast.value._predicate)
+
+    def test_deep_rules_convert_iteratively(self):
+        condition = {'identifier': 'age', 'operator': '>', 'value': 1}
+        ast = Node('operand', value=condition)
+        for _ in range(5000):
+            ast = Node('operator', value='AND', left=ast, right=Node('operand', value=condition))
+        compact = compact_rule(ast)
+        self.assertTrue(compact({"age": 2}))
+        self.assertEqual(len(compact.conditions), 1)
+
+
+class BinaryASTTestCase(SimpleTestCase):
+    def test_round_trips_and_evaluates_in_place(self):
+        records = [{"age": 35, "department": "Sales"}, {"age": 20, "salary": "x"}, {"department": "Vertrieb ü"}]
+        for rule_string in (
+            "age > 30 AND age > 40.5",
+            "(age > 30 OR department = 'Vertrieb ü') AND salary != 1000",
+            "age > 1 AND salary > 2 AND experience > 3",
+        ):
+            ast = create_rule(rule_string)
+            optimized = optimize(ast).ast
+            encoded = encode_rule(ast, optimized)
+            decoded, decoded_optimized = decode_rule(encoded)
+            self.assertEqual(ast_to_json(decoded), ast_to_json(ast))
+            self.assertEqual(ast_to_json(decoded_optimized), ast_to_json(optimized))
+
+            stored = BinaryRule(memoryview(encoded))
+            self.assertIsInstance(stored.optimized.args, memoryview)
+            for record in records:
+                self.assertEqual(stored(record), evaluate_rule(ast, record), (rule_string, record))
+
+    def test_rejects_other_buffers(self):
+        with self.assertRaises(BinaryFormatError):
+            BinaryRule(b'{"type": "operand"}')
+        with self.assertRaises(BinaryFormatError):
+            BinaryRule(encode_rule(create_rule("age > 30"))[:-2])
+
+
+class BinaryRuleStorageTestCase(TestCase):
+    def test_migration_encoder_is_frozen_version_one(self):
+        migration = importlib.import_module('rule_engine.migrations.0004_rule_ast_bin')
+        legacy = Node('operand', value={'identifier': 'age', 'operator': '=', 'value': 0})
+        for i in range(1, 3000):
+            legacy = Node('operator', value='OR', left=legacy,
+                          right=Node('operand', value={'identifier': 'age', 'operator': '=', 'value': float(i)}))
+        asts = [
+            create_rule("age > 30 AND department = 'Sales' AND age > 30"),
+            create_rule("(age > 30 OR salary < 5.5) AND department != 'Vertrieb ü'"),
+            create_rule("age > 40 AND age < 30"),
+            json_to_ast(ast_to_json(legacy)),
+        ]
+        for ast in asts:
+            optimized = optimize(ast).ast
+            frozen = migration.encode_stored_ast(ast_to_json(ast), ast_to_json(optimized))
+            # The live encoder still writes version 1
+            self.assertEqual(frozen, encode_rule(ast, optimized))
+            self.assertEqual(encode_rule(*decode_rule(frozen)), frozen)
+        with self.assertRaises(ValueError):
+            migration.encode_stored_ast({'type': 'operand', 'value': {'identifier': 'age'}}, None)
+
+    def test_ast_bin_is_kept_in_sync(self):
+        rule = Rule.objects.create(name="Binary", rule_string="age > 30")
+        rule.rule_string = "department = 'Sales'"
+        rule.save()
+        self.assertEqual(ast_to_json(decode_rule(Rule.objects.get(id=rule.id).ast_bin)[0]), rule.ast_json)
+
+    def test_prepared_rule_is_loaded_from_ast_bin(self):
+        rule = Rule.objects.create(name="Binary", rule_string="age > 30 AND age > 40")
+        prepared_rule_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            prepared = Rule.get_prepared(rule.id)
+        # Besides the rule-set version check, one query loads the rule
+        rule_queries = [query['sql'] for query in queries.captured_queries if '"rule_engine_rule"' in query['sql']]
+        self.assertEqual(len(rule_queries), 1)
+        self.assertNotIn('ast_json', rule_queries[0])
+        self.assertFalse(prepared.compiled({"age": 35}))
+        self.assertEqual(ast_to_json(prepared.ast), rule.ast_json)
+
+    def test_rows_without_ast_bin_fall_back_to_json(self):
+        rule = Rule.objects.create(name="Legacy", rule_string="age > 30")
+        Rule.objects.filter(id=rule.id).update(ast_bin=None)
+        prepared_rule_cache.clear()
+        self.assertTrue(Rule.get_prepared(rule.id).compiled({"age": 35}))
+        self.assertEqual(Rule.get_matcher().match({"age": 35}), [rule.id])
+
+
+class AsyncEvaluateAPITestCase(TestCase):
+    def setUp(self):
+        self.client = AsyncClient()
+        self.sync_client = APIClient()
+        prepared_rule_cache.clear()
+        self.rule = Rule.objects.create(name="Async", rule_string="age > 30 AND department = 'Sales'")
+
+    async def test_matches_sync_evaluate(self):
+        for body in (
+            {"rule_id": self.rule.id, "user_data": {"age": 35, "department": "Sales"}},
+            {"rule_id": self.rule.id, "user_data": {"age": 35}, "details": True},
+            {"rule_id": 999, "user_data": {"age": 35}},
+            {"rule_id": self.rule.id, "user_data": {"height": 2}},
+            {"user_data": {}},
+        ):
+            response = await self.client.post(reverse('evaluate_rule_async'), body, content_type='application/json')
+            expected = await sync_to_async(self.sync_client.post)(reverse('evaluate_rule'), body, format='json')
+            self.assertEqual(response.status_code, expected.status_code, body)
+            self.assertEqual(response.json(), expected.json(), body)
+
+    async def test_match_and_errors(self):
+        response = await self.client.post(reverse('match_rules_async'), {"user_data": {"age": 35, "department": "Sales"}}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['matched_rule_ids'], [self.rule.id])
+
+        response = await self.client.post(reverse('evaluate_rule_async'), "{", content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = await self.client.get(reverse('evaluate_rule_async'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_empty_body_matches_drf(self):
+        for async_name, name in (('evaluate_rule_async', 'evaluate_rule'), ('match_rules_async', 'match_rules')):
+            response = await self.client.post(reverse(async_name), b'', content_type='application/json')
+            expected = await sync_to_async(self.sync_client.post)(reverse(name), b'', content_type='application/json')
+            self.assertEqual(response.status_code, expected.status_code, name)
+            self.assertEqual(response.json(), expected.json(), name)
+
+
+class StreamEvaluateAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.rule = Rule.objects.create(name="Stream", rule_string="age > 30 AND department = 'Sales'")
+
+    def stream(self, body, query):
+        return self.client.generic(
+            'POST', reverse('stream_evaluate_rule') + query, body, content_type='application/x-ndjson'
+        )
+
+    def test_streams_one_line_per_record(self):
+        body = '\n'.join([
+            json.dumps({"age": 35, "department": "Sales"}),
+            '',
+            json.dumps({"age": 25, "department": "Sales"}),
+            '{not json',
+            json.dumps({"age": 35, "height": 2}),
+            json.dumps([1, 2]),
+        ])
+        response = self.stream(body, f'?rule_id={self.rule.id}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(lines[0], {"line": 1, "result": True})
+        self.assertEqual(lines[1], {"line": 3, "result": False})
+        self.assertEqual([line['line'] for line in lines[2:]], [4, 5, 6])
+        self.assertTrue(all('error' in line for line in lines[2:]))
+
+        response = self.stream(json.dumps({"age": 35}), f'?rule_id={self.rule.id}&details=true')
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            {"line": 1, "result": False, "details": {"age > 30.0": True, "department = 'Sales'": False}}
+        )
+
+    def test_invalid_rule_id(self):
+        self.assertEqual(self.stream('{}', '').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.stream('{}', '?rule_id=999')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('rule_id', response.json())
+        for rule_id in ('%C2%B2', '%D9%A3', 'abc', '-1'):
+            with self.subTest(rule_id=rule_id):
+                response = self.stream('{}', f'?rule_id={rule_id}')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(response.json(), {"rule_id": ["A valid integer is required."]})
+
+    def test_evaluates_lazily(self):
+        def endless():
+            while True:
+                yield b'{"age": 35, "department": "Sales"}\n'
+
+        chunks = evaluate_ndjson(Rule.get_prepared(self.rule.id), endless())
+        self.assertEqual(len(next(chunks).splitlines()), CHUNK_LINES)
+
+
+class ScoreFileCommandTestCase(TestCase):
+    def setUp(self):
+        self.rule1 = Rule.objects.create(name="Rule 1", rule_string="age > 30 AND department = 'Sales'")
+        self.rule2 = Rule.objects.create(name="Rule 2", rule_string="salary >= 50000 OR experience > 5")
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name, content=None):
+        path = os.path.join(self.directory.name, name)
+        if content is not None:
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(content)
+        return path
+
+    def score(self, *args):
+        out = StringIO()
+        call_command('score_file', *args, stdout=out)
+        return out.getvalue()
+
+    def test_scores_csv_with_every_engine(self):
+        source = self.path('records.csv', "age,department,salary,experience\n35,Sales,20000,\n25,HR,60000,2\n40,Sales,,10\n")
+        outputs = set()
+        for engine in ('scalar', 'compiled', 'index') + (('vectorized',) if vectorized.np is not None else ()):
+            target = self.path(f'{engine}.csv')
+            report = self.score(source, target, '--all', '--engine', engine, '--chunk-size', '2')
+            self.assertIn('Scored 3 records', report)
+            with open(target, encoding='utf-8') as file:
+                outputs.add(file.read())
+        self.assertEqual(len(outputs), 1)
+        self.assertEqual(
+            outputs.pop().splitlines(),
+            [f"row,rule_{self.rule1.id},rule_{self.rule2.id},error", "1,1,0,", "2,0,1,", "3,1,1,"]
+        )
+
+    def test_scores_ndjson_and_reports_invalid_lines(self):
+        source = self.path('records.ndjson', '{"age": 35, "department": "Sales"}\n\n{oops\n{"height": 2}\n')
+        target = self.path('results.ndjson')
+        report = self.score(source, target, '--rule-id', str(self.rule1.id))
+        self.assertIn('(2 invalid)', report)
+        with open(target, encoding='utf-8') as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual(lines[0], {"line": 1, "results": {str(self.rule1.id): True}})
+        self.assertEqual([line['line'] for line in lines[1:]], [3, 4])
+        self.assertTrue(all('error' in line for line in lines[1:]))
+
+    def test_rejects_unknown_rules(self):
+        with self.assertRaises(CommandError):
+            self.score(self.path('records.csv', "age\n1\n"), self.path('out.csv'), '--rule-id', '999')
+
+    def test_rejects_csv_columns_that_are_not_attributes(self):
+        source = self.path('records.csv', "age,height,department\n35,2,Sales\n")
+        target = self.path('out.csv')
+        with self.assertRaisesMessage(CommandError, "Invalid attributes in the CSV header: height"):
+            self.score(source, target, '--all')
+
+
+class ParallelScoringTestCase(TestCase):
+    def setUp(self):
+        self.records = [
+            {"age": age, "department": department, "salary": salary}
+            for age in (20, 35, 50) for department in ("Sales", "HR") for salary in (1000, 60000, "n/a")
+        ]
+
+    def test_pool_matches_in_process_scoring(self):
+        rules = []
+        for rule_id, rule_string in enumerate(["age > 30 AND department = 'Sales'", "salary >= 50000 OR age < 25"]):
+            ast = create_rule(rule_string)
+            rules.append((rule_id, ast, optimize(ast).ast))
+        encoded = [(rule_id, encode_rule(ast, optimized)) for rule_id, ast, optimized in rules]
+        expected = Scorer(rules).score(self.records)
+        with ScoringPool(2) as pool:
+            self.assertEqual(pool.score('rules', encoded, self.records, chunk_size=4), expected)
+            tagged = [(index, self.records[index:index + 5]) for index in range(0, len(self.records), 5)]
+            merged = [row for _, rows in pool.score_chunks('rules', encoded, tagged) for row in rows]
+            self.assertEqual(merged, expected)
+
+    def test_rules_are_shipped_once_per_worker(self):
+        ast = create_rule("age > 30 AND department = 'Sales'")
+        encoded = [(1, encode_rule(ast, optimize(ast).ast))]
+        expected = Scorer([(1, ast, optimize(ast).ast)]).score(self.records)
+        with ScoringPool(1) as pool:
+            self.assertEqual(pool.score('rules', encoded, self.records, chunk_size=2), expected)
+            # Chunks already in flight when the worker first asked may ask too
+            self.assertLessEqual(pool.rule_shipments, pool.max_pending)
+            shipped = pool.rule_shipments
+            self.assertEqual(pool.score('rules', encoded, self.records, chunk_size=2), expected)
+            self.assertEqual(pool.rule_shipments, shipped)
+            pool.score('other rules', encoded, self.records, chunk_size=2)
+            self.assertGreater(pool.rule_shipments, shipped)
+
+    def test_cold_key_ships_rules_with_first_chunks(self):
+        ast = create_rule("age > 30 AND department = 'Sales'")
+        encoded = [(1, encode_rule(ast, optimize(ast).ast))]
+        expected = Scorer([(1, ast, optimize(ast).ast)]).score(self.records)
+        with ScoringPool(2) as pool:
+            # One chunk per worker, as `score_in_pool` sends: none is turned away
+            with patch.object(pool._executor, 'submit', wraps=pool._executor.submit) as submit:
+                self.assertEqual(pool.score('version 1', encoded, self.records), expected)
+            self.assertEqual(submit.call_count, pool.workers)
+            self.assertEqual(pool.rule_shipments, pool.workers)
+            # A chunk is sent with the rules at most once, however the workers take them
+            shipped = pool.rule_shipments
+            self.assertEqual(pool.score('version 2', encoded, self.records, chunk_size=1), expected)
+            self.assertLessEqual(pool.rule_shipments - shipped, len(self.records))
+
+    @override_settings(RULE_ENGINE_PARALLEL_WORKERS=2, RULE_ENGINE_PARALLEL_MIN_RECORDS=10)
+    def test_batch_endpoint_uses_pool_for_large_batches(self):
+        rule = Rule.objects.create(name="Parallel", rule_string="age > 30 AND department = 'Sales'")
+        with patch('rule_engine.workers.ScoringPool.score', autospec=True, side_effect=ScoringPool.score) as score:
+            response = APIClient().post(
+                reverse('batch_evaluate_rule'), {"rule_id": rule.id, "records": self.records}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        score.assert_called_once()
+        self.assertEqual(response.data['results'], [evaluate_rule(create_rule(rule.rule_string), record) for record in self.records])
+
+
+class ResultCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        result_cache.clear()
+        self.rule = Rule.objects.create(name="Memoized Rule", rule_string="age > 30 AND department = 'Sales'")
+        self.url = reverse('evaluate_rule')
+
+    def test_referenced_attributes(self):
+        ast = create_rule("(age > 30 AND department = 'Sales') OR salary > 50000")
+        self.assertEqual(referenced_attributes(ast), {"age", "department", "salary"})
+
+    def test_unreferenced_attributes_share_an_entry(self):
+        first = {"rule_id": self.rule.id, "user_data": {"age": 40, "department": "Sales", "salary": 10}}
+        second = {"rule_id": self.rule.id, "user_data": {"age": 40, "department": "Sales", "experience": 5}}
+        self.client.post(self.url, first, format='json')
+        with patch('rule_engine.serializers.evaluate_rule') as evaluate:
+            response = self.client.post(self.url, second, format='json')
+        evaluate.assert_not_called()
+        self.assertTrue(response.data['result'])
+        self.assertEqual(result_cache.stats()['hits'], 1)
+
+    def test_details_are_cached_separately(self):
+        data = {"rule_id": self.rule.id, "user_data": {"age": 40, "department": "Sales"}}
+        self.client.post(self.url, data, format='json')
+        response = self.client.post(self.url, {**data, "details": True}, format='json')
+        self.assertIn('details', response.data)
+
+    def test_rule_update_invalidates_results(self):
+        data = {"rule_id": self.rule.id, "user_data": {"age": 40, "department": "Sales"}}
+        self.assertTrue(self.client.post(self.url, data, format='json').data['result'])
+        self.rule.rule_string = "age > 50"
+        self.rule.save()
+        self.assertEqual(len(result_cache), 0)
+        self.assertFalse(self.client.post(self.url, data, format='json').data['result'])
+
+    def test_value_types_are_distinguished(self):
+        prepared = Rule.get_prepared(self.rule.id)
+        as_int = result_cache.make_key(prepared, {"age": 40}, False)
+        self.assertNotEqual(as_int, result_cache.make_key(prepared, {"age": "40"}, False))
+        self.assertNotEqual(as_int, result_cache.make_key(prepared, {}, False))
+        self.assertIsNone(result_cache.make_key(prepared, {"age": [40]}, False))
+
+    def test_signed_zeros_are_distinguished(self):
+        rule = Rule.objects.create(name="Zero Rule", rule_string="department = '0.0'")
+        results = [
+            self.client.post(self.url, {"rule_id": rule.id, "user_data": {"department": value}}, format='json')
+            .data['result']
+            for value in (0.0, -0.0, 0.0)
+        ]
+        self.assertEqual(results, [True, False, True])
+
+    def test_ttl_and_lru_eviction(self):
+        now = [0.0]
+        cache = ResultCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.put((1, None, False, ()), {'result': True})
+        cache.put((2, None, False, ()), {'result': False})
+        self.assertEqual(cache.get((1, None, False, ())), {'result': True})
+        cache.put((3, None, False, ()), {'result': True})
+        self.assertIsNone(cache.get((2, None, False, ())))
+        now[0] = 10.0
+        self.assertIsNone(cache.get((1, None, False, ())))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['expirations']), (1, 2, 1, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+
+
+class RuleListPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('rules_list_create')
+        for index in range(25):
+            Rule.objects.create(name=f"Rule {index}", rule_string=f"age > {index}")
+
+    def test_cursor_pages_cover_every_rule_newest_first(self):
+        names, url = [], self.url
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            names.extend(rule['name'] for rule in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(names, [f"Rule {index}" for index in reversed(range(25))])
+
+    def test_ast_json_only_returned_when_requested(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('ast_json', response.data['results'][0])
+        response = self.client.get(self.url, {'fields': 'id,ast_json'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'ast_json'})
+        self.assertEqual(response.data['results'][0]['ast_json']['type'], 'operand')
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(self.url, {'fields': 'id,ast_bin'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ast_bin', response.data['fields'][0])
+
+    def test_etag_revalidation(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Rule.objects.get(name="Rule 3").delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class BulkImportAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('import_rules')
+        Rule.objects.create(name="Existing", rule_string="age > 30")
+
+    def test_valid_items_are_created_and_errors_reported_by_index(self):
+        items = [
+            {"name": "Seniors", "rule_string": "age > 60 AND department = 'Sales'"},
+            {"name": "Broken", "rule_string": "age >"},
+            {"name": "Existing", "rule_string": "age > 40"},
+            {"name": "Seniors", "rule_string": "age > 70"},
+            {"name": "", "rule_string": "salary > 1000"},
+            "not an object",
+            {"name": "Earners", "rule_string": "salary >= 50000"},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {"rules": items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 5))
+        self.assertEqual([rule['index'] for rule in response.data['rules']], [0, 6])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3, 4, 5])
+        self.assertIn('rule_string', response.data['errors'][0]['errors'])
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+
+        imported = Rule.objects.get(name="Seniors")
+        self.assertEqual(imported.id, response.data['rules'][0]['id'])
+        self.assertEqual(imported.ast_json, ast_to_json(create_rule(imported.rule_string)))
+        self.assertEqual(imported.optimized_ast_json, ast_to_json(optimize(create_rule(imported.rule_string)).ast))
+        evaluation = self.client.post(
+            reverse('evaluate_rule'), {"rule_id": imported.id, "user_data": {"age": 65, "department": "Sales"}}, format='json'
+        )
+        self.assertTrue(evaluation.data['result'])
+
+    def test_import_without_valid_items_is_rejected(self):
+        response = self.client.post(self.url, {"rules": [{"name": "Broken", "rule_string": "age >"}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+        response = self.client.post(self.url, {"rules": []}, format='json')
+        self.assertIn('rules', response.data)
+
+    @override_settings(RULE_ENGINE_PARALLEL_WORKERS=2, RULE_ENGINE_PARALLEL_MIN_RULES=2)
+    def test_large_imports_are_parsed_in_the_pool(self):
+        items = [{"name": f"Pool {index}", "rule_string": f"age > {index} OR salary < {index}"} for index in range(5)]
+        with patch('rule_engine.workers.ScoringPool.encode_rule_strings', autospec=True,
+                   side_effect=ScoringPool.encode_rule_strings) as encode:
+            response = self.client.post(self.url, {"rules": items}, format='json')
+        encode.assert_called_once()
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(Rule.objects.get(name="Pool 3").ast_json, ast_to_json(create_rule("age > 3 OR salary < 3")))
+
+
+class RuleSetSnapshotsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.key = (1, None)
+        self.release = threading.Event()
+        self.release.set()
+        self.now = [0.0]
+        self.snapshots = RuleSetSnapshots(lambda: self.key, self.load, clock=lambda: self.now[0])
+
+    def load(self):
+        self.release.wait(5)
+        return {}
+
+    @override_settings(RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL=10)
+    def test_stale_snapshot_is_served_while_rebuilding(self):
+        first = self.snapshots.get()
+        self.key = (2, None)
+        self.assertIs(self.snapshots.get(), first)  # Not checked within the interval
+        self.release.clear()
+        self.now[0] = 10.0
+        self.assertIs(self.snapshots.get(), first)  # Returned without waiting for the rebuild
+        self.release.set()
+        deadline = time.monotonic() + 5
+        while self.snapshots.get().version != 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.snapshots.get().version, 2)
+        self.assertEqual(self.snapshots.stats()['background_builds'], 1)
+
+    def test_local_writes_are_applied_in_place(self):
+        prepared = prepare_rule(Rule(id=7, rule_string="age > 30", ast_bin=encode_rule(create_rule("age > 30"))))
+        snapshot = self.snapshots.get()
+        with patch('rule_engine.snapshots.prepare_rule', return_value=prepared):
+            self.snapshots.apply((1, None), (2, None), saved=[object()])
+        self.assertEqual(self.snapshots.get().key, (2, None))
+        self.assertEqual(self.snapshots.get().matcher.match({"age": 40}), [7])
+        self.assertEqual(len(snapshot), 0)
+        with self.assertRaises(TypeError):
+            snapshot.rules[1] = prepared
+
+        # A write that skipped a version keeps the old key, forcing a rebuild
+        self.snapshots.apply((5, None), (6, None), deleted=[7])
+        self.assertEqual(self.snapshots.get().key, (2, None))
+
+    async def test_async_get_checks_the_version_natively(self):
+        reads = []
+
+        async def aread_version():
+            reads.append(self.key)
+            return self.key
+
+        snapshots = RuleSetSnapshots(lambda: self.key, self.load, clock=lambda: self.now[0],
+                                     aread_version=aread_version)
+        first = await snapshots.aget()
+        self.now[0] = 10.0
+        self.assertIs(await snapshots.aget(), first)
+        self.key = (2, None)
+        self.now[0] = 20.0
+        self.assertIs(await snapshots.aget(), first)  # Rebuilt in the background
+        self.assertEqual(reads, [(1, None), (1, None), (2, None)])
+        deadline = time.monotonic() + 5
+        while snapshots.stats()['version'] != 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(snapshots.stats()['background_builds'], 1)
+
+
+class RuleSetVersionTestCase(TestCase):
+    def test_writes_bump_the_version_and_update_the_snapshot(self):
+        version = RuleSetVersion.current()[0]
+        rule = Rule.objects.create(name="Versioned", rule_string="age > 30")
+        self.assertEqual(RuleSetVersion.current()[0], version + 1)
+        snapshot = Rule.get_snapshot()
+        self.assertEqual(snapshot.key, RuleSetVersion.current())
+        self.assertIn(rule.id, snapshot.rules)
+
+        rule.rule_string = "age > 50"
+        rule.save()
+        self.assertFalse(Rule.get_snapshot().rules[rule.id].compiled({"age": 40}))
+        self.assertTrue(snapshot.rules[rule.id].compiled({"age": 40}))
+
+        response = APIClient().post(
+            reverse('import_rules'), {"rules": [{"name": "Imported", "rule_string": "age < 20"}]}, format='json'
+        )
+        rule.delete()
+        self.assertEqual(RuleSetVersion.current()[0], version + 4)
+        self.assertEqual(list(Rule.get_snapshot().rules), [response.data['rules'][0]['id']])
+
+    def test_snapshot_is_rebuilt_after_an_external_change(self):
+        rule = Rule.objects.create(name="External", rule_string="age > 30")
+        Rule.get_snapshot()
+        Rule.objects.filter(id=rule.id).delete()
+        with transaction.atomic():
+            RuleSetVersion.bump()
+        self.assertNotIn(rule.id, Rule.get_snapshot().rules)
+
+
+class FastEvaluateAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.rule = Rule.objects.create(name="Fast Rule", rule_string="age > 30 AND department = 'Sales'")
+
+    def test_responses_match_the_drf_view(self):
+        big_rule = Rule.objects.create(name="Big", rule_string="department = '18446744073709551616'")
+        bodies = [
+            {"rule_id": self.rule.id, "user_data": {"age": 35, "department": "Sales"}},
+            {"rule_id": self.rule.id, "user_data": {"age": 35, "department": "HR"}, "details": True},
+            {"rule_id": str(self.rule.id), "user_data": {"age": "35", "department": "Sales"}, "details": "true"},
+            {"rule_id": self.rule.id, "user_data": {"age": 35, "invalid_attr": 1}},
+            {"rule_id": 999999, "user_data": {"age": 35}},
+            {"rule_id": "x", "user_data": []},
+            {"rule_id": self.rule.id, "user_data": {"age": 35}, "details": None},
+            {"user_data": {"age": 35}},
+            [1, 2],
+            # Beyond 64 bits, which orjson would decode as floats
+            {"rule_id": 2 ** 70, "user_data": {"age": 35}},
+            {"rule_id": self.rule.id, "user_data": {"age": 2 ** 64, "department": "Sales"}, "details": True},
+            {"rule_id": big_rule.id, "user_data": {"department": 2 ** 64}},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                expected = self.client.post(reverse('evaluate_rule'), body, format='json')
+                response = self.client.post(reverse('evaluate_rule_fast'), body, format='json')
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_fast_path_skips_the_serializer_and_database(self):
+        url = reverse('evaluate_rule_fast')
+        data = {"rule_id": self.rule.id, "user_data": {"age": 35, "department": "Sales"}}
+        self.client.post(url, data, format='json')
+        with patch('rule_engine.views.EvaluateRuleSerializer.is_valid') as is_valid, self.assertNumQueries(0):
+            response = self.client.post(url, data, format='json')
+        is_valid.assert_not_called()
+        self.assertEqual(json.loads(response.content), {"result": True})
+
+    def test_invalid_json(self):
+        response = self.client.post(reverse('evaluate_rule_fast'), '{"rule_id":', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(json.loads(response.content)['detail'].startswith("JSON parse error"))
+
+    def test_big_integers_are_decoded_exactly(self):
+        self.assertEqual(jsoncodec.loads(b'{"a": [18446744073709551616, -9223372036854775809, 1.5]}'),
+                         {"a": [2 ** 64, -2 ** 63 - 1, 1.5]})
+        self.assertEqual(jsoncodec.loads('[1180591620717411303424]'), [2 ** 70])
+
+
+class BenchmarkSuiteTestCase(SimpleTestCase):
+    def test_generated_rules_have_the_requested_shape(self):
+        rng = random.Random(3)
+        for depth, width in [(0, 1), (1, 4), (3, 2)]:
+            ast = create_rule(generators.random_rule(rng, depth=depth, width=width))
+            stack, conditions = [ast], 0
+            while stack:
+                node = stack.pop()
+                if node.type == 'operand':
+                    conditions += 1
+                else:
+                    stack.extend(node.child_nodes())
+            self.assertEqual(conditions, width ** depth)
+        only_strings = generators.random_rule(rng, depth=2, width=3, string_ratio=1.0)
+        self.assertEqual(referenced_attributes(create_rule(only_strings)), {'department'})
+        records = generators.random_records(rng, 50, ['age', 'salary'], missing_ratio=0.5)
+        self.assertTrue(all(record.keys() <= {'age', 'salary'} for record in records))
+        self.assertTrue(any(len(record) < 2 for record in records))
+
+    def test_command_writes_results_and_flags_regressions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            options = {'rules': 10, 'records': 10, 'min_time': 0.001, 'repeat': 1, 'stdout': StringIO()}
+            call_command('benchmark_core', only=['parse', 'evaluate_compiled'], output=output, **options)
+            with open(output) as file:
+                results = json.load(file)
+            self.assertEqual(set(results['results']), {'parse', 'evaluate_compiled'})
+            self.assertGreater(results['results']['parse']['ops_per_sec'], 0)
+
+            # A baseline ten times faster makes the current run a regression
+            for result in results['results'].values():
+                result['ops_per_sec'] *= 10
+            baseline = os.path.join(directory, 'baseline.json')
+            with open(baseline, 'w') as file:
+                json.dump(results, file)
+            with self.assertRaisesMessage(CommandError, "Regressed beyond 10%: parse, evaluate_compiled"):
+                call_command('benchmark_core', only=['parse', 'evaluate_compiled'], baseline=baseline, **options)
+
+
+class LoadTestHarnessTestCase(TestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("list=2, evaluate=6,match"), {"list": 2.0, "evaluate": 6.0, "match": 1.0})
+        for mix in ("list=2,unknown=1", "list=x", "list=0"):
+            with self.subTest(mix=mix), self.assertRaises(CommandError):
+                parse_mix(mix)
+
+    def test_every_request_kind_succeeds_and_queries_are_counted(self):
+        rule_ids = [Rule.objects.create(name=f"Load {index}", rule_string=f"age > {index}").id for index in range(3)]
+        factory = RequestFactory(0, rule_ids)
+        client = APIClient()
+        for kind in REQUESTS:
+            method, path, body = factory.build(kind)
+            with self.subTest(kind=kind):
+                response = client.generic(method, path, json.dumps(body) if body else '', content_type='application/json')
+                self.assertLess(response.status_code, 300, response.content)
+
+        app = QueryCountingApp(lambda environ, start_response: Rule.objects.count())
+        app({'HTTP_X_LOADTEST_LABEL': 'list'}, None)
+        self.assertEqual(app.queries, {'list': [1]})
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        registry.clear()
+        result_cache.clear()
+        parse_cache.clear()
+        self.rule = Rule.objects.create(name="Metrics Rule", rule_string="age > 30")
+
+    def sample(self, text, line):
+        values = [row.rsplit(' ', 1)[1] for row in text.splitlines() if row.rsplit(' ', 1)[0] == line]
+        self.assertEqual(len(values), 1, f"{line} not found once in:\n{text}")
+        return float(values[0])
+
+    def test_histogram_and_counter_rendering(self):
+        local = Registry()
+        counter = local.counter('events_total', 'Events "seen".\nTwice.', ('kind',))
+        histogram = local.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1.0))
+        counter.inc('a"b')
+        counter.inc('a"b', amount=2)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        self.assertIs(local.counter('events_total', 'Events.', ('kind',)), counter)
+        with self.assertRaises(ValueError):
+            local.histogram('events_total', 'Events.')
+
+        text = local.render()
+        self.assertIn('# HELP events_total Events "seen".\\nTwice.\n# TYPE events_total counter\n', text)
+        self.assertEqual(self.sample(text, 'events_total{kind="a\\"b"}'), 3)
+        self.assertEqual(self.sample(text, 'latency_seconds_bucket{le="0.1"}'), 2)
+        self.assertEqual(self.sample(text, 'latency_seconds_bucket{le="1.0"}'), 3)
+        self.assertEqual(self.sample(text, 'latency_seconds_bucket{le="+Inf"}'), 4)
+        self.assertEqual(self.sample(text, 'latency_seconds_count'), 4)
+        self.assertAlmostEqual(self.sample(text, 'latency_seconds_sum'), 3.65)
+
+    def test_evaluations_are_counted_per_rule_and_result(self):
+        url = reverse('evaluate_rule')
+        for age in (35, 35, 20):
+            self.client.post(url, {"rule_id": self.rule.id, "user_data": {"age": age}}, format='json')
+        self.client.post(reverse('evaluate_rule_fast'), {"rule_id": self.rule.id, "user_data": {"age": 40}},
+                         format='json')
+        self.client.post(reverse('batch_evaluate_rule'),
+                         {"rule_id": self.rule.id, "records": [{"age": 31}, {"age": 1}, {"age": 2}]}, format='json')
+        self.client.post(reverse('match_rules'), {"user_data": {"age": 35}}, format='json')
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        rule = f'rule_id="{self.rule.id}"'
+        self.assertEqual(self.sample(text, f'rule_engine_rule_evaluations_total{{{rule},result="true"}}'), 4)
+        self.assertEqual(self.sample(text, f'rule_engine_rule_evaluations_total{{{rule},result="false"}}'), 3)
+        self.assertEqual(self.sample(text, 'rule_engine_evaluation_seconds_count{kind="single"}'), 4)
+        self.assertEqual(self.sample(text, 'rule_engine_evaluation_seconds_count{kind="batch"}'), 1)
+        self.assertEqual(self.sample(text, 'rule_engine_evaluation_seconds_count{kind="match"}'), 1)
+        self.assertEqual(self.sample(text, 'rule_engine_evaluations_total{kind="batch",result="false"}'), 2)
+        # The repeated evaluation was answered from the result cache
+        self.assertEqual(self.sample(text, 'rule_engine_cache_hits_total{cache="result"}'), 1)
+        self.assertEqual(self.sample(text, 'rule_engine_rule_set_rules'), 1)
+
+        with override_settings(RULE_ENGINE_METRICS_PER_RULE=False):
+            self.client.post(url, {"rule_id": self.rule.id, "user_data": {"age": 50}}, format='json')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertEqual(self.sample(text, f'rule_engine_rule_evaluations_total{{{rule},result="true"}}'), 4)
+        self.assertEqual(self.sample(text, 'rule_engine_evaluation_seconds_count{kind="single"}'), 5)
+
+    def test_stream_evaluations_are_recorded_when_the_stream_ends(self):
+        lines = [b'{"age": 35}', b'not json', b'{"age": 10}']
+        b''.join(evaluate_ndjson(Rule.get_prepared(self.rule.id), lines))
+        text = registry.render()
+        self.assertEqual(self.sample(text, 'rule_engine_evaluations_total{kind="stream",result="true"}'), 1)
+        self.assertEqual(self.sample(text, 'rule_engine_evaluations_total{kind="stream",result="false"}'), 1)
+        self.assertEqual(self.sample(text, 'rule_engine_evaluation_seconds_count{kind="stream"}'), 1)
+
+    def test_parses_and_combines_are_counted(self):
+        self.client.post(reverse('rules_list_create'), {"name": "Bad", "rule_string": "age >"}, format='json')
+        other = Rule.objects.create(name="Other", rule_string="salary < 5000")
+        response = self.client.post(reverse('combine_rules'),
+                                    {"rule_ids": [self.rule.id, other.id], "operator": "AND", "name": "Both"},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertGreaterEqual(self.sample(text, 'rule_engine_parses_total{outcome="ok"}'), 2)
+        self.assertEqual(self.sample(text, 'rule_engine_parses_total{outcome="error"}'), 1)
+        self.assertEqual(self.sample(text, 'rule_engine_combines_total{outcome="ok"}'), 1)
+        self.assertEqual(self.sample(text, 'rule_engine_combine_seconds_count'), 1)
+        self.assertIn('# TYPE rule_engine_cache_hit_ratio gauge', text)
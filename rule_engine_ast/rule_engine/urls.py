@@ -3,7 +3,15 @@ from . import views
 
 urlpatterns = [
     path('rules/', views.rules_list_create_view, name='rules_list_create'),
+    path('rules/import/', views.import_rules_view, name='import_rules'),
     path('rules/<int:rule_id>/', views.rule_detail_view, name='rule_detail'),
     path('rules/combine/', views.combine_rules_view, name='combine_rules'),
     path('rules/evaluate/', views.evaluate_rule_view, name='evaluate_rule'),
+    path('rules/evaluate/fast/', views.evaluate_rule_fast_view, name='evaluate_rule_fast'),
+    path('rules/evaluate/batch/', views.batch_evaluate_rule_view, name='batch_evaluate_rule'),
+    path('rules/evaluate/stream/', views.stream_evaluate_rule_view, name='stream_evaluate_rule'),
+    path('rules/evaluate/async/', views.evaluate_rule_async_view, name='evaluate_rule_async'),
+    path('rules/match/', views.match_rules_view, name='match_rules'),
+    path('rules/match/async/', views.match_rules_async_view, name='match_rules_async'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,23 +1,57 @@
+import json
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Rule
-from .serializers import RuleSerializer, CombineRulesSerializer, EvaluateRuleSerializer
-from rest_framework.pagination import PageNumberPagination
+from . import jsoncodec
+from .models import Rule, RuleSetVersion
+from .pagination import RuleCursorPagination
+from .streaming import evaluate_ndjson
+from .serializers import (
+    RuleSerializer,
+    BulkImportRulesSerializer,
+    CombineRulesSerializer,
+    EvaluateRuleSerializer,
+    AsyncEvaluateRuleSerializer,
+    BatchEvaluateRuleSerializer,
+    MatchRulesSerializer,
+)
 from django.shortcuts import get_object_or_404
 from rule_engine_core.rule_functions import ast_to_json, json_to_ast
+from rule_engine_core.compiler import CompilationError
+from rule_engine_core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
+from rest_framework import serializers
+from rule_engine_core.parser import VALID_ATTRIBUTES
 import logging
 
 # Configure logging for the module
 logger = logging.getLogger(__name__)
 
+def _rules_etag():
+    """
+    Return an ETag for the rule table.
+
+    The rule-set version changes with every create, update and delete, so
+    one primary-key query tells whether any page has changed.
+    """
+    version, updated_at = RuleSetVersion.current()
+    return quote_etag(f"{version}-{updated_at.isoformat() if updated_at else ''}")
+
+
 @api_view(['GET', 'POST'])
 def rules_list_create_view(request):
     """
     View to list all rules or create a new rule.
 
     **GET**:
-    - Retrieves a paginated list of all rules.
+    - Retrieves a cursor-paginated list of rules, newest first. Follow the
+      `next`/`previous` links to move between pages.
+    - `?fields=id,name,...` selects the fields returned; `ast_json` is only
+      loaded and returned when requested.
+    - Returns HTTP 304 Not Modified when `If-None-Match` matches the current ETag.
     - Returns HTTP 200 OK with serialized data.
 
     **POST**:
@@ -25,21 +59,38 @@ def rules_list_create_view(request):
     - Returns HTTP 201 Created with serialized data.
     """
     if request.method == 'GET':
-        # Retrieve all Rule objects, ordered by creation date (most recent first)
-        rules = Rule.objects.all().order_by('-created_at')
+        fields = request.query_params.get('fields')
+        if fields is None:
+            fields = RuleSerializer.LIST_FIELDS
+        else:
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+            unknown = sorted(set(fields) - set(RuleSerializer.Meta.fields))
+            if not fields or unknown:
+                return Response(
+                    {"fields": [f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields requested."]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-        # Initialize the paginator and set the page size
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Adjust the page size as needed
+        # Answer revalidation requests without reading any rule
+        etag = _rules_etag()
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
 
-        # Paginate the queryset based on the request
+        # Load only the requested columns, plus those the cursor orders by
+        rules = Rule.objects.only(*{'id', 'created_at', *fields})
+
+        # Paginate on the (created_at, id) index
+        paginator = RuleCursorPagination()
         result_page = paginator.paginate_queryset(rules, request)
 
         # Serialize the paginated data
-        serializer = RuleSerializer(result_page, many=True)
+        serializer = RuleSerializer(result_page, many=True, fields=fields)
 
         # Return the paginated response with serialized data
-        return paginator.get_paginated_response(serializer.data)
+        response = paginator.get_paginated_response(serializer.data)
+        response['ETag'] = etag
+        return response
 
     elif request.method == 'POST':
         # Create a serializer instance with the request data
@@ -47,15 +98,36 @@ def rules_list_create_view(request):
 
         # Validate the serializer data
         if serializer.is_valid():
-            print(serializer)  # Debugging line; consider removing or replacing with logging
             # Save the new Rule instance
-            serializer.save()
+            rule = serializer.save()
+            logger.debug("Created rule %s (%s)", rule.id, rule.name)
             # Return the serialized data with HTTP 201 Created status
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             # Return validation errors with HTTP 400 Bad Request status
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+def import_rules_view(request):
+    """
+    View to create many rules at once.
+
+    **POST**:
+    - Accepts `rules`, a list of `{name, rule_string}` items.
+    - Validates and parses every item; invalid items are reported by index
+      without stopping the valid ones, which are inserted in one transaction.
+    - Returns HTTP 201 Created with the created rules and the per-item
+      errors, or HTTP 400 Bad Request if no rule could be created.
+    """
+    serializer = BulkImportRulesSerializer(data=request.data)
+
+    if serializer.is_valid():
+        summary = serializer.save()
+        created = status.HTTP_201_CREATED if summary['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(summary, status=created)
+    else:
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 @api_view(['PUT', 'PATCH', 'DELETE'])
 def rule_detail_view(request, rule_id):
     """
@@ -112,7 +184,8 @@ def combine_rules_view(request):
         try:
             # Save the combined rule and retrieve the result
             combined = serializer.save()
-            print(f"Combined object: {combined}")  # Debugging line; consider removing or replacing with logging
+            logger.debug("Combined rules %s into rule %s", serializer.validated_data['rule_ids'],
+                         combined.get('new_rule_id'))
 
             # Extract the combined AST from the result
             combined_ast = combined.get('combined_ast')
@@ -148,9 +221,10 @@ def evaluate_rule_view(request):
     View to evaluate a rule against provided user data.
 
     **POST**:
-    - Accepts a rule ID and user data in JSON format.
+    - Accepts a rule ID, user data in JSON format and an optional `details` flag.
     - Evaluates the rule using the provided user data.
-    - Returns the evaluation result (True or False) and details of the evaluation.
+    - Returns the evaluation result (True or False), plus details of every
+      condition when `details` is true.
     - Returns HTTP 200 OK with evaluation results.
     """
     # Create a serializer instance with the request data
@@ -158,13 +232,229 @@ def evaluate_rule_view(request):
 
     # Validate the serializer data
     if serializer.is_valid():
-        # Perform the evaluation and retrieve the result
+        # Perform the evaluation and retrieve the result (and details, if requested)
+        evaluation = serializer.save()
+        # Return the evaluation result with HTTP 200 OK status
+        return Response(evaluation, status=status.HTTP_200_OK)
+    else:
+        # Return validation errors with HTTP 400 Bad Request status
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def _json_response(data, status_code):
+    return HttpResponse(jsoncodec.dumps(data), status=status_code, content_type='application/json')
+
+@csrf_exempt
+@require_POST
+def evaluate_rule_fast_view(request):
+    """
+    Lean view to evaluate a rule against provided user data.
+
+    **POST**:
+    - Accepts the same body as `evaluate_rule_view` and returns the same
+      responses, without DRF's request, parser and serializer machinery.
+    - A well-formed body (integer `rule_id`, object `user_data` with valid
+      attributes, optional boolean `details`, existing rule) is evaluated
+      directly on the prepared rule. Anything else is handed to
+      `EvaluateRuleSerializer`, so error responses are unchanged.
+    - Returns HTTP 200 OK with evaluation results.
+    """
+    try:
+        data = jsoncodec.loads(request.body) if request.body else {}
+    except ValueError as e:
+        return _json_response({"detail": f"JSON parse error - {e}"}, status.HTTP_400_BAD_REQUEST)
+
+    prepared = None
+    if type(data) is dict:
+        rule_id, user_data = data.get('rule_id'), data.get('user_data')
+        details = data.get('details', False)
+        if (type(rule_id) is int and type(user_data) is dict and type(details) is bool
+                and user_data.keys() <= VALID_ATTRIBUTES):
+            try:
+                prepared = Rule.get_prepared(rule_id)
+            except Rule.DoesNotExist:
+                pass
+
+    if prepared is not None:
+        validated_data = {'user_data': user_data, 'details': details}
+    else:
+        serializer = EvaluateRuleSerializer(data=data)
+        if not serializer.is_valid():
+            return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        validated_data = serializer.validated_data
+        prepared = Rule.get_prepared(validated_data['rule_id'])
+
+    try:
+        evaluation = EvaluateRuleSerializer.evaluate(prepared, validated_data)
+    except serializers.ValidationError as e:
+        return _json_response(e.detail, status.HTTP_400_BAD_REQUEST)
+    return _json_response(evaluation, status.HTTP_200_OK)
+
+@api_view(['POST'])
+def batch_evaluate_rule_view(request):
+    """
+    View to evaluate a rule against a list of records.
+
+    **POST**:
+    - Accepts a rule ID, a list of records and an optional `details` flag.
+    - Loads and compiles the rule once and evaluates every record against it.
+    - Returns one boolean per record, in input order, plus match counts and,
+      if requested, the per-record evaluation details.
+    - Returns HTTP 200 OK with evaluation results.
+    """
+    # Create a serializer instance with the request data
+    serializer = BatchEvaluateRuleSerializer(data=request.data)
+
+    # Validate the serializer data
+    if serializer.is_valid():
+        # Evaluate every record and return the compact result array
         evaluation = serializer.save()
-        # Return the evaluation result and details with HTTP 200 OK status
-        return Response({
-            'result': evaluation['result'],
-            'details': evaluation['details']
-        }, status=status.HTTP_200_OK)
+        return Response(evaluation, status=status.HTTP_200_OK)
     else:
         # Return validation errors with HTTP 400 Bad Request status
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['POST'])
+def match_rules_view(request):
+    """
+    View to find every rule satisfied by the provided user data.
+
+    **POST**:
+    - Accepts user data in JSON format.
+    - Finds the satisfied conditions through a predicate index over all
+      stored rules and resolves only the candidate rules.
+    - Returns the IDs of the matching rules.
+    - Returns HTTP 200 OK with the match results.
+    """
+    # Create a serializer instance with the request data
+    serializer = MatchRulesSerializer(data=request.data)
+
+    # Validate the serializer data
+    if serializer.is_valid():
+        # Match the user data against the rule set
+        matches = serializer.save()
+        return Response(matches, status=status.HTTP_200_OK)
+    else:
+        # Return validation errors with HTTP 400 Bad Request status
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def _parse_json_body(request):
+    """
+    Decode a JSON request body for the async views. An empty body decodes
+    to `{}`, as DRF parses it, so it gets the field-required errors.
+
+    Returns:
+        tuple: The decoded data and None, or None and a 400 response in the
+            shape DRF uses for parse errors.
+    """
+    try:
+        return (json.loads(request.body) if request.body else {}), None
+    except ValueError as e:
+        return None, JsonResponse({"detail": f"JSON parse error - {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+@csrf_exempt
+@require_POST
+async def evaluate_rule_async_view(request):
+    """
+    Async view to evaluate a rule against provided user data.
+
+    **POST**:
+    - Accepts the same body as `evaluate_rule_view` and returns the same
+      responses.
+    - Runs natively under ASGI: the rule is loaded with the async ORM on a
+      prepared-rule cache miss, so no worker thread is held per request.
+    """
+    data, error = _parse_json_body(request)
+    if error is not None:
+        return error
+
+    serializer = AsyncEvaluateRuleSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    rule_id = serializer.validated_data['rule_id']
+    try:
+        prepared = await Rule.aget_prepared(rule_id)
+    except Rule.DoesNotExist:
+        return JsonResponse(
+            {"rule_id": [f"Rule with ID {rule_id} does not exist."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        evaluation = AsyncEvaluateRuleSerializer.evaluate(prepared, serializer.validated_data)
+    except serializers.ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST, safe=False)
+    return JsonResponse(evaluation, status=status.HTTP_200_OK)
+
+@csrf_exempt
+@require_POST
+async def match_rules_async_view(request):
+    """
+    Async view to find every rule satisfied by the provided user data.
+
+    **POST**:
+    - Accepts the same body as `match_rules_view` and returns the same
+      responses.
+    - Checks the rule-set version with the async ORM; a stale snapshot is
+      rebuilt in the background and only the first build of a process, or
+      of its predicate index, runs in a worker thread.
+    """
+    data, error = _parse_json_body(request)
+    if error is not None:
+        return error
+
+    serializer = MatchRulesSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        matcher = await Rule.aget_matcher()
+    except CompilationError as e:
+        return JsonResponse([f"Error during evaluation: {e}"], status=status.HTTP_400_BAD_REQUEST, safe=False)
+    return JsonResponse(MatchRulesSerializer.match(matcher, serializer.validated_data), status=status.HTTP_200_OK)
+
+@csrf_exempt
+@require_POST
+def stream_evaluate_rule_view(request):
+    """
+    View to evaluate a rule against a newline-delimited JSON stream of records.
+
+    **POST**:
+    - Takes the rule ID as the `rule_id` query parameter (and an optional
+      `details=true`) and one JSON record per line as the request body.
+    - Reads, validates and evaluates records as they arrive and streams one
+      NDJSON line per record back, in input order: `{"line": n, "result": ...}`,
+      or `{"line": n, "error": ...}` for a record that is invalid.
+    - Returns HTTP 400 Bad Request before streaming if the rule ID is invalid.
+    """
+    rule_id = request.GET.get('rule_id', '')
+    # isdigit() also accepts characters such as '²' that int() rejects
+    if not (rule_id.isascii() and rule_id.isdecimal()):
+        return JsonResponse({"rule_id": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        prepared = Rule.get_prepared(int(rule_id))
+    except Rule.DoesNotExist:
+        return JsonResponse(
+            {"rule_id": [f"Rule with ID {rule_id} does not exist."]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    details = request.GET.get('details', '').lower() in ('1', 'true')
+    # Iterating the request reads the body line by line instead of loading it whole
+    return StreamingHttpResponse(
+        evaluate_ndjson(prepared, request, details=details),
+        content_type='application/x-ndjson'
+    )
+
+@require_GET
+def metrics_view(request):
+    """
+    View exposing the metrics of this process in the Prometheus text format.
+
+    **GET**:
+    - Returns per-rule evaluation counts by result, evaluation, parse and
+      combine latency histograms, parse and evaluation error counts, and the
+      hit rates of the process caches.
+    - Each worker process serves its own metrics.
+    """
+    return HttpResponse(registry.render(), content_type=METRICS_CONTENT_TYPE)
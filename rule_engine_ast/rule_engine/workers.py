@@ -0,0 +1,59 @@
+import atexit
+import threading
+from django.conf import settings
+from rule_engine_core.binary_ast import encode_rule
+from rule_engine_core.parallel import ScoringPool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_scoring_pool():
+    """
+    Return the process-wide `ScoringPool`, started on first use, or None when
+    `RULE_ENGINE_PARALLEL_WORKERS` is below 2.
+    """
+    global _pool
+    workers = getattr(settings, 'RULE_ENGINE_PARALLEL_WORKERS', 0)
+    if workers < 2:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ScoringPool(workers)
+            atexit.register(_pool.close)
+        return _pool
+
+
+def score_in_pool(prepared, records):
+    """
+    Evaluate a prepared rule against `records` in the worker pool.
+
+    Returns:
+        list: One boolean per record, or None when the batch is smaller than
+            `RULE_ENGINE_PARALLEL_MIN_RECORDS` or the pool is disabled.
+    """
+    if len(records) < getattr(settings, 'RULE_ENGINE_PARALLEL_MIN_RECORDS', 20000):
+        return None
+    pool = get_scoring_pool()
+    if pool is None:
+        return None
+    encoded = encode_rule(prepared.ast, prepared.compiled.optimized)
+    rows = pool.score(prepared.version, [(prepared.rule_id, encoded)], records)
+    return [row[0] for row in rows]
+
+
+def encode_rules_in_pool(rule_strings):
+    """
+    Parse, optimize and encode rule strings in the worker pool.
+
+    Returns:
+        list: One `(encoding, error)` pair per rule string, or None when there
+            are fewer than `RULE_ENGINE_PARALLEL_MIN_RULES` of them or the pool
+            is disabled.
+    """
+    if len(rule_strings) < getattr(settings, 'RULE_ENGINE_PARALLEL_MIN_RULES', 1000):
+        return None
+    pool = get_scoring_pool()
+    if pool is None:
+        return None
+    return pool.encode_rule_strings(rule_strings)
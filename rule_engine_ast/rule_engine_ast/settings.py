@@ -90,6 +90,18 @@ USE_TZ = True
 # Static Files
 STATIC_URL = "static/"
 
+# Rule Engine
+RULE_ENGINE_CACHE_SIZE = 1024  # Prepared rules kept per process by the evaluate endpoint
+RULE_ENGINE_RESULT_CACHE_SIZE = 10000  # Evaluation results memoized per process; 0 disables the cache
+RULE_ENGINE_RESULT_CACHE_TTL = 300  # Seconds a memoized evaluation result stays valid
+RULE_ENGINE_SNAPSHOT_CHECK_INTERVAL = 1.0  # Seconds between rule-set version checks per process
+RULE_ENGINE_BATCH_MAX_RECORDS = 50000  # Records accepted per batch evaluation request
+RULE_ENGINE_PARALLEL_WORKERS = 0  # Worker processes for large batches; below 2 disables the pool
+RULE_ENGINE_PARALLEL_MIN_RECORDS = 20000  # Smallest batch scored in the worker pool
+RULE_ENGINE_PARALLEL_MIN_RULES = 1000  # Smallest bulk import parsed in the worker pool
+RULE_ENGINE_IMPORT_MAX_RULES = 10000  # Rules accepted per bulk import request
+RULE_ENGINE_METRICS_PER_RULE = True  # Label evaluation counts at /metrics with each rule ID
+
 # Primary Key Field
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -1,14 +1,81 @@
+from typing import FrozenSet, List, Sequence
+
+
 class Node:
     """
     Represents a node in the Abstract Syntax Tree (AST).
+
+    Operator nodes are either binary (`left`/`right`) or n-ary (`children`),
+    the latter keeping wide AND/OR expressions flat instead of nesting them.
+    Slots keep large resident rule sets free of per-node `__dict__`s.
     """
-    def __init__(self, node_type, value=None, left=None, right=None):
+    __slots__ = ('type', 'value', 'left', 'right', 'children')
+
+    def __init__(self, node_type, value=None, left=None, right=None, children=None):
         self.type = node_type  # 'operator' or 'operand'
         self.value = value     # For 'operand', this is the condition dict
         self.left = left       # Left child Node
         self.right = right     # Right child Node
+        self.children = children  # Child Nodes of an n-ary 'operator', or None
+
+    def child_nodes(self) -> Sequence['Node']:
+        """Return the children of an operator node, binary or n-ary, in order."""
+        if self.children is not None:
+            return self.children
+        return [child for child in (self.left, self.right) if child is not None]
 
     def __repr__(self):
         if self.type == 'operand':
             return f"Operand({self.value})"
+        if self.children is not None:
+            return f"Operator({self.value}, children={self.children})"
         return f"Operator({self.value}, left={self.left}, right={self.right})"
+
+
+def make_operator_node(operator: str, operands: Sequence[Node]) -> Node:
+    """
+    Join operands with a logical operator.
+
+    A single operand is returned as is, two operands give a binary node and
+    more give one n-ary node.
+    """
+    if not operands:
+        raise ValueError("At least one operand is required.")
+    if len(operands) == 1:
+        return operands[0]
+    if len(operands) == 2:
+        return Node('operator', value=operator, left=operands[0], right=operands[1])
+    return Node('operator', value=operator, children=list(operands))
+
+
+def flatten_operands(node: Node) -> List[Node]:
+    """
+    Return the operands of the maximal run of `node.value` operators rooted at
+    `node`, left to right.
+
+    Nested chains of the same operator (binary or n-ary) are walked
+    iteratively, so evaluators built on this recurse only where the operator
+    changes.
+    """
+    operands = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.type == 'operator' and current.value == node.value:
+            stack.extend(reversed(current.child_nodes()))
+        else:
+            operands.append(current)
+    return operands
+
+
+def referenced_attributes(node: Node) -> FrozenSet[str]:
+    """Return the identifiers of every operand condition in the tree."""
+    attributes = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.type == 'operand':
+            attributes.add(current.value['identifier'])
+        elif current.type == 'operator':
+            stack.extend(current.child_nodes())
+    return frozenset(attributes)
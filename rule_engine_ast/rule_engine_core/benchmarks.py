@@ -0,0 +1,200 @@
+"""
+Microbenchmarks of the rule engine core.
+
+Each benchmark times one operation over synthetic inputs (see `generators`)
+and reports operations per second, together with the peak memory traced
+while the operation runs once over all its inputs. Results are plain dicts,
+so they can be saved as JSON and compared with a saved baseline.
+"""
+import gc
+import inspect
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from .compiler import compile_rule
+from .generators import ATTRIBUTES, random_records, random_rules
+from .optimizer import optimize
+from .parser import Parser
+from .rule_functions import (
+    ast_to_json,
+    combine_rules,
+    create_rule,
+    evaluate_rule_with_details,
+    json_to_ast,
+    parse_cache,
+)
+from .tokenizer import tokenize
+
+BENCHMARKS = (
+    'tokenize',
+    'parse',
+    'create_rule',
+    'create_rule_cached',
+    'combine_rules',
+    'ast_to_json',
+    'json_to_ast',
+    'evaluate_rule_with_details',
+    'evaluate_compiled',
+)
+
+# Rules combined per `combine_rules` call
+COMBINE_GROUP = 10
+
+# Rules each record is evaluated against
+EVALUATED_RULES = 10
+
+
+def build_cases(seed: int = 0, rules: int = 200, records: int = 500, depth: int = 2, width: int = 3,
+                attributes: Sequence[str] = ATTRIBUTES, string_ratio: float = 0.25,
+                missing_ratio: float = 0.0) -> Dict[str, Tuple[Callable[[], Any], int]]:
+    """
+    Generate the inputs and return `{name: (run, ops)}`, where one call of
+    `run` performs `ops` operations.
+    """
+    rng = random.Random(seed)
+    shape = {'depth': depth, 'width': width, 'attributes': attributes, 'string_ratio': string_ratio}
+    rule_strings = random_rules(rng, rules, **shape)
+    samples = random_records(rng, records, attributes, missing_ratio)
+    token_lists = [list(tokenize(rule_string)) for rule_string in rule_strings]
+    asts = [create_rule(rule_string) for rule_string in rule_strings]
+    documents = [ast_to_json(ast) for ast in asts]
+    evaluated = asts[:EVALUATED_RULES]
+    compiled = [compile_rule(ast, optimize(ast).ast) for ast in evaluated]
+    groups = [rule_strings[start:start + COMBINE_GROUP] for start in range(0, len(rule_strings), COMBINE_GROUP)]
+
+    def parse_uncached(run):
+        # Every call starts from an empty parse cache, so each rule is parsed
+        def cold():
+            parse_cache.clear()
+            return run()
+        return cold
+
+    return {
+        'tokenize': (lambda: [list(tokenize(rule_string)) for rule_string in rule_strings], len(rule_strings)),
+        'parse': (lambda: [Parser(tokens).parse() for tokens in token_lists], len(token_lists)),
+        'create_rule': (
+            parse_uncached(lambda: [create_rule(rule_string) for rule_string in rule_strings]), len(rule_strings)
+        ),
+        'create_rule_cached': (lambda: [create_rule(rule_string) for rule_string in rule_strings], len(rule_strings)),
+        'combine_rules': (parse_uncached(lambda: [combine_rules(group) for group in groups]), len(groups)),
+        'ast_to_json': (lambda: [ast_to_json(ast) for ast in asts], len(asts)),
+        'json_to_ast': (lambda: [json_to_ast(document) for document in documents], len(documents)),
+        'evaluate_rule_with_details': (
+            lambda: [evaluate_rule_with_details(ast, record) for record in samples for ast in evaluated],
+            len(samples) * len(evaluated)
+        ),
+        'evaluate_compiled': (
+            lambda: [rule(record) for record in samples for rule in compiled], len(samples) * len(compiled)
+        ),
+    }
+
+
+def measure(run: Callable[[], Any], ops: int, min_time: float = 0.2, repeat: int = 5) -> Dict[str, float]:
+    """
+    Time `run` and trace its memory.
+
+    Each of `repeat` rounds calls `run` until `min_time` seconds have passed,
+    with the garbage collector disabled like `timeit`; the median round is
+    reported. Memory is traced over one separate call.
+    """
+    run()  # Warm up caches and lazily built state
+    rates = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            calls = 0
+            start = time.perf_counter()
+            elapsed = 0.0
+            while elapsed < min_time or calls == 0:
+                run()
+                calls += 1
+                elapsed = time.perf_counter() - start
+            rates.append(calls * ops / elapsed)
+    finally:
+        if enabled:
+            gc.enable()
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    ops_per_sec = statistics.median(rates)
+    return {
+        'ops': ops,
+        'ops_per_sec': ops_per_sec,
+        'mean_us': 1e6 / ops_per_sec,
+        'stdev_pct': 100 * statistics.pstdev(rates) / ops_per_sec,
+        'peak_bytes': peak,
+        'peak_bytes_per_op': peak / ops,
+    }
+
+
+def run_suite(names: Optional[Sequence[str]] = None, min_time: float = 0.2, repeat: int = 5,
+              **shape: Any) -> Dict[str, Any]:
+    """
+    Run the benchmarks in `names` (all by default) on inputs built with
+    `build_cases(**shape)`.
+
+    Returns:
+        dict: `meta` (interpreter, platform and input shape) and `results`
+            (the `measure` output of each benchmark).
+    """
+    defaults = {name: parameter.default for name, parameter in inspect.signature(build_cases).parameters.items()}
+    shape = {**defaults, **shape}
+    cases = build_cases(**shape)
+    unknown = set(names or ()) - set(cases)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}.")
+    results = {}
+    for name in names or BENCHMARKS:
+        run, ops = cases[name]
+        results[name] = measure(run, ops, min_time=min_time, repeat=repeat)
+    return {
+        'meta': {
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'shape': {key: list(value) if isinstance(value, (list, tuple)) else value for key, value in shape.items()},
+        },
+        'results': results,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Compare suite results with a baseline run.
+
+    Returns:
+        list: For each benchmark present in both, the relative change in
+            ops/sec and peak memory and whether either is a regression,
+            i.e. worse than the baseline by more than `tolerance`.
+    """
+    rows = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        speed = current['ops_per_sec'] / previous['ops_per_sec'] - 1
+        memory = (current['peak_bytes'] / previous['peak_bytes'] - 1) if previous['peak_bytes'] else 0.0
+        rows.append({
+            'name': name,
+            'ops_per_sec': current['ops_per_sec'],
+            'baseline_ops_per_sec': previous['ops_per_sec'],
+            'speed_change': speed,
+            'memory_change': memory,
+            'regression': speed < -tolerance or memory > tolerance,
+        })
+    return rows
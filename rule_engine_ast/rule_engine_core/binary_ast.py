@@ -0,0 +1,190 @@
+"""
+Binary rule encoding.
+
+A rule's AST, and optionally its optimized AST, is stored as the postfix
+programs of `compact.CompactRule` over one shared condition table:
+
+    header     '<4sBBHI'  magic b'RAST', version, program count, reserved, condition count
+    condition  '<HBB'     identifier length, operator length, value tag,
+               followed by the identifier, the operator and the value
+    program    '<I'       op count n, then n opcode bytes, padding to a
+                          4-byte boundary and n little-endian uint32 arguments
+
+Integers are little-endian. Values are tagged: a float ('<d'), a 64-bit int
+('<q'), a UTF-8 string or, for anything else, its JSON text; strings and
+JSON text are prefixed with a '<I' length.
+
+`BinaryRule` reads a buffer without copying the programs: opcodes and
+arguments are `memoryview` slices of it, evaluated in place by the
+`CompactRule` stack machine. Only the condition table is decoded, into
+conditions interned in `compact.condition_pool`.
+"""
+import json
+import struct
+import sys
+from array import array
+from .ast_node import Node
+from .compact import OP_OPERAND, Condition, CompactRule, ConditionPool, condition_pool
+from typing import Any, List, Optional, Tuple
+
+MAGIC = b'RAST'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBBHI')
+_CONDITION = struct.Struct('<HBB')
+_LENGTH = struct.Struct('<I')
+_FLOAT = struct.Struct('<d')
+_INT = struct.Struct('<q')
+
+_TAG_FLOAT = 0
+_TAG_INT = 1
+_TAG_STR = 2
+_TAG_JSON = 3
+
+_INT_MIN, _INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class BinaryFormatError(Exception):
+    """Raised when a buffer is not a valid binary rule encoding."""
+    pass
+
+
+def _encode_value(value: Any) -> Tuple[int, bytes]:
+    if isinstance(value, float):
+        return _TAG_FLOAT, _FLOAT.pack(value)
+    if isinstance(value, int) and not isinstance(value, bool) and _INT_MIN <= value <= _INT_MAX:
+        return _TAG_INT, _INT.pack(value)
+    if isinstance(value, str):
+        tag, encoded = _TAG_STR, value.encode('utf-8')
+    else:
+        tag, encoded = _TAG_JSON, json.dumps(value).encode('utf-8')
+    return tag, _LENGTH.pack(len(encoded)) + encoded
+
+
+def encode_rule(ast: Node, optimized: Optional[Node] = None) -> bytes:
+    """
+    Encode a rule AST, and optionally its optimized AST, to bytes.
+
+    Raises:
+        ValueError: If the AST contains a node or condition the compact form cannot represent.
+    """
+    pool = ConditionPool()
+    programs = [CompactRule.from_node(ast, pool)]
+    if optimized is not None:
+        programs.append(CompactRule.from_node(optimized, pool))
+
+    # One condition table for both programs; arguments are remapped into it
+    conditions: List[Condition] = []
+    indexes = {}
+    for program in programs:
+        for condition in program.conditions:
+            if id(condition) not in indexes:
+                indexes[id(condition)] = len(conditions)
+                conditions.append(condition)
+
+    parts = [_HEADER.pack(MAGIC, VERSION, len(programs), 0, len(conditions))]
+    for condition in conditions:
+        identifier = condition.identifier.encode('utf-8')
+        operator = condition.operator.encode('utf-8')
+        tag, value = _encode_value(condition.value)
+        parts += [_CONDITION.pack(len(identifier), len(operator), tag), identifier, operator, value]
+
+    for program in programs:
+        args = array('I', (
+            indexes[id(program.conditions[arg])] if opcode == OP_OPERAND else arg
+            for opcode, arg in zip(program.opcodes, program.args)
+        ))
+        if sys.byteorder != 'little':
+            args.byteswap()
+        count = len(program.opcodes)
+        parts += [_LENGTH.pack(count), program.opcodes.tobytes(), b'\0' * (-count % 4), args.tobytes()]
+    return b''.join(parts)
+
+
+class BinaryRule:
+    """
+    A rule decoded from `encode_rule` output.
+
+    `ast` and `optimized` are `CompactRule`s whose programs are views into
+    the buffer; calling the `BinaryRule` evaluates the optimized program when
+    one is stored, with the same results as `evaluate_rule`.
+    """
+    __slots__ = ('buffer', 'conditions', 'ast', 'optimized')
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if view.format != 'B':
+            view = view.cast('B')
+        try:
+            magic, version, program_count, _, condition_count = _HEADER.unpack_from(view, 0)
+            if magic != MAGIC or version != VERSION or program_count not in (1, 2):
+                raise BinaryFormatError("Not a binary rule encoding.")
+            offset = _HEADER.size
+            conditions = []
+            for _ in range(condition_count):
+                offset, condition = self._read_condition(view, offset)
+                conditions.append(condition)
+            self.conditions = tuple(conditions)
+
+            programs = []
+            for _ in range(program_count):
+                count, = _LENGTH.unpack_from(view, offset)
+                offset += _LENGTH.size
+                opcodes = view[offset:offset + count]
+                offset += count + (-count % 4)
+                args = view[offset:offset + 4 * count]
+                offset += 4 * count
+                if len(opcodes) != count or len(args) != 4 * count:
+                    raise BinaryFormatError("Truncated binary rule.")
+                if sys.byteorder == 'little':
+                    args = args.cast('I')
+                else:
+                    swapped = array('I')
+                    swapped.frombytes(args)
+                    swapped.byteswap()
+                    args = swapped
+                programs.append(CompactRule(opcodes, args, self.conditions))
+        except (struct.error, UnicodeDecodeError, ValueError) as e:
+            raise BinaryFormatError(f"Invalid binary rule: {e}")
+        self.buffer = buffer
+        self.ast = programs[0]
+        self.optimized = programs[1] if program_count == 2 else None
+
+    @staticmethod
+    def _read_condition(view: memoryview, offset: int) -> Tuple[int, Condition]:
+        identifier_length, operator_length, tag = _CONDITION.unpack_from(view, offset)
+        offset += _CONDITION.size
+        identifier = str(view[offset:offset + identifier_length], 'utf-8')
+        offset += identifier_length
+        operator = str(view[offset:offset + operator_length], 'utf-8')
+        offset += operator_length
+        if tag == _TAG_FLOAT:
+            value, = _FLOAT.unpack_from(view, offset)
+            offset += _FLOAT.size
+        elif tag == _TAG_INT:
+            value, = _INT.unpack_from(view, offset)
+            offset += _INT.size
+        elif tag in (_TAG_STR, _TAG_JSON):
+            length, = _LENGTH.unpack_from(view, offset)
+            offset += _LENGTH.size
+            text = str(view[offset:offset + length], 'utf-8')
+            offset += length
+            value = text if tag == _TAG_STR else json.loads(text)
+        else:
+            raise BinaryFormatError(f"Unknown value tag: {tag}")
+        return offset, condition_pool.get(identifier, operator, value)
+
+    def __call__(self, data) -> bool:
+        return (self.optimized if self.optimized is not None else self.ast)(data)
+
+    def to_node(self) -> Node:
+        return self.ast.to_node()
+
+    def optimized_node(self) -> Optional[Node]:
+        return self.optimized.to_node() if self.optimized is not None else None
+
+
+def decode_rule(buffer) -> Tuple[Node, Optional[Node]]:
+    """Decode `encode_rule` output to `(ast, optimized)` Node trees."""
+    rule = BinaryRule(buffer)
+    return rule.to_node(), rule.optimized_node()
@@ -0,0 +1,271 @@
+"""
+Compact rule representation.
+
+A `CompactRule` stores an AST as a postfix program: one `array('B')` of
+opcodes and one `array('I')` of arguments, plus a tuple of interned operand
+conditions. It holds no per-node objects, so large resident rule sets take a
+fraction of the memory of `Node` trees, and evaluation is a single loop over
+the arrays with a small value stack. Each condition compiles its predicate
+once, shared by every rule that references it; the pool only holds
+conditions weakly, so they are released with the last rule using them.
+Conditions are dicts, so `Node` trees rebuilt from a compact rule, or
+passed through `ConditionPool.intern_tree`, share them too.
+
+Binary and n-ary operators have distinct opcodes, so converting to a `Node`
+tree (or to `ast_to_json` output) and back is lossless.
+"""
+import sys
+import weakref
+from array import array
+from .ast_node import Node
+from .compiler import Predicate, compile_condition
+from .rule_functions import ast_to_json, json_to_ast
+from typing import Any, Dict, List, Optional, Tuple
+
+OP_OPERAND = 0   # push condition `arg`
+OP_CONSTANT = 1  # push False (the optimizer's constant-false node)
+OP_AND = 2       # binary AND of the top two values
+OP_OR = 3        # binary OR of the top two values
+OP_AND_N = 4     # n-ary AND of the top `arg` values
+OP_OR_N = 5      # n-ary OR of the top `arg` values
+
+_BINARY_OPCODES = {'AND': OP_AND, 'OR': OP_OR}
+_NARY_OPCODES = {'AND': OP_AND_N, 'OR': OP_OR_N}
+_OPERATORS = {OP_AND: 'AND', OP_OR: 'OR', OP_AND_N: 'AND', OP_OR_N: 'OR'}
+
+_CONDITION_KEYS = {'identifier', 'operator', 'value'}
+
+
+class Condition(dict):
+    """
+    An operand condition; treat it as immutable.
+
+    It is the `{'identifier', 'operator', 'value'}` dict of an operand, so
+    `Node` operands hold it directly. Equal conditions compare and hash
+    equal, with values compared by type and value. The predicate is compiled
+    on first use and kept on the condition.
+    """
+    __slots__ = ('_predicate', '__weakref__')
+
+    def __init__(self, identifier: str, operator: str, value: Any):
+        super().__init__(identifier=identifier, operator=operator, value=value)
+        self._predicate: Optional[Predicate] = None
+
+    @property
+    def identifier(self) -> str:
+        return self['identifier']
+
+    @property
+    def operator(self) -> str:
+        return self['operator']
+
+    @property
+    def value(self) -> Any:
+        return self['value']
+
+    @property
+    def predicate(self) -> Predicate:
+        predicate = self._predicate
+        if predicate is None:
+            predicate = self._predicate = compile_condition(self)
+        return predicate
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def _key(self) -> Tuple[str, str, type, Any]:
+        value = self['value']
+        return self['identifier'], self['operator'], type(value), value
+
+    def __eq__(self, other):
+        if not isinstance(other, Condition):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        if not isinstance(other, Condition):
+            return NotImplemented
+        return self._key() != other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __reduce__(self):
+        return Condition, (self['identifier'], self['operator'], self['value'])
+
+    def __repr__(self):
+        return f"Condition({self['identifier']!r}, {self['operator']!r}, {self['value']!r})"
+
+
+class ConditionPool:
+    """
+    Interns operand conditions so that equal conditions share one `Condition`.
+
+    Values are keyed with their type, so `30` and `30.0` stay distinct and
+    round-trip unchanged. Conditions are held weakly: one that no rule
+    references any more is dropped from the pool.
+    """
+
+    def __init__(self):
+        self._conditions: "weakref.WeakValueDictionary[Tuple[str, str, type, Any], Condition]" = \
+            weakref.WeakValueDictionary()
+
+    def intern(self, condition: Dict[str, Any]) -> Condition:
+        if condition.keys() != _CONDITION_KEYS:
+            raise ValueError(f"Unsupported operand condition: {condition!r}")
+        return self.get(condition['identifier'], condition['operator'], condition['value'])
+
+    def get(self, identifier: str, operator: str, value: Any) -> Condition:
+        """Return the interned condition for these parts, creating it if needed."""
+        key = (identifier, operator, type(value), value)
+        try:
+            interned = self._conditions.get(key)
+        except TypeError:
+            raise ValueError(f"Unsupported operand value: {value!r}")
+        if interned is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            interned = Condition(sys.intern(identifier), sys.intern(operator), value)
+            self._conditions[key] = interned
+        return interned
+
+    def intern_tree(self, ast: Optional[Node]) -> Optional[Node]:
+        """
+        Replace the operand conditions of a `Node` tree, in place, with
+        interned ones. Conditions the pool cannot hold are left as they are.
+        """
+        stack = [ast] if ast is not None else []
+        while stack:
+            node = stack.pop()
+            if node.type == 'operand':
+                try:
+                    node.value = self.intern(node.value)
+                except (AttributeError, ValueError):
+                    pass
+            elif node.type == 'operator':
+                stack.extend(node.child_nodes())
+        return ast
+
+    def __len__(self):
+        return len(self._conditions)
+
+
+# Shared by default so conditions repeated across rules are stored once
+condition_pool = ConditionPool()
+
+
+class CompactRule:
+    """
+    A rule AST as a postfix program over interned conditions.
+
+    Calling it with a record evaluates the rule with the same results as
+    `evaluate_rule`.
+    """
+    __slots__ = ('opcodes', 'args', 'conditions')
+
+    def __init__(self, opcodes: array, args: array, conditions: Tuple[Condition, ...]):
+        self.opcodes = opcodes
+        self.args = args
+        self.conditions = conditions
+
+    @classmethod
+    def from_node(cls, ast: Node, pool: Optional[ConditionPool] = None) -> "CompactRule":
+        """Convert a `Node` tree, walking it iteratively in post-order."""
+        if ast is None:
+            raise ValueError("Cannot convert an empty AST.")
+        if pool is None:
+            pool = condition_pool
+        opcodes = array('B')
+        args = array('I')
+        conditions: List[Condition] = []
+        indexes: Dict[int, int] = {}
+        stack: List[Tuple[Node, bool]] = [(ast, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node.type == 'operand':
+                condition = pool.intern(node.value)
+                index = indexes.get(id(condition))
+                if index is None:
+                    index = indexes[id(condition)] = len(conditions)
+                    conditions.append(condition)
+                opcodes.append(OP_OPERAND)
+                args.append(index)
+            elif node.type == 'constant' and node.value is False:
+                opcodes.append(OP_CONSTANT)
+                args.append(0)
+            elif node.type == 'operator' and node.value in _BINARY_OPCODES:
+                if node.children is not None:
+                    if expanded:
+                        opcodes.append(_NARY_OPCODES[node.value])
+                        args.append(len(node.children))
+                    else:
+                        stack.append((node, True))
+                        stack.extend((child, False) for child in reversed(node.children))
+                elif node.left is None or node.right is None:
+                    raise ValueError("Binary operator nodes need both operands.")
+                elif expanded:
+                    opcodes.append(_BINARY_OPCODES[node.value])
+                    args.append(2)
+                else:
+                    stack.extend(((node, True), (node.right, False), (node.left, False)))
+            else:
+                raise ValueError(f"Unsupported node: {node.type} {node.value!r}")
+        return cls(opcodes, args, tuple(conditions))
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any], pool: Optional[ConditionPool] = None) -> "CompactRule":
+        return cls.from_node(json_to_ast(data), pool)
+
+    def to_node(self) -> Node:
+        """Rebuild the `Node` tree this rule was converted from."""
+        conditions = self.conditions
+        stack: List[Node] = []
+        for opcode, arg in zip(self.opcodes, self.args):
+            if opcode == OP_OPERAND:
+                stack.append(Node('operand', value=conditions[arg]))
+            elif opcode == OP_CONSTANT:
+                stack.append(Node('constant', value=False))
+            elif opcode == OP_AND or opcode == OP_OR:
+                right = stack.pop()
+                stack[-1] = Node('operator', value=_OPERATORS[opcode], left=stack[-1], right=right)
+            else:
+                children = stack[-arg:]
+                del stack[-arg:]
+                stack.append(Node('operator', value=_OPERATORS[opcode], children=children))
+        return stack[0]
+
+    def to_json(self) -> Dict[str, Any]:
+        return ast_to_json(self.to_node())
+
+    def __call__(self, data: Dict[str, Any]) -> bool:
+        conditions = self.conditions
+        stack: List[bool] = []
+        push = stack.append
+        pop = stack.pop
+        for opcode, arg in zip(self.opcodes, self.args):
+            if opcode == OP_OPERAND:
+                push(conditions[arg].predicate(data))
+            elif opcode == OP_AND:
+                right = pop()
+                stack[-1] = stack[-1] and right
+            elif opcode == OP_OR:
+                right = pop()
+                stack[-1] = stack[-1] or right
+            elif opcode == OP_CONSTANT:
+                push(False)
+            else:
+                values = stack[-arg:]
+                del stack[-arg:]
+                push(all(values) if opcode == OP_AND_N else any(values))
+        return bool(stack[0])
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __repr__(self):
+        return f"CompactRule({len(self.opcodes)} ops, {len(self.conditions)} conditions)"
+
+
+def compact_rule(ast: Node, pool: Optional[ConditionPool] = None) -> CompactRule:
+    """Convert a rule AST to its compact postfix form."""
+    return CompactRule.from_node(ast, pool)
@@ -0,0 +1,190 @@
+import operator as _operator
+from .ast_node import Node, flatten_operands
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class CompilationError(Exception):
+    """Custom exception for compiler errors."""
+    pass
+
+# Comparison operators, bound once at compile time instead of dispatched per record
+COMPARISON_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '>': _operator.gt,
+    '>=': _operator.ge,
+    '<': _operator.lt,
+    '<=': _operator.le,
+    '=': _operator.eq,
+    '==': _operator.eq,
+    '!=': _operator.ne,
+}
+
+_MISSING = object()
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+def condition_key(condition: Dict[str, Any]) -> str:
+    """Return the details key used for an operand condition, e.g. "age > 30.0"."""
+    return f"{condition['identifier']} {condition['operator']} {repr(condition['value'])}"
+
+
+def _always_false(data: Dict[str, Any]) -> bool:
+    return False
+
+
+def compile_condition(condition: Dict[str, Any]) -> Predicate:
+    """
+    Compile an operand condition into a predicate over a record.
+
+    The expected value is coerced once and the comparison operator is bound up
+    front; the predicate keeps the interpreter's semantics (missing attributes,
+    failed coercions and unknown operators all evaluate to False).
+    """
+    identifier = condition['identifier']
+    expected_value = condition['value']
+    compare = COMPARISON_OPERATORS.get(condition['operator'])
+    if compare is None:
+        return _always_false
+
+    if isinstance(expected_value, str):
+        compare_value = expected_value
+
+        def predicate(data: Dict[str, Any]) -> bool:
+            data_value = data.get(identifier, _MISSING)
+            if data_value is _MISSING:
+                return False
+            return compare(str(data_value), compare_value)
+
+    elif isinstance(expected_value, (int, float)):
+        compare_value = float(expected_value)
+
+        def predicate(data: Dict[str, Any]) -> bool:
+            data_value = data.get(identifier, _MISSING)
+            if data_value is _MISSING:
+                return False
+            try:
+                return compare(float(data_value), compare_value)
+            except (ValueError, TypeError):
+                return False
+
+    else:
+        return _always_false
+
+    return predicate
+
+
+def _operand_predicate(condition: Dict[str, Any]) -> Predicate:
+    # Interned conditions (`compact.Condition`) share one compiled predicate
+    predicate = getattr(condition, 'predicate', None)
+    return predicate if predicate is not None else compile_condition(condition)
+
+
+def all_of(predicates: List[Predicate]) -> Predicate:
+    """Combine predicates with a short-circuiting AND."""
+    if len(predicates) == 2:
+        left, right = predicates
+        return lambda data: left(data) and right(data)
+
+    def evaluate(data: Dict[str, Any]) -> bool:
+        for predicate in predicates:
+            if not predicate(data):
+                return False
+        return True
+    return evaluate
+
+
+def any_of(predicates: List[Predicate]) -> Predicate:
+    """Combine predicates with a short-circuiting OR."""
+    if len(predicates) == 2:
+        left, right = predicates
+        return lambda data: left(data) or right(data)
+
+    def evaluate(data: Dict[str, Any]) -> bool:
+        for predicate in predicates:
+            if predicate(data):
+                return True
+        return False
+    return evaluate
+
+
+def _compile_node(node: Node) -> Predicate:
+    if node.type == 'operator':
+        # Chains of the same operator compile to one flat closure
+        operands = [_compile_node(child) for child in flatten_operands(node)]
+        if node.value == 'AND':
+            return all_of(operands)
+        if node.value == 'OR':
+            return any_of(operands)
+        raise CompilationError(f"Unknown logical operator: {node.value}")
+    if node.type == 'operand':
+        return _operand_predicate(node.value)
+    return _always_false
+
+
+def _compile_node_with_details(node: Node) -> Callable[[Dict[str, Any], Dict[str, bool]], bool]:
+    if node.type == 'operator':
+        operands = [_compile_node_with_details(child) for child in flatten_operands(node)]
+        if node.value == 'AND':
+            def evaluate(data, details):
+                # Every operand is visited, so the details cover the whole tree
+                results = [operand(data, details) for operand in operands]
+                return all(results)
+        elif node.value == 'OR':
+            def evaluate(data, details):
+                results = [operand(data, details) for operand in operands]
+                return any(results)
+        else:
+            raise CompilationError(f"Unknown logical operator: {node.value}")
+        return evaluate
+    if node.type == 'operand':
+        key = condition_key(node.value)
+        predicate = _operand_predicate(node.value)
+
+        def evaluate(data, details):
+            result = predicate(data)
+            details[key] = result
+            return result
+        return evaluate
+    return lambda data, details: False
+
+
+class CompiledRule:
+    """
+    A rule AST compiled into composed closures.
+
+    Calling the compiled rule returns only the boolean result and short-circuits
+    AND/OR; `evaluate_with_details` visits every operand and reports each
+    condition, matching `evaluate_node_with_details`. When an equivalent
+    `optimized` AST is given, the boolean path runs on it while the details
+    still cover every condition of `ast`.
+    """
+    __slots__ = ('ast', 'optimized', '_evaluate', '_evaluate_with_details')
+
+    def __init__(self, ast: Node, optimized: Optional[Node] = None):
+        self.ast = ast
+        self.optimized = optimized
+        self._evaluate = _compile_node(optimized if optimized is not None else ast)
+        self._evaluate_with_details = _compile_node_with_details(ast)
+
+    def __call__(self, data: Dict[str, Any]) -> bool:
+        return self._evaluate(data)
+
+    def evaluate_with_details(self, data: Dict[str, Any]) -> Tuple[bool, Dict[str, bool]]:
+        details: Dict[str, bool] = {}
+        result = self._evaluate_with_details(data, details)
+        return result, details
+
+    def __repr__(self):
+        return f"CompiledRule({self.ast})"
+
+
+def compile_rule(ast: Optional[Node], optimized: Optional[Node] = None) -> CompiledRule:
+    """
+    Compile a rule AST into a `CompiledRule`, optionally evaluating booleans
+    on an equivalent `optimized` AST.
+
+    Raises:
+        CompilationError: If the AST is empty or contains an unknown logical operator.
+    """
+    if ast is None:
+        raise CompilationError("Cannot compile an empty AST.")
+    return CompiledRule(ast, optimized)
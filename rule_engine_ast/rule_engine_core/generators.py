@@ -0,0 +1,82 @@
+"""
+Synthetic rules and records for benchmarks and fuzz tests.
+
+Rules are generated as rule strings with a configurable shape: `depth`
+levels of parenthesized AND/OR groups of `width` children each, over a mix
+of attributes, with a given share of string (rather than numeric)
+conditions. Every generator takes a `random.Random`, so runs are
+reproducible from a seed.
+"""
+import random
+from typing import Any, Dict, List, Optional, Sequence
+
+DEPARTMENTS = ('Sales', 'Marketing', 'HR', 'Engineering', 'Finance')
+
+# Upper bound of each numeric attribute; values are drawn from [0, bound]
+NUMERIC_BOUNDS = {'age': 70, 'salary': 150000, 'experience': 30, 'performance_score': 100}
+
+# Values of the attributes compared against strings
+STRING_VALUES = {'department': DEPARTMENTS}
+
+ATTRIBUTES = tuple(sorted({*NUMERIC_BOUNDS, *STRING_VALUES}))
+
+
+def random_condition(rng: random.Random, attributes: Sequence[str] = ATTRIBUTES, string_ratio: float = 0.25) -> str:
+    """
+    Return one comparison over `attributes`.
+
+    A string condition is produced with probability `string_ratio` when the
+    mix contains a string attribute; otherwise a numeric one, when possible.
+    """
+    strings = [attribute for attribute in attributes if attribute in STRING_VALUES]
+    numbers = [attribute for attribute in attributes if attribute in NUMERIC_BOUNDS]
+    if not strings and not numbers:
+        raise ValueError(f"No known attribute in {', '.join(attributes)}.")
+    if strings and (not numbers or rng.random() < string_ratio):
+        attribute = rng.choice(strings)
+        return f"{attribute} {rng.choice(['=', '!='])} '{rng.choice(STRING_VALUES[attribute])}'"
+    attribute = rng.choice(numbers)
+    return f"{attribute} {rng.choice(['>', '>=', '<', '<=', '='])} {rng.randint(0, NUMERIC_BOUNDS[attribute])}"
+
+
+def random_rule(rng: random.Random, depth: int = 2, width: int = 3, attributes: Sequence[str] = ATTRIBUTES,
+                string_ratio: float = 0.25) -> str:
+    """
+    Return a rule string with `width ** depth` conditions.
+
+    Each level joins `width` sub-rules with a randomly chosen AND or OR;
+    sub-rules are parenthesized.
+    """
+    if depth <= 0 or width <= 1:
+        return random_condition(rng, attributes, string_ratio)
+    operator = rng.choice([' AND ', ' OR '])
+    children = []
+    for _ in range(width):
+        child = random_rule(rng, depth - 1, width, attributes, string_ratio)
+        children.append(f"({child})" if depth > 1 else child)
+    return operator.join(children)
+
+
+def random_rules(rng: random.Random, count: int, **shape: Any) -> List[str]:
+    """Return `count` rule strings generated with `random_rule(**shape)`."""
+    return [random_rule(rng, **shape) for _ in range(count)]
+
+
+def random_record(rng: random.Random, attributes: Sequence[str] = ATTRIBUTES,
+                  missing_ratio: float = 0.0) -> Dict[str, Any]:
+    """Return a record with a value for each attribute, each absent with probability `missing_ratio`."""
+    record = {}
+    for attribute in attributes:
+        if missing_ratio and rng.random() < missing_ratio:
+            continue
+        if attribute in STRING_VALUES:
+            record[attribute] = rng.choice(STRING_VALUES[attribute])
+        else:
+            record[attribute] = rng.randint(0, NUMERIC_BOUNDS[attribute])
+    return record
+
+
+def random_records(rng: random.Random, count: int, attributes: Optional[Sequence[str]] = None,
+                   missing_ratio: float = 0.0) -> List[Dict[str, Any]]:
+    """Return `count` records generated with `random_record`."""
+    return [random_record(rng, attributes or ATTRIBUTES, missing_ratio) for _ in range(count)]
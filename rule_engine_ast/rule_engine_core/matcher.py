@@ -0,0 +1,108 @@
+from .ast_node import Node, flatten_operands
+from .compiler import CompilationError, Predicate, all_of, any_of, compile_condition
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+PredicateKey = Tuple[str, str, Tuple[str, Any]]
+Resolver = Callable[[Sequence[bool]], bool]
+
+
+def predicate_key(condition: Dict[str, Any]) -> PredicateKey:
+    """
+    Return a hashable key identifying an operand condition by meaning.
+
+    '=' and '==' share a key, and numeric values are keyed by their float value
+    so that `age > 30` written with an int or a float is the same predicate.
+    """
+    operator = '=' if condition['operator'] == '==' else condition['operator']
+    value = condition['value']
+    if isinstance(value, str):
+        normalized = ('str', value)
+    elif isinstance(value, (int, float)):
+        normalized = ('num', float(value))
+    else:
+        normalized = ('other', repr(value))
+    return condition['identifier'], operator, normalized
+
+
+class PredicateTable:
+    """
+    The distinct operand conditions of a rule set, each compiled once.
+    """
+
+    def __init__(self):
+        self.keys: List[PredicateKey] = []
+        self.conditions: List[Dict[str, Any]] = []
+        self.predicates: List[Predicate] = []
+        self._ids: Dict[PredicateKey, int] = {}
+
+    def add(self, condition: Dict[str, Any]) -> int:
+        """Register a condition and return its predicate id."""
+        key = predicate_key(condition)
+        predicate_id = self._ids.get(key)
+        if predicate_id is None:
+            predicate_id = len(self.keys)
+            self._ids[key] = predicate_id
+            self.keys.append(key)
+            self.conditions.append(condition)
+            self.predicates.append(compile_condition(condition))
+        return predicate_id
+
+    def evaluate(self, data: Dict[str, Any]) -> List[bool]:
+        """Evaluate every distinct predicate once against a record."""
+        return [predicate(data) for predicate in self.predicates]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def _false_resolver(results: Sequence[bool]) -> bool:
+    return False
+
+
+def compile_resolver(node: Node, table: PredicateTable) -> Resolver:
+    """
+    Compile a rule AST into a function of the shared predicate results.
+
+    Operands are registered in `table`; the returned resolver reads
+    `results[predicate_id]` instead of re-evaluating the condition.
+    """
+    if node.type == 'operator':
+        resolvers = [compile_resolver(child, table) for child in flatten_operands(node)]
+        if node.value == 'AND':
+            return all_of(resolvers)
+        if node.value == 'OR':
+            return any_of(resolvers)
+        raise CompilationError(f"Unknown logical operator: {node.value}")
+    if node.type == 'operand':
+        predicate_id = table.add(node.value)
+        return lambda results: results[predicate_id]
+    return _false_resolver
+
+
+class RuleSetMatcher:
+    """
+    Matches a record against many rules at once.
+
+    Conditions repeated across rules (common in combined rules) are evaluated
+    once per record, so the cost of a match grows with the number of distinct
+    predicates rather than with the total size of the ASTs.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[Hashable, Node]]):
+        self.table = PredicateTable()
+        self.rules: List[Tuple[Hashable, Resolver]] = [
+            (rule_id, compile_resolver(ast, self.table)) for rule_id, ast in rules
+        ]
+
+    @property
+    def rule_count(self) -> int:
+        return len(self.rules)
+
+    @property
+    def predicate_count(self) -> int:
+        return len(self.table)
+
+    def match(self, data: Dict[str, Any]) -> List[Hashable]:
+        """Return the ids of every rule satisfied by the record, in rule order."""
+        results = self.table.evaluate(data)
+        return [rule_id for rule_id, resolve in self.rules if resolve(results)]
@@ -0,0 +1,223 @@
+"""
+Process-local counters and histograms, rendered in the Prometheus text format.
+
+Each metric keeps its values in a dict keyed by the tuple of label values and
+updates it under its own lock, so recording a value costs a dict lookup and,
+for a histogram, a bisect over the bucket bounds. Label values are converted
+to strings only when the registry is rendered. Every process keeps its own
+values: scrape each worker process, or aggregate them in Prometheus.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency bucket bounds in seconds, from 10 microseconds to 2.5 seconds
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# One sample of a metric family: (name suffix, {label: value}, value)
+Sample = Tuple[str, Dict[str, Any], float]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if math.isinf(bound) else repr(float(bound))
+
+
+def _labels(labelnames: Sequence[str], values: Sequence[Any]) -> Dict[str, Any]:
+    if len(values) != len(labelnames):
+        raise ValueError(f"Expected {len(labelnames)} label values, got {len(values)}.")
+    return dict(zip(labelnames, values))
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: Any) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def collect(self) -> List[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        return [('', _labels(self.labelnames, labels), value) for labels, value in values]
+
+
+class Histogram:
+    """
+    Observations counted in fixed buckets per combination of label values.
+
+    `buckets` are the inclusive upper bounds, in increasing order; an
+    implicit `+Inf` bucket counts everything above the last one.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        if list(buckets) != sorted(buckets) or not buckets:
+            raise ValueError("Histogram buckets must be a non-empty increasing sequence.")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets if not math.isinf(bound))
+        # Label values -> [per-bucket counts (the last one is +Inf), sum]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: Any) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels: Any) -> Iterator[None]:
+        """Observe the seconds spent in the `with` block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: Any) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series is not None else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def collect(self) -> List[Sample]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        samples = []
+        for labels, counts, total in series:
+            labels = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                samples.append(('_bucket', {**labels, 'le': _format_bound(bound)}, cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative))
+        return samples
+
+
+# A collector returns metric families computed at render time:
+# (name, kind, documentation, [({label: value}, value), ...])
+Collector = Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[Dict[str, Any], float]]]]]
+
+
+class Registry:
+    """Holds the metrics of a process and renders them for a scrape."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}.")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Return the counter called `name`, creating it on first use."""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Return the histogram called `name`, creating it on first use."""
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def register_collector(self, collector: Collector) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def clear(self) -> None:
+        """Reset every counter and histogram."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+            collectors = list(self._collectors)
+
+        families = [
+            (metric.name, metric.kind, metric.documentation, metric.collect()) for metric in metrics
+        ]
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                families.append((name, kind, documentation, [('', labels, value) for labels, value in samples]))
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {_escape_help(documentation)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                if labels:
+                    label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                    lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name}{suffix} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
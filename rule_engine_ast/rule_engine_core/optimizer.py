@@ -0,0 +1,277 @@
+"""
+AST optimizer.
+
+Rewrites a rule AST into a smaller tree that evaluates to the same result for
+every record, under the evaluator's semantics: an operand is False when its
+attribute is absent or cannot be coerced, so comparisons on one attribute and
+value kind (numeric or string) all hold only for present, valid values.
+
+The optimizer
+- flattens nested runs of the same operator,
+- removes duplicate children of an AND/OR,
+- merges numeric and string range comparisons on the same attribute (keeping
+  the tightest bounds under AND and the loosest under OR),
+- folds contradictions such as `department = 'Sales' AND department = 'HR'`
+  and operands that can never hold to a constant-false node.
+
+Apparent tautologies such as `age > 30 OR age <= 30` are left alone: they are
+False for records without a valid `age`, so they are not constant.
+"""
+from .ast_node import Node, flatten_operands, make_operator_node
+from .compiler import COMPARISON_OPERATORS, condition_key
+from .matcher import predicate_key
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+_LOWER_BOUNDS = {'>', '>='}
+_UPPER_BOUNDS = {'<', '<='}
+
+
+class OptimizationResult(NamedTuple):
+    ast: Node
+    removed: List[str]
+    original_conditions: int
+    optimized_conditions: int
+
+
+def constant_false() -> Node:
+    """Return a node that always evaluates to False."""
+    return Node('constant', value=False)
+
+
+def _is_false(node: Node) -> bool:
+    return node.type == 'constant' and not node.value
+
+
+def _describe(node: Node) -> str:
+    if node.type == 'operand':
+        return condition_key(node.value)
+    if node.type == 'operator':
+        return f" {node.value} ".join(
+            f"({_describe(child)})" if child.type == 'operator' else _describe(child)
+            for child in flatten_operands(node)
+        )
+    return str(node.value).lower()
+
+
+def _structure_key(node: Node) -> Hashable:
+    # AND/OR are commutative and idempotent, so children are compared as a set
+    if node.type == 'operand':
+        return 'operand', predicate_key(node.value)
+    if node.type == 'operator':
+        return node.value, frozenset(_structure_key(child) for child in flatten_operands(node))
+    return node.type, node.value
+
+
+def _count_conditions(node: Node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.type == 'operand':
+            count += 1
+        elif current.type == 'operator':
+            stack.extend(current.child_nodes())
+    return count
+
+
+def _comparable(node: Node) -> Optional[Tuple[Tuple[str, str], str, Any]]:
+    """Return `((identifier, kind), operator, value)` for a mergeable operand."""
+    if node.type != 'operand':
+        return None
+    identifier, operator, (kind, value) = predicate_key(node.value)
+    if kind not in ('num', 'str') or operator not in COMPARISON_OPERATORS:
+        return None
+    return (identifier, kind), operator, value
+
+
+def _tighter(candidate: Tuple[str, Any], current: Optional[Tuple[str, Any]], lower: bool) -> bool:
+    """Whether bound `candidate` implies bound `current` (both lower or both upper)."""
+    if current is None:
+        return True
+    operator, value = candidate
+    current_operator, current_value = current
+    if value != current_value:
+        return value > current_value if lower else value < current_value
+    return operator in ('>', '<') and current_operator not in ('>', '<')
+
+
+def _satisfies(value: Any, operator: str, bound: Any) -> bool:
+    return COMPARISON_OPERATORS[operator](value, bound)
+
+
+def _merge_and(group: List[Node], removed: List[str]) -> Optional[List[Node]]:
+    """
+    Merge the operands of one AND on a single attribute and value kind.
+    Returns the operands to keep, or None when they contradict each other.
+    """
+    lower = upper = None
+    lower_node = upper_node = None
+    equal: Dict[Any, Node] = {}
+    not_equal: List[Tuple[Any, Node]] = []
+    for node in group:
+        _, operator, value = _comparable(node)
+        if operator in _LOWER_BOUNDS:
+            if _tighter((operator, value), lower, lower=True):
+                if lower_node is not None:
+                    removed.append(f"merged '{_describe(lower_node)}' into '{_describe(node)}'")
+                lower, lower_node = (operator, value), node
+            else:
+                removed.append(f"merged '{_describe(node)}' into '{_describe(lower_node)}'")
+        elif operator in _UPPER_BOUNDS:
+            if _tighter((operator, value), upper, lower=False):
+                if upper_node is not None:
+                    removed.append(f"merged '{_describe(upper_node)}' into '{_describe(node)}'")
+                upper, upper_node = (operator, value), node
+            else:
+                removed.append(f"merged '{_describe(node)}' into '{_describe(upper_node)}'")
+        elif operator == '=':
+            equal.setdefault(value, node)
+        else:
+            not_equal.append((value, node))
+
+    if len(equal) > 1:
+        return None
+    if equal:
+        (value, node), = equal.items()
+        if lower is not None and not _satisfies(value, lower[0], lower[1]):
+            return None
+        if upper is not None and not _satisfies(value, upper[0], upper[1]):
+            return None
+        if any(value == excluded for excluded, _ in not_equal):
+            return None
+        # The equality implies every other comparison in the group
+        for implied in (lower_node, upper_node, *(other for _, other in not_equal)):
+            if implied is not None:
+                removed.append(f"merged '{_describe(implied)}' into '{_describe(node)}'")
+        return [node]
+
+    if lower is not None and upper is not None:
+        if lower[1] > upper[1]:
+            return None
+        if lower[1] == upper[1] and (lower[0] == '>' or upper[0] == '<'):
+            return None
+
+    kept = [node for node in (lower_node, upper_node) if node is not None]
+    for value, node in not_equal:
+        # A '!=' outside the bounds always holds when the bounds do
+        outside = (lower is not None and not _satisfies(value, lower[0], lower[1])) or \
+            (upper is not None and not _satisfies(value, upper[0], upper[1]))
+        if outside:
+            removed.append(f"removed '{_describe(node)}', implied by its range")
+        else:
+            kept.append(node)
+    return kept
+
+
+def _merge_or(group: List[Node], removed: List[str]) -> List[Node]:
+    """Merge the operands of one OR on a single attribute and value kind."""
+    lower = upper = None
+    lower_node = upper_node = None
+    others: List[Tuple[str, Any, Node]] = []
+    for node in group:
+        _, operator, value = _comparable(node)
+        if operator in _LOWER_BOUNDS:
+            if lower is None or _tighter(lower, (operator, value), lower=True):
+                if lower_node is not None:
+                    removed.append(f"merged '{_describe(lower_node)}' into '{_describe(node)}'")
+                lower, lower_node = (operator, value), node
+            else:
+                removed.append(f"merged '{_describe(node)}' into '{_describe(lower_node)}'")
+        elif operator in _UPPER_BOUNDS:
+            if upper is None or _tighter(upper, (operator, value), lower=False):
+                if upper_node is not None:
+                    removed.append(f"merged '{_describe(upper_node)}' into '{_describe(node)}'")
+                upper, upper_node = (operator, value), node
+            else:
+                removed.append(f"merged '{_describe(node)}' into '{_describe(upper_node)}'")
+        else:
+            others.append((operator, value, node))
+
+    kept = [node for node in (lower_node, upper_node) if node is not None]
+    for operator, value, node in others:
+        covering = None
+        if operator == '=':
+            if lower is not None and _satisfies(value, lower[0], lower[1]):
+                covering = lower_node
+            elif upper is not None and _satisfies(value, upper[0], upper[1]):
+                covering = upper_node
+        if covering is not None:
+            removed.append(f"merged '{_describe(node)}' into '{_describe(covering)}'")
+        else:
+            kept.append(node)
+    return kept
+
+
+def _optimize(node: Node, removed: List[str]) -> Node:
+    if node.type == 'operand':
+        if _comparable(node) is None:
+            removed.append(f"folded '{_describe(node)}' to false")
+            return constant_false()
+        return node
+    if node.type != 'operator':
+        return node
+    if node.value not in ('AND', 'OR'):
+        return node
+
+    children: List[Node] = []
+    for child in flatten_operands(node):
+        child = _optimize(child, removed)
+        if child.type == 'operator' and child.value == node.value:
+            children.extend(child.child_nodes())
+        else:
+            children.append(child)
+
+    if node.value == 'AND' and any(_is_false(child) for child in children):
+        removed.append(f"folded '{_describe(node)}' to false")
+        return constant_false()
+    if node.value == 'OR':
+        children = [child for child in children if not _is_false(child)]
+        if not children:
+            return constant_false()
+
+    unique: Dict[Hashable, Node] = {}
+    for child in children:
+        key = _structure_key(child)
+        if key in unique:
+            removed.append(f"removed duplicate '{_describe(child)}'")
+        else:
+            unique[key] = child
+
+    # Group comparable operands by attribute and value kind, keeping positions
+    groups: Dict[Tuple[str, str], List[Node]] = {}
+    for child in unique.values():
+        comparable = _comparable(child)
+        if comparable is not None:
+            groups.setdefault(comparable[0], []).append(child)
+
+    kept_operands = set()
+    for group in groups.values():
+        if len(group) == 1:
+            kept_operands.add(id(group[0]))
+            continue
+        if node.value == 'AND':
+            merged = _merge_and(group, removed)
+            if merged is None:
+                removed.append(f"folded '{_describe(make_operator_node('AND', group))}' to false")
+                return constant_false()
+        else:
+            merged = _merge_or(group, removed)
+        kept_operands.update(id(kept) for kept in merged)
+
+    result = [
+        child for child in unique.values()
+        if _comparable(child) is None or id(child) in kept_operands
+    ]
+    return make_operator_node(node.value, result)
+
+
+def optimize(ast: Node) -> OptimizationResult:
+    """
+    Optimize a rule AST.
+
+    The input tree is not modified; unchanged subtrees are shared with the
+    result. `removed` describes every merge, removal and fold performed.
+    """
+    removed: List[str] = []
+    optimized = _optimize(ast, removed)
+    return OptimizationResult(optimized, removed, _count_conditions(ast), _count_conditions(optimized))
@@ -0,0 +1,189 @@
+"""
+Parallel bulk scoring and rule parsing across worker processes.
+
+Evaluation is pure Python and bound by the GIL, so large jobs are split
+into chunks of records and scored by a pool of worker processes. Chunks
+carry only a key identifying the rule set; each worker prepares a `Scorer`
+once per key and keeps it for later chunks. The rules, in their compact
+binary encoding (`binary_ast`), go with the first chunk per worker of a key
+the pool has not sent lately; a worker that still has no scorer for the key
+answers with None and the chunk is sent again with the rules. The rule set
+thus crosses the process boundary about once per worker instead of once per
+chunk. Results are merged back in input order. The same workers parse, optimize and encode rule
+strings for bulk imports.
+"""
+import multiprocessing
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from .binary_ast import decode_rule, encode_rule
+from .optimizer import optimize
+from .rule_functions import ParseError, TokenizationError, create_rule
+from .scoring import Scorer
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Rule id and `binary_ast.encode_rule` output
+EncodedRule = Tuple[Hashable, bytes]
+
+# Scorers kept per worker process, most recently used last
+_WORKER_CACHE_SIZE = 32
+_worker_scorers: "OrderedDict[Hashable, Scorer]" = OrderedDict()
+
+
+def _worker_scorer(key: Hashable, rules: Optional[Sequence[EncodedRule]], engine: str) -> Optional[Scorer]:
+    scorer = _worker_scorers.get((key, engine))
+    if scorer is None:
+        if rules is None:
+            return None
+        scorer = Scorer([(rule_id, *decode_rule(encoded)) for rule_id, encoded in rules], engine=engine)
+        _worker_scorers[(key, engine)] = scorer
+        while len(_worker_scorers) > _WORKER_CACHE_SIZE:
+            _worker_scorers.popitem(last=False)
+    else:
+        _worker_scorers.move_to_end((key, engine))
+    return scorer
+
+
+def _score_task(key: Hashable, engine: str, records: Sequence[Dict[str, Any]],
+                rules: Optional[Sequence[EncodedRule]] = None) -> Optional[List[List[bool]]]:
+    """Score records in a worker, or return None when the rules are needed first."""
+    scorer = _worker_scorer(key, rules, engine)
+    return scorer.score(records) if scorer is not None else None
+
+
+def encode_rule_string(rule_string: str) -> Tuple[Optional[bytes], str]:
+    """
+    Parse and optimize a rule string and return its `encode_rule` output.
+
+    Returns:
+        tuple: The encoding (or None) and an error message, empty on success.
+    """
+    try:
+        ast = create_rule(rule_string)
+    except (ParseError, TokenizationError) as e:
+        return None, f"Invalid rule string: {e}"
+    if ast is None:
+        return None, "Rule string cannot be empty."
+    return encode_rule(ast, optimize(ast).ast), ''
+
+
+def _encode_task(rule_strings: Sequence[str]) -> List[Tuple[Optional[bytes], str]]:
+    return [encode_rule_string(rule_string) for rule_string in rule_strings]
+
+
+class ScoringPool:
+    """
+    A pool of worker processes scoring chunks of records.
+
+    Workers are started with the `spawn` method by default, which is safe
+    from threaded servers; they only import `rule_engine_core`. At most
+    `max_pending` chunks are in flight at once, so a long input stream is
+    never buffered whole.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 start_method: str = 'spawn'):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context(start_method)
+        )
+        # Rule sets the workers were last sent, most recently used last
+        self._sent_keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        # Chunks sent with the rules
+        self.rule_shipments = 0
+
+    def score_chunks(self, key: Hashable, rules: Sequence[EncodedRule],
+                     chunks: Iterable[Tuple[Any, Sequence[Dict[str, Any]]]],
+                     engine: str = 'compiled') -> Iterator[Tuple[Any, List[List[bool]]]]:
+        """
+        Score `(tag, records)` chunks and yield `(tag, rows)` in input order.
+
+        `key` identifies the rule set: workers reuse the `Scorer` built for a
+        key, so a changed rule set must come with a new key. `rules` are sent
+        with the first chunk per worker of a key new to the pool, and
+        otherwise only to a worker that does not know the key.
+        """
+        rules = tuple(rules)
+        # The first chunks of a key the pool has not sent lately carry the
+        # rules, one per worker, so a cold key costs no extra round trip
+        cold = self.workers if self._note_key((key, engine)) else 0
+        pending = deque()
+
+        def resend(entry):
+            self.rule_shipments += 1
+            entry[2] = self._executor.submit(_score_task, key, engine, entry[1], rules)
+
+        def result(entry):
+            nonlocal cold
+            rows = entry[2].result()
+            if rows is None:
+                # A worker has not prepared this rule set yet: resend the
+                # chunk, and every queued chunk already turned away, at once,
+                # and send the rules with the next chunks too
+                cold = self.workers
+                resend(entry)
+                for other in pending:
+                    if other[2].done() and other[2].result() is None:
+                        resend(other)
+                rows = entry[2].result()
+            return rows
+
+        for tag, records in chunks:
+            if cold:
+                cold -= 1
+                self.rule_shipments += 1
+                future = self._executor.submit(_score_task, key, engine, records, rules)
+            else:
+                future = self._executor.submit(_score_task, key, engine, records)
+            pending.append([tag, records, future])
+            if len(pending) >= self.max_pending:
+                entry = pending.popleft()
+                yield entry[0], result(entry)
+        while pending:
+            entry = pending.popleft()
+            yield entry[0], result(entry)
+
+    def _note_key(self, key: Hashable) -> bool:
+        """Mark `key` as recently sent and return whether it was new to the pool."""
+        known = key in self._sent_keys
+        self._sent_keys[key] = None
+        self._sent_keys.move_to_end(key)
+        while len(self._sent_keys) > _WORKER_CACHE_SIZE:
+            self._sent_keys.popitem(last=False)
+        return not known
+
+    def score(self, key: Hashable, rules: Sequence[EncodedRule], records: Sequence[Dict[str, Any]],
+              engine: str = 'compiled', chunk_size: Optional[int] = None) -> List[List[bool]]:
+        """Score records, split evenly across the workers by default."""
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(records) // self.workers))
+        chunks = ((None, records[start:start + chunk_size]) for start in range(0, len(records), chunk_size))
+        rows: List[List[bool]] = []
+        for _, chunk_rows in self.score_chunks(key, rules, chunks, engine):
+            rows.extend(chunk_rows)
+        return rows
+
+    def encode_rule_strings(self, rule_strings: Sequence[str],
+                            chunk_size: Optional[int] = None) -> List[Tuple[Optional[bytes], str]]:
+        """Apply `encode_rule_string` to every rule string across the workers, in input order."""
+        if chunk_size is None:
+            chunk_size = max(1, -(-len(rule_strings) // self.workers))
+        futures = deque()
+        encoded: List[Tuple[Optional[bytes], str]] = []
+        for start in range(0, len(rule_strings), chunk_size):
+            futures.append(self._executor.submit(_encode_task, rule_strings[start:start + chunk_size]))
+            if len(futures) >= self.max_pending:
+                encoded.extend(futures.popleft().result())
+        while futures:
+            encoded.extend(futures.popleft().result())
+        return encoded
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,11 +1,11 @@
-from .ast_node import Node
+from .ast_node import Node, make_operator_node
 from typing import Iterator, Tuple, Optional, Union
 
 class ParseError(Exception):
     """Custom exception for parser errors."""
     pass
 
-VALID_ATTRIBUTES = {'age', 'department', 'salary', 'experience','performance_score'}
+VALID_ATTRIBUTES = frozenset({'age', 'department', 'salary', 'experience', 'performance_score'})
 
 class Parser:
     """
@@ -40,20 +40,18 @@ class Parser:
             raise ParseError(f'Expected {expected_type}, got {current}')
     
     def expression(self) -> Node:
-        node = self.term()
+        operands = [self.term()]
         while self.current_token and self.current_token[0] == 'OR':
             self.match('OR')
-            right = self.term()
-            node = Node('operator', value='OR', left=node, right=right)
-        return node
+            operands.append(self.term())
+        return make_operator_node('OR', operands)
     
     def term(self) -> Node:
-        node = self.factor()
+        operands = [self.factor()]
         while self.current_token and self.current_token[0] == 'AND':
             self.match('AND')
-            right = self.factor()
-            node = Node('operator', value='AND', left=node, right=right)
-        return node
+            operands.append(self.factor())
+        return make_operator_node('AND', operands)
     
     def factor(self) -> Node:
         if self.current_token and self.current_token[0] == 'LPAREN':
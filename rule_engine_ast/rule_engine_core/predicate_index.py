@@ -0,0 +1,202 @@
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from .ast_node import Node, flatten_operands
+from .matcher import PredicateTable, Resolver, compile_resolver
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+# Relative cost of anchoring a rule on a predicate; '!=' holds for almost any
+# present value, so it makes a poor filter.
+_ANCHOR_WEIGHTS = {'!=': 16}
+
+_RANGE_OPERATORS = ('>', '>=', '<', '<=')
+
+
+class _Thresholds:
+    """Sorted thresholds of one comparison operator, with their predicate ids."""
+    __slots__ = ('values', 'predicate_ids')
+
+    def __init__(self, entries: List[Tuple[Any, int]]):
+        entries.sort(key=lambda entry: entry[0])
+        self.values = [value for value, _ in entries]
+        self.predicate_ids = [predicate_id for _, predicate_id in entries]
+
+
+class _AttributeIndex:
+    """
+    The predicates on one attribute for one value kind (numeric or string).
+
+    Range predicates sit in sorted threshold arrays and are found by binary
+    search; equality predicates sit in hash buckets.
+    """
+    __slots__ = ('ranges', 'equal', 'not_equal', 'not_equal_by_value')
+
+    def __init__(self):
+        self.ranges: Dict[str, Any] = {operator: [] for operator in _RANGE_OPERATORS}
+        self.equal: Dict[Any, List[int]] = {}
+        self.not_equal: List[int] = []
+        self.not_equal_by_value: Dict[Any, FrozenSet[int]] = {}
+
+    def add(self, operator: str, value: Any, predicate_id: int) -> None:
+        if operator in self.ranges:
+            self.ranges[operator].append((value, predicate_id))
+        elif operator == '=':
+            self.equal.setdefault(value, []).append(predicate_id)
+        elif operator == '!=':
+            self.not_equal.append(predicate_id)
+            self.not_equal_by_value.setdefault(value, []).append(predicate_id)
+
+    def freeze(self) -> None:
+        self.ranges = {operator: _Thresholds(entries) for operator, entries in self.ranges.items()}
+        self.not_equal_by_value = {
+            value: frozenset(predicate_ids) for value, predicate_ids in self.not_equal_by_value.items()
+        }
+
+    def collect(self, value: Any, satisfied: List[int]) -> None:
+        """Append the ids of the predicates satisfied by `value` to `satisfied`."""
+        if value != value:
+            # NaN fails every comparison except '!='
+            satisfied.extend(self.not_equal)
+            return
+
+        thresholds = self.ranges['>']
+        satisfied.extend(thresholds.predicate_ids[:bisect_left(thresholds.values, value)])
+        thresholds = self.ranges['>=']
+        satisfied.extend(thresholds.predicate_ids[:bisect_right(thresholds.values, value)])
+        thresholds = self.ranges['<']
+        satisfied.extend(thresholds.predicate_ids[bisect_right(thresholds.values, value):])
+        thresholds = self.ranges['<=']
+        satisfied.extend(thresholds.predicate_ids[bisect_left(thresholds.values, value):])
+
+        satisfied.extend(self.equal.get(value, ()))
+        if self.not_equal:
+            excluded = self.not_equal_by_value.get(value)
+            if excluded:
+                satisfied.extend(p for p in self.not_equal if p not in excluded)
+            else:
+                satisfied.extend(self.not_equal)
+
+
+def _anchor(node: Node, table: PredicateTable) -> Tuple[int, FrozenSet[int]]:
+    """
+    Return `(cost, predicate_ids)` such that the rule can only be true when at
+    least one of the predicates is satisfied.
+    """
+    if node.type == 'operator':
+        anchors = [_anchor(child, table) for child in flatten_operands(node)]
+        if node.value == 'AND':
+            return min(anchors, key=lambda anchor: anchor[0])
+        return sum(cost for cost, _ in anchors), frozenset().union(*(ids for _, ids in anchors))
+    if node.type == 'operand':
+        predicate_id = table.add(node.value)
+        return _ANCHOR_WEIGHTS.get(table.keys[predicate_id][1], 1), frozenset((predicate_id,))
+    # Constant-false nodes can never make a rule true
+    return 0, frozenset()
+
+
+def _deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(key, seen) + _deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(_deep_sizeof(getattr(obj, slot), seen) for slot in obj.__slots__)
+    return size
+
+
+class PredicateIndex:
+    """
+    Finds the rules satisfied by a record without scanning every rule.
+
+    Operand conditions are indexed per attribute: numeric comparisons in sorted
+    threshold arrays, string comparisons likewise, and equality in hash
+    buckets. Each rule is anchored on a small set of predicates, at least one
+    of which must hold for the rule to be true; for a record, only the rules
+    anchored on a satisfied predicate are resolved, from the satisfied set.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[Hashable, Node]]):
+        start = time.perf_counter()
+        self.table = PredicateTable()
+        self.rules: List[Tuple[Hashable, Resolver]] = []
+        anchors = []
+        for rule_id, ast in rules:
+            self.rules.append((rule_id, compile_resolver(ast, self.table)))
+            anchors.append(_anchor(ast, self.table)[1])
+
+        self._anchored: List[List[int]] = [[] for _ in range(len(self.table))]
+        for rule_index, predicate_ids in enumerate(anchors):
+            for predicate_id in predicate_ids:
+                self._anchored[predicate_id].append(rule_index)
+
+        self._numeric: Dict[str, _AttributeIndex] = {}
+        self._string: Dict[str, _AttributeIndex] = {}
+        for predicate_id, (identifier, operator, (kind, value)) in enumerate(self.table.keys):
+            if kind == 'num':
+                self._numeric.setdefault(identifier, _AttributeIndex()).add(operator, value, predicate_id)
+            elif kind == 'str':
+                self._string.setdefault(identifier, _AttributeIndex()).add(operator, value, predicate_id)
+        for attribute_index in (*self._numeric.values(), *self._string.values()):
+            attribute_index.freeze()
+
+        self.build_seconds = time.perf_counter() - start
+        self.memory_bytes = _deep_sizeof((self._anchored, self._numeric, self._string, self.table.keys))
+
+    @property
+    def rule_count(self) -> int:
+        return len(self.rules)
+
+    @property
+    def predicate_count(self) -> int:
+        return len(self.table)
+
+    def satisfied(self, data: Dict[str, Any]) -> List[int]:
+        """Return the ids of the predicates satisfied by the record."""
+        satisfied: List[int] = []
+        for identifier, attribute_index in self._numeric.items():
+            if identifier not in data:
+                continue
+            try:
+                value = float(data[identifier])
+            except (ValueError, TypeError):
+                continue
+            attribute_index.collect(value, satisfied)
+        for identifier, attribute_index in self._string.items():
+            if identifier in data:
+                attribute_index.collect(str(data[identifier]), satisfied)
+        return satisfied
+
+    def candidates(self, satisfied: Iterable[int]) -> List[int]:
+        """Return the indexes of the rules anchored on any satisfied predicate."""
+        candidates = set()
+        for predicate_id in satisfied:
+            candidates.update(self._anchored[predicate_id])
+        return sorted(candidates)
+
+    def match(self, data: Dict[str, Any]) -> List[Hashable]:
+        """Return the ids of every rule satisfied by the record, in rule order."""
+        satisfied = self.satisfied(data)
+        results = bytearray(len(self.table))
+        for predicate_id in satisfied:
+            results[predicate_id] = 1
+        rules = self.rules
+        matched = []
+        for rule_index in self.candidates(satisfied):
+            rule_id, resolve = rules[rule_index]
+            if resolve(results):
+                matched.append(rule_id)
+        return matched
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rules': self.rule_count,
+            'predicates': self.predicate_count,
+            'build_seconds': self.build_seconds,
+            'memory_bytes': self.memory_bytes,
+        }
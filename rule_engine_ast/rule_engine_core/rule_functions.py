@@ -1,21 +1,95 @@
 from .tokenizer import tokenize, TokenizationError
 from .parser import Parser, ParseError, VALID_ATTRIBUTES
-from .ast_node import Node
-from typing import List, Optional, Dict, Any, Tuple
+from .ast_node import Node, flatten_operands, make_operator_node
+from .compiler import COMPARISON_OPERATORS, CompiledRule, CompilationError, compile_rule, condition_key
+from .metrics import registry
+import re
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import List, Optional, Dict, Any, Tuple, Union
 
 class EvaluationError(Exception):
     """Custom exception for evaluation errors."""
     pass
 
 
+# Whitespace runs outside quoted strings; the tokenizer skips exactly these characters
+_WHITESPACE_OUTSIDE_STRINGS = re.compile(r"('[^']*')|[ \t\n]+")
+
+
+def normalize_rule_string(rule_string: str) -> str:
+    """Collapse whitespace outside quoted strings, so equivalent spellings share a parse."""
+    return _WHITESPACE_OUTSIDE_STRINGS.sub(lambda mo: mo.group(1) or ' ', rule_string).strip(' \t\n')
+
+
+class ParseCache:
+    """
+    Bounded LRU cache of parsed ASTs keyed by normalized rule string.
+
+    Cached ASTs are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Node]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Node]:
+        with self._lock:
+            ast = self._entries.get(key)
+            if ast is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ast
+
+    def put(self, key: str, ast: Node) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = ast
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+parse_cache = ParseCache()
+
+
+PARSES = registry.counter(
+    'rule_engine_parses_total', "Rule strings parsed (parse-cache misses), by outcome.", ('outcome',)
+)
+PARSE_SECONDS = registry.histogram('rule_engine_parse_seconds', "Time to tokenize and parse a rule string.")
+
+
 def create_rule(rule_string: str) -> Optional[Node]:
-    print(f"Creating rule with string: {rule_string}")  # Debugging line
-    
     # Handle empty or whitespace strings
     if not rule_string.strip():
+        PARSES.inc('error')
         raise ParseError("Rule string cannot be empty or just whitespace.")
+
+    key = normalize_rule_string(rule_string)
+    ast = parse_cache.get(key)
+    if ast is not None:
+        return ast
     
+    start = time.perf_counter()
     try:
+        # Parse the original string so error positions refer to it
         tokens = tokenize(rule_string)
         
         parser = Parser(tokens)
@@ -23,12 +97,16 @@ def create_rule(rule_string: str) -> Optional[Node]:
         
         if ast is None:
             raise ParseError("AST generation failed; rule string might be invalid.")
-        
-        return ast
     
     except (ParseError, TokenizationError) as e:
+        PARSES.inc('error')
         raise ParseError(f"Error parsing rule: {e}")
 
+    PARSE_SECONDS.observe(time.perf_counter() - start)
+    PARSES.inc('ok')
+    parse_cache.put(key, ast)
+    return ast
+
 
 def combine_rules(rule_strings: List[str], operator: str = 'OR') -> Optional[Node]:
     if operator not in {'AND', 'OR'}:
@@ -37,107 +115,195 @@ def combine_rules(rule_strings: List[str], operator: str = 'OR') -> Optional[Nod
     # Create ASTs from rule strings
     asts = [create_rule(rs) for rs in rule_strings]
     
+    return combine_asts(asts, operator=operator)
+
+
+def combine_asts(asts: List[Node], operator: str = 'OR') -> Optional[Node]:
+    """
+    Combine already-built ASTs under a single node with the given operator,
+    without re-parsing any rule string.
+    """
+    if operator not in {'AND', 'OR'}:
+        raise ValueError(f"Invalid operator '{operator}'. Only 'AND' and 'OR' are supported.")
+
     if not asts:
         return None
 
-    # Combine ASTs using the provided operator
-    combined_ast = asts[0]
-    for ast in asts[1:]:
-        combined_ast = Node('operator', value=operator, left=combined_ast, right=ast)
-    
-    return combined_ast
+    # Combine ASTs under a single n-ary node using the provided operator
+    return make_operator_node(operator, asts)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, str):
+        return f"'{value}'"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if float(value).is_integer():
+            return str(int(value))
+        # Positional notation only; the tokenizer does not read exponents
+        return format(Decimal(repr(float(value))), 'f')
+    raise ValueError(f"Cannot render value {value!r} in a rule string.")
+
+
+def ast_to_rule_string(node: Node) -> str:
+    """
+    Generate the canonical rule string for an AST.
+
+    Runs of the same operator are written flat and operator children with a
+    different operator are parenthesized, so `create_rule` on the result
+    yields an equivalent AST.
+    """
+    if node.type == 'operand':
+        condition = node.value
+        return f"{condition['identifier']} {condition['operator']} {_format_value(condition['value'])}"
+    if node.type == 'operator':
+        parts = []
+        for child in flatten_operands(node):
+            part = ast_to_rule_string(child)
+            parts.append(f"({part})" if child.type == 'operator' else part)
+        return f" {node.value} ".join(parts)
+    raise ValueError(f"Cannot render node of type {node.type!r} in a rule string.")
 
 
 def ast_to_json(node: Optional[Node]) -> Optional[Dict[str, Any]]:
+    """
+    Serialize an AST to JSON-compatible dicts.
+
+    Binary operators keep the `left`/`right` format, n-ary operators are
+    written with a `children` list. The tree is walked iteratively, so deep
+    ASTs do not hit the recursion limit.
+    """
     if node is None:
         return None
-    return {
-        'type': node.type,
-        'value': node.value,
-        'left': ast_to_json(node.left),
-        'right': ast_to_json(node.right)
-    }
+    root: Dict[str, Any] = {}
+    stack = [(node, root)]
+    while stack:
+        current, data = stack.pop()
+        data['type'] = current.type
+        data['value'] = current.value
+        if current.children is not None:
+            data['children'] = [{} for _ in current.children]
+            stack.extend(zip(current.children, data['children']))
+            continue
+        for side in ('left', 'right'):
+            child = getattr(current, side)
+            if child is None:
+                data[side] = None
+            else:
+                data[side] = {}
+                stack.append((child, data[side]))
+    return root
 
 def json_to_ast(data: Optional[Dict[str, Any]]) -> Optional[Node]:
+    """
+    Rebuild an AST from `ast_to_json` output, reading both the binary
+    `left`/`right` format and the n-ary `children` format. The tree is walked
+    iteratively.
+    """
     if data is None:
         return None
-    node = Node(
-        node_type=data['type'],
-        value=data['value'],
-        left=json_to_ast(data.get('left')),
-        right=json_to_ast(data.get('right'))
-    )
-    return node
+    root = Node(node_type=data['type'], value=data['value'])
+    stack = [(data, root)]
+    while stack:
+        current, node = stack.pop()
+        children = current.get('children')
+        if children is not None:
+            node.children = [Node(node_type=child['type'], value=child['value']) for child in children]
+            stack.extend(zip(children, node.children))
+            continue
+        for side in ('left', 'right'):
+            child = current.get(side)
+            if child is not None:
+                setattr(node, side, Node(node_type=child['type'], value=child['value']))
+                stack.append((child, getattr(node, side)))
+    return root
 
 
-def evaluate_node_with_details(node: Node, data: Dict[str, Any]) -> Tuple[bool, Dict[str, bool]]:
-    details = {}
+def evaluate_condition(condition: Dict[str, Any], data: Dict[str, Any]) -> bool:
+    identifier = condition['identifier']
+    expected_value = condition['value']
+    if identifier not in data:
+        return False
+    data_value = data[identifier]
+    # Type checking and conversion
+    if isinstance(expected_value, str):
+        data_value = str(data_value)
+        compare_value = expected_value
+    elif isinstance(expected_value, (int, float)):
+        try:
+            compare_value = float(expected_value)
+            data_value = float(data_value)
+        except (ValueError, TypeError):
+            return False
+    else:
+        return False
+    compare = COMPARISON_OPERATORS.get(condition['operator'])
+    if compare is None:
+        return False
+    return compare(data_value, compare_value)
+
+
+def evaluate_node(node: Node, data: Dict[str, Any]) -> bool:
+    """
+    Evaluate a node to a boolean, short-circuiting AND/OR.
+
+    Unlike `evaluate_node_with_details`, nothing is allocated for details and
+    the remaining operands are skipped once one decides the result. Binary
+    chains of the same operator (as stored before n-ary nodes) are walked
+    with `flatten_operands`, so their depth does not hit the recursion limit.
+    """
     if node.type == 'operator':
-        left_result, left_details = evaluate_node_with_details(node.left, data)
-        right_result, right_details = evaluate_node_with_details(node.right, data)
+        operands = node.children if node.children is not None else flatten_operands(node)
         if node.value == 'AND':
-            result = left_result and right_result
-        elif node.value == 'OR':
-            result = left_result or right_result
-        details.update(left_details)
-        details.update(right_details)
-        return result, details
+            return all(evaluate_node(child, data) for child in operands)
+        if node.value == 'OR':
+            return any(evaluate_node(child, data) for child in operands)
+        raise EvaluationError(f"Unknown logical operator: {node.value}")
     elif node.type == 'operand':
-        identifier = node.value['identifier']
-        operator = node.value['operator']
-        expected_value = node.value['value']
-        condition = f"{identifier} {operator} {repr(expected_value)}"
-        if identifier not in data:
-            details[condition] = False
-            return False, details
-        data_value = data[identifier]
-        # Type checking and conversion
-        if isinstance(expected_value, str):
-            data_value = str(data_value)
-            compare_value = expected_value
-        elif isinstance(expected_value, (int, float)):
-            try:
-                compare_value = float(expected_value)
-                data_value = float(data_value)
-            except (ValueError, TypeError):
-                details[condition] = False
-                return False, details
-        else:
-            details[condition] = False
-            return False, details
-        # Define comparison operations
-        if operator == '>':
-            result = data_value > compare_value
-        elif operator == '>=':
-            result = data_value >= compare_value
-        elif operator == '<':
-            result = data_value < compare_value
-        elif operator == '<=':
-            result = data_value <= compare_value
-        elif operator in {'==', '='}:
-            result = data_value == compare_value
-        elif operator == '!=':
-            result = data_value != compare_value
-        else:
-            result = False
-        details[condition] = result
-        return result, details
-    
+        return evaluate_condition(node.value, data)
     else:
-        return False, {}
+        return False
 
-def evaluate_rule_with_details(ast: Node, data: Dict[str, Any]) -> Tuple[bool, Dict[str, bool]]:
+
+def _evaluate_node_collecting(node: Node, data: Dict[str, Any], details: Dict[str, bool]) -> bool:
+    if node.type == 'operator':
+        # Every operand is visited, so the details cover the whole tree
+        results = [_evaluate_node_collecting(child, data, details) for child in flatten_operands(node)]
+        if node.value == 'AND':
+            return all(results)
+        if node.value == 'OR':
+            return any(results)
+        raise EvaluationError(f"Unknown logical operator: {node.value}")
+    elif node.type == 'operand':
+        result = evaluate_condition(node.value, data)
+        details[condition_key(node.value)] = result
+        return result
+    else:
+        return False
+
+
+def evaluate_node_with_details(node: Node, data: Dict[str, Any]) -> Tuple[bool, Dict[str, bool]]:
+    """
+    Evaluate a node, visiting every operand and recording each condition's
+    result in a single details dict.
+    """
+    details: Dict[str, bool] = {}
+    result = _evaluate_node_collecting(node, data, details)
+    return result, details
+
+def evaluate_rule_with_details(ast: Union[Node, CompiledRule], data: Dict[str, Any]) -> Tuple[bool, Dict[str, bool]]:
     try:
+        if isinstance(ast, CompiledRule):
+            return ast.evaluate_with_details(data)
         result, details = evaluate_node_with_details(ast, data)
         return result, details
     except EvaluationError as e:
         raise EvaluationError(f"Error during evaluation: {e}")
 
 
-
-
-def evaluate_rule(ast: Node, data: Dict[str, Any]) -> bool:
+def evaluate_rule(ast: Union[Node, CompiledRule], data: Dict[str, Any]) -> bool:
     try:
+        if isinstance(ast, CompiledRule):
+            return ast(data)
         return evaluate_node(ast, data)
     except EvaluationError as e:
         raise EvaluationError(f"Error during evaluation: {e}")
@@ -0,0 +1,75 @@
+"""
+Bulk scoring of records against a set of rules.
+
+A `Scorer` prepares a rule set once for one evaluation engine and scores
+batches of records, returning one row of booleans (one per rule, in rule
+order) per record. Every engine gives the same results as `evaluate_rule`.
+"""
+from . import vectorized
+from .ast_node import Node
+from .compiler import compile_rule
+from .predicate_index import PredicateIndex
+from .rule_functions import evaluate_rule
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Rule id, AST and optional optimized AST
+ScoringRule = Tuple[Hashable, Node, Optional[Node]]
+
+ENGINES = ('scalar', 'compiled', 'vectorized', 'index')
+
+
+def available_engines() -> List[str]:
+    """Return the engines usable in this environment (`vectorized` needs numpy)."""
+    return [engine for engine in ENGINES if engine != 'vectorized' or vectorized.np is not None]
+
+
+class Scorer:
+    """
+    A rule set prepared for one engine:
+
+    - `scalar` walks each AST per record,
+    - `compiled` runs each rule's compiled closures per record,
+    - `vectorized` evaluates each rule over a whole batch with numpy,
+    - `index` looks every record up in a `PredicateIndex`, which pays off
+      for many rules sharing attributes.
+    """
+
+    def __init__(self, rules: Sequence[ScoringRule], engine: str = 'compiled'):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}. Choose from {', '.join(ENGINES)}.")
+        self.engine = engine
+        self.rule_ids = [rule_id for rule_id, _, _ in rules]
+        # The optimized AST gives the same results and is cheaper to evaluate
+        asts = [optimized if optimized is not None else ast for _, ast, optimized in rules]
+        if engine == 'scalar':
+            self._rules = asts
+        elif engine == 'compiled':
+            self._rules = [compile_rule(ast) for ast in asts]
+        elif engine == 'vectorized':
+            self._rules = [vectorized.VectorizedRule(ast) for ast in asts]
+        else:
+            self._index = PredicateIndex(enumerate(asts))
+
+    def score(self, records: Sequence[Dict[str, Any]]) -> List[List[bool]]:
+        """Return, for each record, the result of every rule in rule order."""
+        if self.engine == 'scalar':
+            return [[evaluate_rule(ast, record) for ast in self._rules] for record in records]
+        if self.engine == 'compiled':
+            return [[bool(rule(record)) for rule in self._rules] for record in records]
+        if self.engine == 'vectorized':
+            batch = vectorized.ColumnBatch.from_records(records)
+            masks = [rule(batch).tolist() for rule in self._rules]
+            return [list(row) for row in zip(*masks)] if masks else [[] for _ in records]
+        rule_count = len(self.rule_ids)
+        rows = []
+        for record in records:
+            row = [False] * rule_count
+            for rule_index in self._index.match(record):
+                row[rule_index] = True
+            rows.append(row)
+        return rows
+
+    def score_chunks(self, chunks: Iterable[Tuple[Any, Sequence[Dict[str, Any]]]]) -> Iterator[Tuple[Any, List[List[bool]]]]:
+        """Score `(tag, records)` chunks and yield `(tag, rows)`, like `ScoringPool.score_chunks`."""
+        for tag, records in chunks:
+            yield tag, self.score(records)
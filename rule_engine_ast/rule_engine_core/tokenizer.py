@@ -5,21 +5,23 @@ class TokenizationError(Exception):
     """Custom exception for tokenizer errors."""
     pass
 
+TOKEN_SPECIFICATION = [
+    ('NUMBER',     r'\d+(\.\d*)?'),              # Integer or decimal number
+    ('STRING',     r"'[^']*'"),                  # String enclosed in single quotes
+    ('AND',        r'\bAND\b'),                  # AND operator
+    ('OR',         r'\bOR\b'),                   # OR operator
+    ('LPAREN',     r'\('),                       # Left Parenthesis
+    ('RPAREN',     r'\)'),                       # Right Parenthesis
+    ('COMPARISON', r'[><=!]=?'),                 # Comparison operators
+    ('IDENTIFIER', r'[A-Za-z_][A-Za-z0-9_]*'),   # Identifiers
+    ('SKIP',       r'[ \t\n]+'),                 # Skip over spaces, tabs, and newlines
+    ('MISMATCH',   r'.'),                        # Any other character
+]
+# Compiled once at import instead of on every call
+TOKEN_REGEX = re.compile('|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in TOKEN_SPECIFICATION))
+
 def tokenize(code: str) -> Iterator[Tuple[str, Union[str, float]]]:
-    token_specification = [
-        ('NUMBER',     r'\d+(\.\d*)?'),              # Integer or decimal number
-        ('STRING',     r"'[^']*'"),                  # String enclosed in single quotes
-        ('AND',        r'\bAND\b'),                  # AND operator
-        ('OR',         r'\bOR\b'),                   # OR operator
-        ('LPAREN',     r'\('),                       # Left Parenthesis
-        ('RPAREN',     r'\)'),                       # Right Parenthesis
-        ('COMPARISON', r'[><=!]=?'),                 # Comparison operators
-        ('IDENTIFIER', r'[A-Za-z_][A-Za-z0-9_]*'),   # Identifiers
-        ('SKIP',       r'[ \t\n]+'),                 # Skip over spaces, tabs, and newlines
-        ('MISMATCH',   r'.'),                        # Any other character
-    ]
-    token_regex = '|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in token_specification)
-    get_token = re.compile(token_regex).match
+    get_token = TOKEN_REGEX.match
     pos = 0
     mo = get_token(code, pos)
     while mo is not None:
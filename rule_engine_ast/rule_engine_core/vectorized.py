@@ -0,0 +1,233 @@
+"""
+Columnar rule evaluation over NumPy arrays.
+
+Each operand becomes one vectorized comparison over a column and AND/OR
+combine the resulting boolean masks. The results are identical, row by row,
+to `evaluate_node_with_details`: absent attributes and values that cannot be
+coerced to a number evaluate to False.
+
+NumPy is an optional dependency; it is only imported when this module is used.
+"""
+from .ast_node import Node, flatten_operands
+from .compiler import COMPARISON_OPERATORS
+from .rule_functions import EvaluationError
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy installed
+    np = None
+
+# Marks an absent attribute inside a column built from heterogeneous records
+MISSING = object()
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The vectorized evaluator requires numpy (pip install numpy).")
+
+
+class ColumnBatch:
+    """
+    A batch of records stored column by column.
+
+    Columns may be NumPy arrays or plain sequences; `MISSING` entries mark rows
+    where the attribute is absent. Numeric and dictionary-encoded views of a
+    column are computed on first use and shared by every operand of every rule
+    evaluated against the batch.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence[Any]], length: Optional[int] = None):
+        _require_numpy()
+        if length is None:
+            lengths = {len(column) for column in columns.values()}
+            if len(lengths) > 1:
+                raise ValueError("All columns must have the same length.")
+            length = lengths.pop() if lengths else 0
+        self.columns = columns
+        self.length = length
+        self._numeric: Dict[str, Tuple["np.ndarray", "np.ndarray"]] = {}
+        self._categorical: Dict[str, Tuple["np.ndarray", List[str]]] = {}
+
+    @classmethod
+    def from_records(cls, records: Sequence[Dict[str, Any]], attributes: Optional[Iterable[str]] = None) -> "ColumnBatch":
+        """Build a batch from a sequence of record dicts."""
+        _require_numpy()
+        if attributes is None:
+            attributes = set()
+            for record in records:
+                attributes.update(record.keys())
+        columns = {}
+        for attribute in attributes:
+            column = np.empty(len(records), dtype=object)
+            column[:] = [record.get(attribute, MISSING) for record in records]
+            columns[attribute] = column
+        return cls(columns, length=len(records))
+
+    def __len__(self):
+        return self.length
+
+    def numeric(self, name: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Return `(values, valid)` for a column coerced with `float()`.
+
+        `valid` is False where the attribute is absent or coercion fails.
+        """
+        cached = self._numeric.get(name)
+        if cached is not None:
+            return cached
+        column = self.columns.get(name)
+        if column is None:
+            values = np.zeros(self.length, dtype=np.float64)
+            valid = np.zeros(self.length, dtype=bool)
+        elif isinstance(column, np.ndarray) and column.dtype.kind in 'biuf':
+            values = column.astype(np.float64)
+            valid = np.ones(self.length, dtype=bool)
+        else:
+            values = np.zeros(self.length, dtype=np.float64)
+            valid = np.zeros(self.length, dtype=bool)
+            for index, value in enumerate(column):
+                if value is MISSING:
+                    continue
+                try:
+                    values[index] = float(value)
+                except (ValueError, TypeError):
+                    continue
+                valid[index] = True
+        self._numeric[name] = (values, valid)
+        return values, valid
+
+    def categorical(self, name: str) -> Tuple["np.ndarray", List[str]]:
+        """
+        Return `(codes, categories)` for a column dictionary-encoded by `str()`.
+
+        Absent attributes get the code `len(categories)`.
+        """
+        cached = self._categorical.get(name)
+        if cached is not None:
+            return cached
+        column = self.columns.get(name)
+        if column is None:
+            codes = np.zeros(self.length, dtype=np.intp)
+            categories: List[str] = []
+        elif isinstance(column, np.ndarray) and column.dtype.kind in 'biu':
+            uniques, codes = np.unique(column, return_inverse=True)
+            codes = codes.astype(np.intp, copy=False)
+            categories = [str(value) for value in uniques.tolist()]
+        else:
+            lookup: Dict[str, int] = {}
+            raw_codes = []
+            missing_rows = []
+            for index, value in enumerate(column.tolist() if isinstance(column, np.ndarray) else column):
+                if value is MISSING:
+                    raw_codes.append(-1)
+                    missing_rows.append(index)
+                    continue
+                raw_codes.append(lookup.setdefault(str(value), len(lookup)))
+            categories = list(lookup)
+            codes = np.array(raw_codes, dtype=np.intp)
+            if missing_rows:
+                codes[missing_rows] = len(categories)
+        self._categorical[name] = (codes, categories)
+        return codes, categories
+
+
+MaskFunction = Callable[[ColumnBatch], "np.ndarray"]
+
+
+def _false_mask(batch: ColumnBatch) -> "np.ndarray":
+    return np.zeros(len(batch), dtype=bool)
+
+
+def compile_condition_vectorized(condition: Dict[str, Any]) -> MaskFunction:
+    """Compile an operand condition into a function from a batch to a boolean mask."""
+    identifier = condition['identifier']
+    operator = condition['operator']
+    expected_value = condition['value']
+    compare = COMPARISON_OPERATORS.get(operator)
+    if compare is None:
+        return _false_mask
+
+    if isinstance(expected_value, str):
+        if operator in ('=', '=='):
+            def mask(batch: ColumnBatch) -> "np.ndarray":
+                codes, categories = batch.categorical(identifier)
+                try:
+                    code = categories.index(expected_value)
+                except ValueError:
+                    return np.zeros(len(batch), dtype=bool)
+                return codes == code
+            return mask
+
+        def mask(batch: ColumnBatch) -> "np.ndarray":
+            codes, categories = batch.categorical(identifier)
+            # Compare each category once, then gather; the extra slot is for absent values
+            lookup = np.fromiter(
+                (compare(category, expected_value) for category in categories),
+                dtype=bool, count=len(categories)
+            )
+            return np.append(lookup, False)[codes]
+        return mask
+
+    if isinstance(expected_value, (int, float)):
+        compare_value = float(expected_value)
+
+        def mask(batch: ColumnBatch) -> "np.ndarray":
+            values, valid = batch.numeric(identifier)
+            return valid & compare(values, compare_value)
+        return mask
+
+    return _false_mask
+
+
+def _compile_node_vectorized(node: Node) -> MaskFunction:
+    if node.type == 'operator':
+        masks = [_compile_node_vectorized(child) for child in flatten_operands(node)]
+        if node.value == 'AND':
+            combine = np.logical_and
+        elif node.value == 'OR':
+            combine = np.logical_or
+        else:
+            raise EvaluationError(f"Unknown logical operator: {node.value}")
+
+        def mask(batch: ColumnBatch) -> "np.ndarray":
+            result = masks[0](batch)
+            for operand in masks[1:]:
+                result = combine(result, operand(batch))
+            return result
+        return mask
+    if node.type == 'operand':
+        return compile_condition_vectorized(node.value)
+    return _false_mask
+
+
+class VectorizedRule:
+    """
+    A rule AST compiled for columnar evaluation.
+
+    Calling it with a `ColumnBatch` (or a dict of columns) returns a boolean
+    NumPy array with one entry per row.
+    """
+    __slots__ = ('ast', '_mask')
+
+    def __init__(self, ast: Node):
+        _require_numpy()
+        if ast is None:
+            raise EvaluationError("Cannot vectorize an empty AST.")
+        self.ast = ast
+        self._mask = _compile_node_vectorized(ast)
+
+    def __call__(self, batch) -> "np.ndarray":
+        if not isinstance(batch, ColumnBatch):
+            batch = ColumnBatch(batch)
+        return self._mask(batch)
+
+
+def evaluate_columns(ast: Node, columns) -> "np.ndarray":
+    """Evaluate a rule AST over a `ColumnBatch` or a dict of columns."""
+    return VectorizedRule(ast)(columns)
+
+
+def evaluate_records_vectorized(ast: Node, records: Sequence[Dict[str, Any]]) -> List[bool]:
+    """Evaluate a rule AST over record dicts through the columnar engine."""
+    return VectorizedRule(ast)(ColumnBatch.from_records(records)).tolist()